@@ -0,0 +1,322 @@
+"""Completed-interview analytics: results appended to SQLite in the background, aggregated on request."""
+
+import asyncio
+import contextvars
+import csv
+import hashlib
+import io
+import json
+import math
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from config import get_settings
+
+SCORE_BUCKET = 10
+# Turn latencies are aggregated in buckets this wide; percentiles are exact to within one
+LATENCY_BUCKET_MS = 10
+
+
+def _percentile(buckets: list, count: int, q: float) -> Optional[int]:
+    """Nearest-rank percentile from (count, max) pairs of ascending latency buckets."""
+    rank = math.ceil(q * count)
+    seen = 0
+    for n, peak in buckets:
+        seen += n
+        if seen >= rank:
+            return peak
+    return None
+
+
+def _interview_rows(session_id: str, session: dict, completed_at: float) -> tuple:
+    """(interview row, turn rows, transcript row) for a completed session."""
+    usage = [entry or {} for entry in session.get("usage", [])]
+    started_at = session.get("started_at")
+    text = session.get("assignment_text", "")
+    batch_job = (session.get("batch") or {}).get("job_id")
+    turns = [
+        (
+            session_id, seq, completed_at, batch_job, "review" if seq == len(usage) - 1 else "question",
+            None if seq == len(usage) - 1 else seq + 1,
+            entry.get("latency_ms"), entry.get("prompt_tokens"), entry.get("cached_tokens"),
+            entry.get("output_tokens"), entry.get("outcome"), int("opening_cache" in entry),
+        )
+        for seq, entry in enumerate(usage)
+    ]
+    interview = (
+        session_id, completed_at, started_at, completed_at - started_at if started_at else None, batch_job,
+        hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest(), len(text),
+        hashlib.blake2b((session.get("custom_prompt") or "").encode("utf-8"), digest_size=8).hexdigest(),
+        session.get("num_questions", 3), session.get("score"),
+        sum(entry.get("prompt_tokens") or 0 for entry in usage),
+        sum(entry.get("cached_tokens") or 0 for entry in usage),
+        sum(entry.get("output_tokens") or 0 for entry in usage),
+        sum(entry.get("latency_ms") or 0 for entry in usage),
+        sum(1 for entry in usage if entry.get("outcome") == "fallback"),
+        int(bool(usage) and "opening_cache" in usage[0]),
+    )
+    record = {
+        "conversation": session.get("conversation", []),
+        "observations": session.get("observations") or [],
+        "usage": session.get("usage", []),
+    }
+    transcript = (session_id, zlib.compress(json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), 6))
+    return interview, turns, transcript
+
+
+class AnalyticsStore:
+    """Completed interviews in an indexed SQLite database (WAL), kept past the session TTL.
+
+    Every figure is a typed column, one row per interview and one per AI
+    turn, so aggregates run inside SQLite without decoding any JSON. Turns
+    repeat their interview's completion time and batch, and a covering
+    index holds the columns the summary reads, so it is answered from the
+    index alone without a join. Transcripts sit compressed in a table of
+    their own and are only read for a single interview or the export.
+    Interviews are queued by the request and written in batches by one
+    background task, so finishing an interview never waits on the disk.
+    If the queue is full the interview is dropped from analytics and
+    counted.
+    """
+
+    BATCH_SIZE = 200
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS interviews (
+            session_id TEXT PRIMARY KEY, completed_at REAL NOT NULL, started_at REAL, duration_seconds REAL,
+            batch_job TEXT, document_hash TEXT, assignment_chars INTEGER, prompt_hash TEXT, num_questions INTEGER,
+            score INTEGER, prompt_tokens INTEGER, cached_tokens INTEGER, output_tokens INTEGER, gemini_ms INTEGER,
+            reply_fallbacks INTEGER, opening_cached INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS interviews_completed ON interviews (completed_at);
+        CREATE INDEX IF NOT EXISTS interviews_batch ON interviews (batch_job, completed_at);
+        CREATE TABLE IF NOT EXISTS turns (
+            session_id TEXT NOT NULL, seq INTEGER NOT NULL, completed_at REAL NOT NULL, batch_job TEXT,
+            kind TEXT NOT NULL, question_number INTEGER, gemini_ms INTEGER, prompt_tokens INTEGER,
+            cached_tokens INTEGER, output_tokens INTEGER, outcome TEXT, opening_cached INTEGER,
+            PRIMARY KEY (session_id, seq)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS turns_completed ON turns (completed_at, seq, kind, question_number, gemini_ms, outcome);
+        CREATE INDEX IF NOT EXISTS turns_batch ON turns (batch_job, completed_at);
+        CREATE TABLE IF NOT EXISTS transcripts (session_id TEXT PRIMARY KEY, record BLOB NOT NULL);
+    """
+
+    EXPORT_COLUMNS = (
+        "session_id", "completed_at", "duration_seconds", "batch_job", "document_hash", "assignment_chars",
+        "prompt_hash", "num_questions", "score", "prompt_tokens", "cached_tokens", "output_tokens", "gemini_ms",
+        "reply_fallbacks", "opening_cached",
+    )
+
+    def __init__(self, enabled: bool, path: str, queue_size: int):
+        self.enabled = enabled
+        self.path = path
+        # One thread owns the connection: the writer's batches and the queries take turns on it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._writer: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use, so a connection never crosses a server fork
+        if self._connection is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=5000")
+            db.executescript(self.SCHEMA)
+            self._connection = db
+        return self._connection
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, func, *args):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, func, *args)
+
+    def record(self, session_id: str, session: dict) -> None:
+        """Queue a completed interview for writing; returns immediately."""
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait((session_id, session, time.time()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._run(self._write, batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"[Analytics] Failed to write {len(batch)} interviews: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: list) -> None:
+        rows = [_interview_rows(*item) for item in batch]
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.executemany(f"INSERT OR REPLACE INTO interviews VALUES ({', '.join('?' * 16)})", [row[0] for row in rows])
+            self._db.executemany(
+                "DELETE FROM turns WHERE session_id = ?", [(row[0][0],) for row in rows],
+            )
+            self._db.executemany(
+                f"INSERT INTO turns VALUES ({', '.join('?' * 12)})", [turn for row in rows for turn in row[1]],
+            )
+            self._db.executemany("INSERT OR REPLACE INTO transcripts VALUES (?, ?)", [row[2] for row in rows])
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _where(since: Optional[float], until: Optional[float], batch_job: Optional[str]) -> tuple:
+        # Both tables carry these columns, so the same filter applies to either
+        clauses, params = ["completed_at >= ?", "completed_at < ?"], [since or 0.0, until or float("inf")]
+        if batch_job:
+            clauses.append("batch_job = ?")
+            params.append(batch_job)
+        return " AND ".join(clauses), params
+
+    def _summary(self, since: Optional[float], until: Optional[float], batch_job: Optional[str]) -> dict:
+        where, params = self._where(since, until, batch_job)
+        count, avg_score, min_score, max_score, avg_duration, opening_cached, prompt_tokens, output_tokens = self._db.execute(
+            f"""SELECT COUNT(*), AVG(score), MIN(score), MAX(score), AVG(duration_seconds), SUM(opening_cached),
+                       AVG(prompt_tokens), AVG(output_tokens)
+                FROM interviews i WHERE {where}""",
+            params,
+        ).fetchone()
+        distribution = [
+            {"from": bucket, "to": bucket + SCORE_BUCKET - 1 if bucket < 100 - SCORE_BUCKET else 100, "count": n}
+            for bucket, n in self._db.execute(
+                f"""SELECT MIN(score / {SCORE_BUCKET} * {SCORE_BUCKET}, {100 - SCORE_BUCKET}) AS bucket, COUNT(*)
+                    FROM interviews i WHERE {where} AND score IS NOT NULL GROUP BY bucket ORDER BY bucket""",
+                params,
+            )
+        ]
+        latency = {}
+        turns = fallback = repaired = parsed = 0
+        rows = self._db.execute(
+            f"""SELECT seq, kind, question_number, gemini_ms / {LATENCY_BUCKET_MS} AS bucket,
+                       COUNT(gemini_ms), SUM(gemini_ms), MAX(gemini_ms),
+                       COUNT(*), SUM(outcome = 'fallback'), SUM(outcome <> 'json'), COUNT(outcome)
+                FROM turns WHERE {where} GROUP BY seq, kind, bucket ORDER BY seq, kind, bucket""",
+            params,
+        )
+        for seq, kind, number, bucket, n, total, peak, rows_in_bucket, fallbacks, repairs, outcomes in rows:
+            turns += rows_in_bucket
+            fallback += fallbacks or 0
+            repaired += repairs or 0
+            parsed += outcomes
+            if bucket is None:
+                continue
+            position = latency.setdefault((seq, kind), {"question_number": number, "count": 0, "total": 0, "buckets": []})
+            position["count"] += n
+            position["total"] += total
+            position["buckets"].append((n, peak))
+        turn_latency = [
+            {
+                "turn": seq, "kind": kind, "question_number": position["question_number"], "count": position["count"],
+                "mean_ms": round(position["total"] / position["count"]),
+                "p50_ms": _percentile(position["buckets"], position["count"], 0.5),
+                "p90_ms": _percentile(position["buckets"], position["count"], 0.9),
+                "max_ms": position["buckets"][-1][1],
+            }
+            for (seq, kind), position in latency.items()
+        ]
+        return {
+            "interviews": count,
+            "score": {"mean": avg_score, "min": min_score, "max": max_score, "distribution": distribution},
+            "duration_seconds": avg_duration,
+            "tokens_per_interview": {"prompt": prompt_tokens, "output": output_tokens},
+            "turn_latency": turn_latency,
+            "turns": turns,
+            "rates": {
+                # Over the replies whose parse outcome is known (opening cache hits have none)
+                "reply_fallback": fallback / parsed if parsed else 0.0,
+                "reply_repaired": repaired / parsed if parsed else 0.0,
+                "opening_cache_hit": (opening_cached or 0) / count if count else 0.0,
+            },
+        }
+
+    def _export(self, since: Optional[float], until: Optional[float], batch_job: Optional[str]) -> str:
+        where, params = self._where(since, until, batch_job)
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(self.EXPORT_COLUMNS + ("observations",))
+        rows = self._db.execute(
+            f"""SELECT {', '.join(f'i.{column}' for column in self.EXPORT_COLUMNS)}, x.record
+                FROM interviews i LEFT JOIN transcripts x ON x.session_id = i.session_id
+                WHERE {where} ORDER BY i.completed_at""",
+            params,
+        )
+        for *columns, record in rows:
+            observations = json.loads(zlib.decompress(record))["observations"] if record else []
+            writer.writerow(columns + ["; ".join(observations)])
+        return out.getvalue()
+
+    def _transcript(self, session_id: str) -> Optional[dict]:
+        row = self._db.execute(
+            "SELECT i.score, x.record FROM transcripts x JOIN interviews i ON i.session_id = x.session_id WHERE x.session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(zlib.decompress(row[1])), "score": row[0]}
+
+    async def summary(self, since: float = None, until: float = None, batch_job: str = None) -> dict:
+        """Score distribution, per-turn Gemini latency and fallback rates for interviews completed in [since, until)."""
+        return await self._run(self._summary, since, until, batch_job)
+
+    async def export_csv(self, since: float = None, until: float = None, batch_job: str = None) -> str:
+        """One CSV row per completed interview, oldest first."""
+        return await self._run(self._export, since, until, batch_job)
+
+    async def transcript(self, session_id: str) -> Optional[dict]:
+        """The archived conversation of a completed interview, or None."""
+        return await self._run(self._transcript, session_id)
+
+    async def aclose(self) -> None:
+        """Write what is still queued (for up to a few seconds), then close the database."""
+        if self._writer is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), 5.0)
+            except asyncio.TimeoutError:
+                print(f"[Analytics] {self._queue.qsize()} queued interviews not written at shutdown")
+            self._writer.cancel()
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": int(self.enabled),
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+@lru_cache
+def get_analytics() -> AnalyticsStore:
+    settings = get_settings()
+    return AnalyticsStore(settings.analytics_enabled, settings.analytics_db_path, settings.analytics_queue_size)
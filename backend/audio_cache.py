@@ -0,0 +1,32 @@
+import hashlib
+import json
+from functools import lru_cache
+
+from config import get_settings
+from tiered_cache import TieredCache
+
+
+def audio_cache_key(text: str, engine: str, **params) -> str:
+    """Content address for a synthesized utterance.
+
+    `params` must include everything that changes the audio (voice ID, model,
+    voice settings, language), so different voices never share an entry.
+    """
+    payload = json.dumps([engine, params, text], sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class AudioCache(TieredCache):
+    """MP3 cache keyed by audio_cache_key."""
+
+    suffix = ".mp3"
+
+
+@lru_cache
+def get_audio_cache() -> AudioCache:
+    settings = get_settings()
+    return AudioCache(
+        max_bytes=settings.tts_cache_max_bytes,
+        disk_dir=settings.tts_cache_dir,
+        disk_max_bytes=settings.tts_cache_disk_max_bytes,
+    )
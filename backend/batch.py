@@ -0,0 +1,107 @@
+import asyncio
+import time
+import uuid
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from config import get_settings
+from session_store import SessionStore, create_session_store
+from upstream import UpstreamBusy
+
+# Times a submission is retried after the upstream scheduler sheds it
+BUSY_RETRIES = 5
+
+
+def new_job(filenames: list) -> dict:
+    return {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",  # queued -> running -> completed
+        "created_at": time.time(),
+        "finished_at": None,
+        "total": len(filenames),
+        "ready": 0,
+        "failed": 0,
+        "items": [{"filename": name, "status": "pending", "session_id": None, "error": None} for name in filenames],
+    }
+
+
+class BatchRunner:
+    """Prepares the sessions of batch jobs in the background.
+
+    Submissions run with bounded concurrency on top of the upstream
+    scheduler. A submission the scheduler sheds waits for its retry hint
+    instead of failing, since batch work is not latency-sensitive. Job
+    records are written to `jobs` after every submission so any worker
+    can report progress. Jobs run in the worker that accepted them.
+    """
+
+    def __init__(self, jobs: SessionStore, concurrency: int):
+        self.jobs = jobs
+        self.concurrency = concurrency
+        self._tasks = set()
+
+    def submit(self, job: dict, files: list, prepare: Callable[[str, bytes], Awaitable[str]]) -> None:
+        task = asyncio.create_task(self._run(job, files, prepare))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: dict, files: list, prepare) -> None:
+        job["status"] = "running"
+        await self.jobs.put(job["job_id"], job)
+        slots = asyncio.Semaphore(self.concurrency)
+        # Record updates are serialized so concurrent submissions don't interleave writes
+        saving = asyncio.Lock()
+
+        async def one(index: int) -> None:
+            item = job["items"][index]
+            filename, data = files[index]
+            files[index] = (filename, None)  # Only this coroutine keeps the bytes alive
+            async with slots:
+                try:
+                    if data is None:
+                        raise ValueError("File too large. Max 8MB.")
+                    item["session_id"] = await self._prepare(prepare, filename, data)
+                    item["status"] = "ready"
+                    job["ready"] += 1
+                except Exception as e:
+                    item["status"] = "failed"
+                    item["error"] = getattr(e, "detail", None) or str(e)
+                    job["failed"] += 1
+            async with saving:
+                await self.jobs.put(job["job_id"], job)
+
+        await asyncio.gather(*(one(index) for index in range(len(files))))
+        job["status"] = "completed"
+        job["finished_at"] = time.time()
+        await self.jobs.put(job["job_id"], job)
+
+    @staticmethod
+    async def _prepare(prepare, filename: str, data: bytes) -> str:
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return await prepare(filename, data)
+            except UpstreamBusy as e:
+                if attempt == BUSY_RETRIES:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    async def aclose(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {"running_jobs": len(self._tasks)}
+
+
+@lru_cache
+def get_batch_runner() -> BatchRunner:
+    settings = get_settings()
+    jobs = create_session_store(ttl_seconds=settings.batch_session_ttl_seconds, key_prefix="batch-job:")
+    return BatchRunner(jobs, settings.batch_concurrency)
+
+
+@lru_cache
+def get_prepared_sessions() -> SessionStore:
+    """Sessions prepared by batch jobs, waiting for their student to start them."""
+    settings = get_settings()
+    return create_session_store(ttl_seconds=settings.batch_session_ttl_seconds, key_prefix="prepared:")
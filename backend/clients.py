@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+import grpc
+import httpx
+
+from config import get_settings
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+
+def _service_client(client_cls, api_key: str):
+    """Build a Gemini service client authenticated with `api_key`."""
+    endpoint = get_settings().gemini_api_endpoint
+    if endpoint:
+        # Plaintext channel to a local stand-in; there is nothing to authenticate against
+        transport_cls = client_cls.get_transport_class("grpc_asyncio")
+        return client_cls(transport=transport_cls(host=endpoint, channel=grpc.aio.insecure_channel(endpoint)))
+    return client_cls(client_options={"api_key": api_key})
+
+
+@dataclass
+class GeminiClient:
+    """Per-API-key Gemini handles, reused across requests."""
+    api_key: str
+    async_client: glm.GenerativeServiceAsyncClient
+    model: genai.GenerativeModel
+    cache_client: glm.CacheServiceAsyncClient = None
+    last_used: float = field(default_factory=time.monotonic)
+    # Calls currently using the channels; a retired client closes after the last one
+    in_flight: int = 0
+    retired: bool = False
+
+    @contextmanager
+    def lease(self):
+        """Hold the client for one call (or stream), so eviction can't close it underneath."""
+        self.in_flight += 1
+        try:
+            yield self
+        finally:
+            self.in_flight -= 1
+            if self.retired and not self.in_flight:
+                self.close()
+
+    def retire(self) -> None:
+        """Stop handing the client out; close it now, or once its calls finish."""
+        self.retired = True
+        if not self.in_flight:
+            self.close()
+
+    def close(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+            loop.create_task(self.async_client.transport.close())
+            if self.cache_client is not None:
+                loop.create_task(self.cache_client.transport.close())
+        except RuntimeError:
+            # No running loop (shutdown); the channel is released with the process
+            pass
+
+    def cache_service(self) -> glm.CacheServiceAsyncClient:
+        """Client for Gemini context caching, created on first use."""
+        if self.cache_client is None:
+            self.cache_client = _service_client(glm.CacheServiceAsyncClient, self.api_key)
+        return self.cache_client
+
+    def cached_model(self, cached_content: str) -> genai.GenerativeModel:
+        """A model whose requests run on top of a server-side context cache."""
+        model = genai.GenerativeModel(GEMINI_MODEL)
+        # Same attribute GenerativeModel.from_cached_content sets, without its
+        # blocking lookup through the global cache client
+        model._cached_content = cached_content
+        model._async_client = self.async_client
+        return model
+
+
+class ClientRegistry:
+    """Long-lived upstream clients.
+
+    Gemini clients are keyed by API key and built with per-client options,
+    so two users' keys never go through the SDK's global `genai.configure`
+    state. Entries idle longer than `idle_ttl`, or past `max_entries`, are
+    dropped and closed once no call holds a lease on them.
+    ElevenLabs calls share one keep-alive HTTP connection pool; the API key
+    travels per request in the `xi-api-key` header.
+    """
+
+    def __init__(self, idle_ttl: float, max_entries: int, http_limits: httpx.Limits, http_timeout: httpx.Timeout):
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self._http_limits = http_limits
+        self._http_timeout = http_timeout
+        self._gemini: "OrderedDict[str, GeminiClient]" = OrderedDict()
+        self._http: httpx.AsyncClient = None
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        # Index by digest so raw keys aren't kept as dict keys
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def gemini(self, api_key: str) -> GeminiClient:
+        key_id = self._key_id(api_key)
+        self._evict_idle()
+        entry = self._gemini.get(key_id)
+        if entry is None:
+            async_client = _service_client(glm.GenerativeServiceAsyncClient, api_key)
+            model = genai.GenerativeModel(GEMINI_MODEL)
+            # The SDK otherwise falls back to the process-global default client
+            model._async_client = async_client
+            entry = GeminiClient(api_key=api_key, async_client=async_client, model=model)
+            self._gemini[key_id] = entry
+            while len(self._gemini) > self.max_entries:
+                _, oldest = self._gemini.popitem(last=False)
+                oldest.retire()
+        entry.last_used = time.monotonic()
+        self._gemini.move_to_end(key_id)
+        return entry
+
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(limits=self._http_limits, timeout=self._http_timeout)
+        return self._http
+
+    def _evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._gemini:
+            key_id, entry = next(iter(self._gemini.items()))
+            if entry.last_used > cutoff:
+                break
+            del self._gemini[key_id]
+            entry.retire()
+
+    async def aclose(self) -> None:
+        entries = list(self._gemini.values())
+        self._gemini.clear()
+        for entry in entries:
+            await entry.async_client.transport.close()
+            if entry.cache_client is not None:
+                await entry.cache_client.transport.close()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def stats(self) -> dict:
+        return {"gemini_clients": len(self._gemini)}
+
+
+@lru_cache
+def get_client_registry() -> ClientRegistry:
+    settings = get_settings()
+    return ClientRegistry(
+        idle_ttl=settings.client_idle_ttl_seconds,
+        max_entries=settings.client_max_entries,
+        http_limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        http_timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+    )
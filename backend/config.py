@@ -7,6 +7,154 @@ class Settings(BaseSettings):
     gemini_api_key: str = ""
     elevenlabs_api_key: str = ""
 
+    # Upstream endpoints; only overridden to point at local stand-ins (see bench/)
+    gemini_api_endpoint: str = ""  # host:port, plaintext gRPC
+    elevenlabs_base_url: str = "https://api.elevenlabs.io"
+
+    # Document parsing runs off the event loop in a bounded pool.
+    # "process" sidesteps the GIL for PyPDF2/docx/pptx; "thread" is lighter.
+    parse_executor: str = "process"
+    parse_workers: int = 2
+    # Extraction stops once this much text is collected or the time runs out
+    parse_max_chars: int = 200000
+    parse_timeout_seconds: float = 20.0
+    # Extra address space a parse process may use before allocations fail
+    parse_max_memory_bytes: int = 1024 * 1024 * 1024
+
+    # One submission may be several files and/or zip archives. They are
+    # extracted in parallel and merged, within a file count, an uncompressed
+    # size limit and one wall-clock budget for the whole submission.
+    ingest_max_files: int = 20
+    ingest_max_total_bytes: int = 64 * 1024 * 1024
+    ingest_timeout_seconds: float = 30.0
+
+    # Parsed-document cache keyed by file content hash (DOC_CACHE_DIR adds a disk tier)
+    doc_cache_max_bytes: int = 32 * 1024 * 1024
+    doc_cache_dir: str = ""
+    doc_cache_disk_max_bytes: int = 256 * 1024 * 1024
+
+    # Pooled upstream clients. Gemini clients are cached per API key and
+    # dropped after being idle; ElevenLabs shares one keep-alive pool.
+    http_timeout: float = 30.0
+    http_connect_timeout: float = 5.0
+    http_max_connections: int = 100
+    http_max_keepalive: int = 20
+    http_keepalive_expiry: float = 30.0
+    client_idle_ttl_seconds: int = 900
+    client_max_entries: int = 256
+
+    # Interview session storage: "memory" (per process), "sqlite" (on disk,
+    # survives restarts, shared by the workers of one host) or "redis"
+    # (shared across workers/nodes). Idle sessions expire after the TTL.
+    session_backend: str = "memory"
+    session_ttl_seconds: int = 3600
+    session_max_entries: int = 10000
+    session_db_path: str = "sessions.db"
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Upstream scheduling. Limits apply per API key and per worker process;
+    # calls that cannot start within the queue timeout get a 503 + Retry-After.
+    gemini_rate_per_second: float = 5.0
+    gemini_burst: int = 10
+    gemini_max_concurrency: int = 16
+    elevenlabs_rate_per_second: float = 5.0
+    elevenlabs_burst: int = 10
+    elevenlabs_max_concurrency: int = 8
+    upstream_max_queue: int = 200
+    upstream_queue_timeout_seconds: float = 20.0
+    upstream_retries: int = 3
+    upstream_backoff_seconds: float = 0.5
+
+    # Batch preparation of sessions for a whole class (/api/batch)
+    batch_concurrency: int = 4
+    batch_max_files: int = 200
+    batch_max_total_bytes: int = 256 * 1024 * 1024
+    # Prepared sessions and job records wait this long for students to start
+    batch_session_ttl_seconds: int = 7 * 24 * 3600
+
+    # Gemini context caching: store the system prompt + assignment server-side
+    # once per session and send only the new turn afterwards.
+    gemini_context_cache: bool = False
+    gemini_cache_ttl_seconds: int = 3600
+    # Ask Gemini for schema-constrained JSON replies (response_schema)
+    gemini_structured_output: bool = True
+
+    # Opening questions are reused for an assignment seen recently with the
+    # same prompt settings (retries, double-clicks, instructors re-testing a
+    # file), so the session starts without a Gemini call and with cached
+    # audio. "exact" matches the normalized text sent to Gemini; "similar"
+    # also takes texts at least OPENING_CACHE_SIMILARITY alike (MinHash
+    # estimate of shingle overlap); "off" disables it. Per worker process.
+    opening_cache: str = "exact"
+    opening_cache_ttl_seconds: int = 900
+    opening_cache_max_entries: int = 1000
+    opening_cache_similarity: float = 0.9
+
+    # Prompt excerpting: each prompt carries the most relevant, not yet
+    # covered chunks of the assignment within these token budgets.
+    excerpt_chunk_chars: int = 800
+    excerpt_start_tokens: int = 2500
+    excerpt_turn_tokens: int = 1000
+
+    # Completed-interview analytics (/api/analytics/*). Scores, per-turn
+    # Gemini figures and transcripts are appended to an indexed SQLite
+    # database by a background writer and kept past the session TTL.
+    analytics_enabled: bool = False
+    analytics_db_path: str = "analytics.db"
+    analytics_queue_size: int = 10000
+    # Shared secret instructors send as X-Instructor-Token; the analytics
+    # endpoints stay off while it is empty
+    instructor_token: str = ""
+
+    # Speculative preparation of the next turn while the student answers
+    speculation_enabled: bool = False
+    speculation_budget_seconds: float = 10.0
+    speculation_max_inflight: int = 64
+    # Prepared turns not claimed by an answer within this long are dropped
+    speculation_result_ttl_seconds: float = 600.0
+
+    # TTS tiering. ELEVENLABS_MODEL (multilingual, turbo or flash) is the best
+    # model used; a faster one is picked when recent latency for texts of that
+    # length would miss the budget. gTTS is started alongside a call that runs
+    # past the model's TTS_HEDGE_PERCENTILE latency, and the first clip wins.
+    elevenlabs_model: str = "turbo"
+    tts_budget_seconds: float = 3.0
+    tts_long_text_chars: int = 300
+    tts_hedge_enabled: bool = True
+    tts_hedge_percentile: float = 0.9
+    tts_hedge_min_seconds: float = 0.5
+    # Texts longer than this are synthesized sentence by sentence in
+    # parallel and joined; 0 sends every text in one request
+    tts_segment_chars: int = 240
+    tts_segment_concurrency: int = 4
+    # gTTS runs in its own thread pool; each request gives up after the timeout
+    gtts_workers: int = 4
+    gtts_timeout_seconds: float = 10.0
+
+    # Server-side speech recognition (optional, needs the 'vosk' package and a
+    # model directory from https://alphacephei.com/vosk/models). The browser
+    # streams microphone audio over the interview WebSocket; the answer ends
+    # after STT_END_SILENCE_SECONDS of silence and the reply starts right away.
+    stt_enabled: bool = False
+    stt_model_path: str = "models/vosk"
+    stt_workers: int = 4
+    stt_end_silence_seconds: float = 1.2
+    stt_min_speech_seconds: float = 0.5
+    stt_max_seconds: float = 180.0
+
+    # Worker start-up. Each worker warms its clients, caches and parse pool
+    # before /api/ready reports it ready. STARTUP_PRELOAD also imports the
+    # lazily loaded libraries (parsers, gTTS) up front; gunicorn.conf.py does
+    # that once in the master instead, so forked workers share the pages.
+    startup_preload: bool = False
+    startup_warm_timeout_seconds: float = 10.0
+
+    # Synthesized audio cache. Set TTS_CACHE_DIR to add a disk tier that
+    # survives restarts; an empty value keeps the cache in memory only.
+    tts_cache_max_bytes: int = 64 * 1024 * 1024
+    tts_cache_dir: str = ""
+    tts_cache_disk_max_bytes: int = 1024 * 1024 * 1024
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
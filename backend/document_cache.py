@@ -0,0 +1,61 @@
+import hashlib
+import json
+import zlib
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Optional
+
+from config import get_settings
+from executor import run_blocking, run_cpu_bound
+from file_parser import ParsedDocument, Segment, parse_document
+from tiered_cache import TieredCache
+
+
+def _content_key(filename: str, file_bytes: bytes, max_chars: Optional[int]) -> str:
+    # The extension picks the extractor and the budget bounds the result, so both are part of the key
+    ext = filename.lower().split(".")[-1] if "." in filename else ""
+    digest = hashlib.blake2b(f"{ext}:{max_chars}:".encode("utf-8"), digest_size=20)
+    digest.update(file_bytes)
+    return digest.hexdigest()
+
+
+def _encode(document: ParsedDocument) -> bytes:
+    return zlib.compress(json.dumps(asdict(document), separators=(",", ":"), ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _decode(blob: bytes) -> ParsedDocument:
+    data = json.loads(zlib.decompress(blob).decode("utf-8"))
+    data["segments"] = [Segment(**segment) for segment in data["segments"]]
+    return ParsedDocument(**data)
+
+
+class DocumentCache(TieredCache):
+    """Extracted documents keyed by a BLAKE2 hash of the uploaded bytes, stored compressed."""
+
+    suffix = ".json.z"
+
+
+async def parse_document_cached(filename: str, file_bytes: bytes, max_chars: Optional[int] = None, timeout: Optional[float] = None) -> ParsedDocument:
+    """parse_document in the parse pool, skipped entirely for previously seen files."""
+    cache = get_document_cache()
+    # hashlib releases the GIL on large buffers, so hashing an 8MB upload in a thread doesn't stall the loop
+    key = await run_blocking(_content_key, filename, file_bytes, max_chars)
+    blob = await cache.get(key)
+    if blob is not None:
+        return _decode(blob)
+
+    document = await run_cpu_bound(parse_document, filename, file_bytes, max_chars=max_chars, timeout=timeout)
+    # A timed-out parse depends on load at the time, so don't pin it
+    if not document.timed_out:
+        await cache.put(key, _encode(document))
+    return document
+
+
+@lru_cache
+def get_document_cache() -> DocumentCache:
+    settings = get_settings()
+    return DocumentCache(
+        max_bytes=settings.doc_cache_max_bytes,
+        disk_dir=settings.doc_cache_dir,
+        disk_max_bytes=settings.doc_cache_disk_max_bytes,
+    )
@@ -0,0 +1,200 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from config import get_settings
+
+# Rough chars-per-token ratio used to turn token budgets into character budgets
+CHARS_PER_TOKEN = 4
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can did do does for from had has have how i if in into is it its
+me my not of on or our so than that the their them then there these they this to was we were
+what when where which who why will with you your
+""".split())
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _tokens(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def chunk_text(text: str, target_chars: int = 800) -> list:
+    """Split extracted text into roughly paragraph-sized chunks.
+
+    file_parser joins pages, paragraphs and slides with newlines, so lines
+    are the natural units; short lines are merged and very long ones are
+    cut at sentence boundaries.
+    """
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= target_chars:
+            units.append(line)
+            continue
+        piece = ""
+        for sentence in _SENTENCE.split(line):
+            if piece and len(piece) + len(sentence) > target_chars:
+                units.append(piece)
+                piece = ""
+            piece = f"{piece} {sentence}".strip()
+        if piece:
+            units.append(piece)
+
+    chunks = []
+    current = ""
+    for unit in units:
+        if current and len(current) + len(unit) + 1 > target_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ExcerptIndex:
+    """BM25 index over an assignment's chunks, used to keep prompts bounded."""
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+        self._term_freqs = [Counter(_tokens(chunk)) for chunk in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(chunks)) if chunks else 0.0
+        doc_freq = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+        self.total_chars = sum(len(chunk) for chunk in chunks)
+
+    def search(self, query: str, k: int = None) -> list:
+        """Chunk ids ranked by BM25 relevance to `query` (non-matching chunks omitted)."""
+        terms = [t for t in set(_tokens(query)) if t in self._idf]
+        if not terms:
+            return []
+        scores = []
+        for chunk_id, tf in enumerate(self._term_freqs):
+            norm = self.K1 * (1 - self.B + self.B * self._lengths[chunk_id] / (self._avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.K1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, chunk_id))
+        scores.sort(reverse=True)
+        ranked = [chunk_id for _, chunk_id in scores]
+        return ranked[:k] if k else ranked
+
+    def overview(self, budget_chars: int) -> list:
+        """Chunks spread evenly across the document, always starting with the first."""
+        return self._fill([], range(len(self.chunks)), budget_chars, spread=True)
+
+    def fresh_candidates(self, covered=()) -> list:
+        """Chunks no question has covered yet (all chunks once everything is covered).
+
+        Independent of the student's answer, so it can be prepared ahead of time.
+        """
+        covered = set(covered)
+        fresh = [i for i in range(len(self.chunks)) if i not in covered]
+        return fresh or list(range(len(self.chunks)))
+
+    def select(self, query: str, budget_chars: int, covered=(), fresh: list = None) -> list:
+        """Pick excerpts for a turn within `budget_chars`.
+
+        Half the budget goes to the chunks most relevant to `query` (the
+        latest question and answer); the rest to chunks no question has
+        covered yet, spread across the document so later sections get seen.
+        `fresh` may be a precomputed `fresh_candidates(covered)`.
+        """
+        if self.total_chars <= budget_chars:
+            return list(range(len(self.chunks)))
+        chosen = self._fill([], self.search(query), budget_chars // 2)
+        if fresh is None:
+            fresh = self.fresh_candidates(covered)
+        return self._fill(chosen, [i for i in fresh if i not in chosen], budget_chars, spread=True)
+
+    def _fill(self, chosen: list, candidates, budget_chars: int, spread: bool = False) -> list:
+        chosen = list(chosen)
+        used = sum(len(self.chunks[i]) for i in chosen)
+        candidates = list(candidates)
+        if spread and candidates:
+            # Visit candidates at an even stride first, then fill the gaps
+            avg = max(1, sum(len(self.chunks[i]) for i in candidates) // len(candidates))
+            stride = max(1, math.ceil(len(candidates) / max(1, (budget_chars - used) // avg)))
+            candidates = candidates[::stride] + [c for i, c in enumerate(candidates) if i % stride]
+        for chunk_id in candidates:
+            size = len(self.chunks[chunk_id])
+            if chunk_id in chosen or used + size > budget_chars:
+                continue
+            chosen.append(chunk_id)
+            used += size
+        return sorted(chosen)
+
+    def render(self, chunk_ids: list) -> str:
+        """Join chunks in document order, marking skipped material with [...]."""
+        parts = []
+        previous = -1
+        for chunk_id in sorted(chunk_ids):
+            if chunk_id != previous + 1:
+                parts.append("[...]")
+            parts.append(self.chunks[chunk_id])
+            previous = chunk_id
+        if previous != len(self.chunks) - 1 and parts:
+            parts.append("[...]")
+        return "\n".join(parts)
+
+
+_indexes: "OrderedDict[str, ExcerptIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_INDEXES = 256
+
+
+def get_excerpt_index(assignment_text: str) -> ExcerptIndex:
+    """Per-document index, built once and kept in a small process-local LRU.
+
+    Workers that never saw the upload rebuild it from the session's text.
+    """
+    digest = hashlib.blake2b(assignment_text.encode("utf-8"), digest_size=16).hexdigest()
+    # Also called from worker threads, so guard the shared LRU
+    with _indexes_lock:
+        index = _indexes.get(digest)
+        if index is not None:
+            _indexes.move_to_end(digest)
+            return index
+    index = ExcerptIndex(chunk_text(assignment_text, get_settings().excerpt_chunk_chars))
+    with _indexes_lock:
+        _indexes[digest] = index
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _render(index: ExcerptIndex, chunk_ids: list, assignment_text: str) -> str:
+    # The original text when nothing was left out, so prompts can tell and use it as-is
+    return assignment_text if len(chunk_ids) == len(index.chunks) else index.render(chunk_ids)
+
+
+def opening_excerpt(assignment_text: str) -> str:
+    """Excerpt for the opening question; the whole text if it fits the budget."""
+    index = get_excerpt_index(assignment_text)
+    return _render(index, index.overview(get_settings().excerpt_start_tokens * CHARS_PER_TOKEN), assignment_text)
+
+
+def turn_excerpt(assignment_text: str, query: str, covered: list, fresh: list = None) -> str:
+    """Excerpt for a follow-up turn; the whole text if it fits the budget."""
+    index = get_excerpt_index(assignment_text)
+    return _render(index, index.select(query, get_settings().excerpt_turn_tokens * CHARS_PER_TOKEN, covered, fresh), assignment_text)
+
+
+def chunks_covered_by(assignment_text: str, question: str, k: int = 2) -> list:
+    """Chunks a generated question most likely refers to."""
+    return get_excerpt_index(assignment_text).search(question, k)
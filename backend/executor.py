@@ -0,0 +1,117 @@
+import asyncio
+import resource
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from config import get_settings
+
+_parse_executor: Executor = None
+_speech_executor: Executor = None
+_gtts_executor: Executor = None
+
+
+def _limit_memory(max_bytes: int) -> None:
+    """Cap a parse process's address space at its current size plus `max_bytes`.
+
+    A decompression bomb or runaway extraction then fails with MemoryError
+    in that process instead of exhausting the host.
+    """
+    if max_bytes <= 0:
+        return
+    try:
+        with open("/proc/self/status") as f:
+            size = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmSize:"))
+    except (OSError, StopIteration):
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = size + max_bytes
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def get_parse_executor() -> Executor:
+    """Return the shared, bounded pool used for CPU-bound document parsing."""
+    global _parse_executor
+    if _parse_executor is None:
+        settings = get_settings()
+        workers = max(1, settings.parse_workers)
+        if settings.parse_executor == "thread":
+            _parse_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        else:
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_limit_memory, initargs=(settings.parse_max_memory_bytes,),
+            )
+    return _parse_executor
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """Run a picklable, CPU-bound callable in the parse pool without blocking the event loop."""
+    global _parse_executor
+    loop = asyncio.get_running_loop()
+    executor = get_parse_executor()
+    try:
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for the next call
+        if _parse_executor is executor:
+            _parse_executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def get_speech_executor() -> Executor:
+    """Return the pool that runs speech recognizers.
+
+    Threads, because a recognizer holds native state that can't be moved to
+    another process; Vosk releases the GIL while decoding.
+    """
+    global _speech_executor
+    if _speech_executor is None:
+        workers = max(1, get_settings().stt_workers)
+        _speech_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+    return _speech_executor
+
+
+async def run_speech(func, *args):
+    """Run a speech-recognition step in the speech pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_speech_executor(), partial(func, *args))
+
+
+def get_gtts_executor() -> Executor:
+    """Return the small pool for gTTS requests.
+
+    Kept apart from the default pool so a slow Google endpoint can't hold
+    the threads that file reads and cache I/O need.
+    """
+    global _gtts_executor
+    if _gtts_executor is None:
+        workers = max(1, get_settings().gtts_workers)
+        _gtts_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gtts")
+    return _gtts_executor
+
+
+async def run_gtts(func, *args):
+    """Run a gTTS request in the gTTS pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_gtts_executor(), partial(func, *args))
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking I/O callable (e.g. a disk read) on the default thread pool."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def shutdown_executors():
+    global _parse_executor, _speech_executor, _gtts_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+    if _speech_executor is not None:
+        _speech_executor.shutdown(wait=False, cancel_futures=True)
+        _speech_executor = None
+    if _gtts_executor is not None:
+        _gtts_executor.shutdown(wait=False, cancel_futures=True)
+        _gtts_executor = None
@@ -1,53 +1,183 @@
+import importlib
 import io
-from PyPDF2 import PdfReader
-from docx import Document
-from pptx import Presentation
+import multiprocessing
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
 
+# Format libraries are imported when a file of that type is first parsed, so
+# a worker only pays for the formats it sees (see preload_parsers)
+PARSER_MODULES = {"pdf": "PyPDF2", "docx": "docx", "pptx": "pptx"}
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+
+@dataclass
+class Segment:
+    """One extracted unit (page, paragraph or slide) and its span in ParsedDocument.text."""
+    kind: str
+    index: int
+    text: str
+    start: int
+    end: int
+    # File the segment came from, for documents merged from several files
+    source: str = ""
+
+
+@dataclass
+class ParsedDocument:
+    text: str
+    segments: list = field(default_factory=list)
+    # Extraction stopped at the character budget or the time limit
+    truncated: bool = False
+    timed_out: bool = False
+    # Per-file outcome for documents merged from several files (see ingest.py)
+    sources: list = field(default_factory=list)
+
+
+class _Deadline(Exception):
+    pass
+
+
+@contextmanager
+def _hard_deadline(seconds: Optional[float]):
+    """Interrupt extraction stuck inside a single page or shape after `seconds`.
+
+    The regular time limit is only checked between segments. This uses
+    SIGALRM, so it is armed only on the main thread of a parse-pool process;
+    elsewhere the between-segment check is all there is.
+    """
+    if (not seconds or multiprocessing.parent_process() is None
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise _Deadline()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def iter_pdf_segments(file_bytes: bytes) -> Iterator[tuple]:
+    from PyPDF2 import PdfReader
+
+    # PdfReader parses pages lazily, so stopping early skips the rest of the file
     reader = PdfReader(io.BytesIO(file_bytes))
-    pages = []
-    for page in reader.pages:
+    for number, page in enumerate(reader.pages):
         text = page.extract_text()
         if text:
-            pages.append(text)
-    return "\n".join(pages)
+            yield "page", number, text
 
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
+def iter_docx_segments(file_bytes: bytes) -> Iterator[tuple]:
+    from docx import Document
+
     doc = Document(io.BytesIO(file_bytes))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    return "\n".join(paragraphs)
+    for number, p in enumerate(doc.paragraphs):
+        if p.text.strip():
+            yield "paragraph", number, p.text
 
 
-def extract_text_from_pptx(file_bytes: bytes) -> str:
+def iter_pptx_segments(file_bytes: bytes) -> Iterator[tuple]:
+    from pptx import Presentation
+
     prs = Presentation(io.BytesIO(file_bytes))
-    slides_text = []
-    for slide in prs.slides:
+    for number, slide in enumerate(prs.slides):
         slide_content = []
         for shape in slide.shapes:
             if hasattr(shape, "text") and shape.text.strip():
                 slide_content.append(shape.text)
         if slide_content:
-            slides_text.append(" ".join(slide_content))
-    return "\n".join(slides_text)
+            yield "slide", number, " ".join(slide_content)
 
 
-def extract_text_from_txt(file_bytes: bytes) -> str:
-    return file_bytes.decode("utf-8", errors="ignore")
+def iter_txt_segments(file_bytes: bytes, max_chars: Optional[int] = None) -> Iterator[tuple]:
+    # A UTF-8 character is at most 4 bytes, so never decode more than the budget needs
+    if max_chars is not None:
+        file_bytes = file_bytes[:max_chars * 4]
+    yield "text", 0, file_bytes.decode("utf-8", errors="ignore")
 
 
-def parse_file(filename: str, file_bytes: bytes) -> str:
+def preload_parsers() -> None:
+    """Import every format library now, e.g. in a server master before forking workers."""
+    for module in PARSER_MODULES.values():
+        importlib.import_module(module)
+
+
+def iter_segments(filename: str, file_bytes: bytes, max_chars: Optional[int] = None) -> Iterator[tuple]:
+    """Yield (kind, index, text) segments in document order."""
     ext = filename.lower().split(".")[-1] if "." in filename else ""
-    
+
     if ext == "pdf":
-        return extract_text_from_pdf(file_bytes)
+        return iter_pdf_segments(file_bytes)
     elif ext == "docx":
-        return extract_text_from_docx(file_bytes)
+        return iter_docx_segments(file_bytes)
     elif ext == "pptx":
-        return extract_text_from_pptx(file_bytes)
+        return iter_pptx_segments(file_bytes)
     elif ext == "txt":
-        return extract_text_from_txt(file_bytes)
+        return iter_txt_segments(file_bytes, max_chars)
     else:
         raise ValueError(f"Unsupported file format: {ext}")
 
+
+def parse_document(filename: str, file_bytes: bytes, max_chars: Optional[int] = None, timeout: Optional[float] = None) -> ParsedDocument:
+    """Extract segments until `max_chars` characters or `timeout` seconds are used up.
+
+    The time limit is checked between segments, and in a parse-pool process
+    also interrupts a segment that is still running when it expires. If it
+    runs out before any text was extracted, TimeoutError is raised.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    parts = []
+    segments = []
+    length = 0
+    truncated = timed_out = False
+
+    try:
+        with _hard_deadline(timeout):
+            for kind, index, text in iter_segments(filename, file_bytes, max_chars):
+                start = length + (1 if parts else 0)
+                if max_chars is not None and start + len(text) > max_chars:
+                    text = text[:max(0, max_chars - start)]
+                    truncated = True
+                if text:
+                    parts.append(text)
+                    segments.append(Segment(kind, index, text, start, start + len(text)))
+                    length = start + len(text)
+                if truncated:
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    raise _Deadline()
+    except _Deadline:
+        if not parts:
+            raise TimeoutError("Document extraction took too long")
+        truncated = timed_out = True
+
+    return ParsedDocument(text="\n".join(parts), segments=segments, truncated=truncated, timed_out=timed_out)
+
+
+def extract_text_from_pdf(file_bytes: bytes) -> str:
+    return "\n".join(text for _, _, text in iter_pdf_segments(file_bytes))
+
+
+def extract_text_from_docx(file_bytes: bytes) -> str:
+    return "\n".join(text for _, _, text in iter_docx_segments(file_bytes))
+
+
+def extract_text_from_pptx(file_bytes: bytes) -> str:
+    return "\n".join(text for _, _, text in iter_pptx_segments(file_bytes))
+
+
+def extract_text_from_txt(file_bytes: bytes) -> str:
+    return file_bytes.decode("utf-8", errors="ignore")
+
+
+def parse_file(filename: str, file_bytes: bytes) -> str:
+    return parse_document(filename, file_bytes).text
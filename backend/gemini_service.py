@@ -1,7 +1,15 @@
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
+from google.api_core.exceptions import GoogleAPICallError, InvalidArgument, NotFound, PermissionDenied
 from config import get_settings
-import json
-import re
+from clients import get_client_registry
+from metrics import GEMINI_TOKENS, record_stage
+from response_parser import RESPONSE_SCHEMA, ResponseParser
+from upstream import get_limiter
+from contextlib import aclosing
+from datetime import timedelta
+import time
+from typing import AsyncIterator, Optional
 
 SYSTEM_PROMPT = """You are a friendly AI coach checking if a student understands their submitted assignment.
 
@@ -57,6 +65,34 @@ IMPORTANT: The "text" field must contain the COMPLETE message you want to say. F
 
 Return ONLY valid JSON, nothing else."""
 
+# Shown when the prompt carries selected excerpts instead of the whole assignment
+EXCERPT_NOTE = " (selected excerpts; [...] marks omitted parts)"
+
+# Per-turn instructions for the opening question
+START_INSTRUCTIONS = """Your response must include BOTH a greeting AND your first question in the "text" field. Example format:
+"Hi there! I've read your assignment about [specific topic from their work]. It's interesting how you approached [something specific]. My first question is: [your question about something specific from their assignment]?"
+
+Make sure the greeting mentions something specific from their assignment to show you actually read it."""
+
+
+# JSON mode with the reply schema, so well-formed output needs no repair
+STRUCTURED_OUTPUT = genai.GenerationConfig(response_mime_type="application/json", response_schema=RESPONSE_SCHEMA)
+# Models that rejected the structured output config; they get prompt-only JSON
+_no_structured_output = set()
+
+
+def _rejects_structured_output(error: InvalidArgument) -> bool:
+    """Whether an InvalidArgument is about the structured output config, not the key or prompt."""
+    message = str(error).lower().replace("_", "")
+    return "responseschema" in message or "responsemimetype" in message
+
+
+def _assignment_part(assignment_text: str, excerpt: str = None) -> tuple:
+    """(heading note, text) for the assignment in a prompt; never a blind cut of the text."""
+    if excerpt is None or excerpt == assignment_text:
+        return "", assignment_text
+    return EXCERPT_NOTE, excerpt
+
 
 class GeminiService:
     def __init__(self, api_key: str = None):
@@ -64,50 +100,217 @@ class GeminiService:
         key = api_key or settings.gemini_api_key
         if not key:
             raise ValueError("GEMINI_API_KEY not set. Please add it in Settings or .env file.")
-        genai.configure(api_key=key)
-        self.model = genai.GenerativeModel("gemini-2.5-flash")
+        self._client = get_client_registry().gemini(key)
+        self.model = self._client.model
+        # Token usage and latency of the most recent call, for reporting
+        self.last_usage = None
+        # Set when a session's context cache was gone and the full prompt was resent
+        self.context_cache_expired = False
+
+    def _lease(self):
+        """Hold the Gemini client for one call.
+
+        A client the registry retired since this service was created (idle
+        or evicted) is swapped for the key's current one first.
+        """
+        if self._client.retired:
+            self._client = get_client_registry().gemini(self._client.api_key)
+            self.model = self._client.model
+        return self._client.lease()
+
+    async def create_context_cache(self, assignment_text: str, custom_prompt: str = None, num_questions: int = 3) -> Optional[str]:
+        """Cache the stable prefix (system prompt + assignment) server-side.
+
+        The whole parsed assignment is cached (PARSE_MAX_CHARS already
+        bounds it), so turns on the cache need no excerpts. Returns the
+        cache name, or None if caching is disabled or the prefix is
+        rejected (e.g. below the model's minimum cacheable size); callers
+        then fall back to sending the full prompt each turn.
+        """
+        settings = get_settings()
+        if not settings.gemini_context_cache:
+            return None
+        system_instruction = f"{self._system_prompt(custom_prompt, num_questions)}\n\n{JSON_FORMAT_INSTRUCTIONS}"
+        assignment_block = f"Here is the student's assignment:\n---\n{assignment_text}\n---"
+        try:
+            with self._lease():
+                cache = await self._client.cache_service().create_cached_content(
+                    cached_content=glm.CachedContent(
+                        model=self.model.model_name,
+                        system_instruction=glm.Content(parts=[glm.Part(text=system_instruction)]),
+                        contents=[glm.Content(role="user", parts=[glm.Part(text=assignment_block)])],
+                        ttl=timedelta(seconds=settings.gemini_cache_ttl_seconds),
+                    )
+                )
+        except GoogleAPICallError as e:
+            print(f"[Gemini] Context cache unavailable, using full prompts: {e}")
+            return None
+        return cache.name
+
+    async def delete_context_cache(self, name: str) -> None:
+        try:
+            with self._lease():
+                await self._client.cache_service().delete_cached_content(name=name)
+        except GoogleAPICallError:
+            # Already expired or deleted; the TTL cleans up either way
+            pass
+
+    async def warm(self) -> None:
+        """Open the Gemini connection ahead of the next call."""
+        with self._lease():
+            channel = getattr(self._client.async_client.transport, "grpc_channel", None)
+            if channel is not None:
+                await channel.channel_ready()
+
+    async def start_session(self, assignment_text: str, custom_prompt: str = None, num_questions: int = 3, context_cache: str = None, excerpt: str = None) -> dict:
+        prompt, fallback = self._start_prompts(assignment_text, custom_prompt, num_questions, context_cache, excerpt)
+        return self.parse_response(await self._generate(prompt, context_cache, fallback))
+
+    async def stream_start_session(self, assignment_text: str, custom_prompt: str = None, num_questions: int = 3, context_cache: str = None, excerpt: str = None) -> AsyncIterator[str]:
+        """Like start_session, but yield the raw response text as Gemini streams it."""
+        prompt, fallback = self._start_prompts(assignment_text, custom_prompt, num_questions, context_cache, excerpt)
+        async for chunk in self._stream(prompt, context_cache, fallback):
+            yield chunk
+
+    async def process_answer(self, assignment_text: str, conversation_history: list, answer: str, question_number: int, custom_prompt: str = None, num_questions: int = 3, context_cache: str = None, excerpt: str = None, acknowledgement: str = None) -> dict:
+        prompt, fallback = self._answer_prompts(assignment_text, conversation_history, answer, question_number, custom_prompt, num_questions, context_cache, excerpt, acknowledgement)
+        return self.parse_response(await self._generate(prompt, context_cache, fallback))
+
+    async def stream_process_answer(self, assignment_text: str, conversation_history: list, answer: str, question_number: int, custom_prompt: str = None, num_questions: int = 3, context_cache: str = None, excerpt: str = None, acknowledgement: str = None) -> AsyncIterator[str]:
+        """Like process_answer, but yield the raw response text as Gemini streams it."""
+        prompt, fallback = self._answer_prompts(assignment_text, conversation_history, answer, question_number, custom_prompt, num_questions, context_cache, excerpt, acknowledgement)
+        async for chunk in self._stream(prompt, context_cache, fallback):
+            yield chunk
+
+    def start_inputs(self, assignment_text: str, custom_prompt: str = None, num_questions: int = 3, excerpt: str = None) -> tuple:
+        """(template, material) deciding the opening question: the model and prompt around the assignment, and the assignment text sent."""
+        template = "\n".join([
+            self.model.model_name, self._system_prompt(custom_prompt, num_questions), JSON_FORMAT_INSTRUCTIONS,
+            _assignment_part(assignment_text, excerpt)[0], START_INSTRUCTIONS,
+        ])
+        return template, _assignment_part(assignment_text, excerpt)[1]
+
+    def _start_prompts(self, assignment_text, custom_prompt, num_questions, context_cache, excerpt) -> tuple:
+        """(prompt, full-prompt fallback) for the opening question."""
+        full = self._build_start_prompt(assignment_text, custom_prompt, num_questions, excerpt)
+        if not context_cache:
+            return full, None
+        return START_INSTRUCTIONS, full
 
-    def start_session(self, assignment_text: str, custom_prompt: str = None, num_questions: int = 3) -> dict:
+    def _answer_prompts(self, assignment_text, conversation_history, answer, question_number, custom_prompt, num_questions, context_cache, excerpt, acknowledgement) -> tuple:
+        """(prompt, full-prompt fallback) for a follow-up turn."""
+        full = self._build_answer_prompt(assignment_text, conversation_history, answer, question_number, custom_prompt, num_questions, excerpt, acknowledgement)
+        if not context_cache:
+            return full, None
+        return self._build_turn_prompt(conversation_history, answer, question_number, num_questions, acknowledgement), full
+
+    def _model_for(self, context_cache: Optional[str]):
+        return self._client.cached_model(context_cache) if context_cache else self.model
+
+    async def _open(self, prompt: str, context_cache: Optional[str], fallback: Optional[str], stream: bool):
+        """Start a generate call, resending the full prompt if the context cache has expired."""
+        try:
+            return await self._call(self._model_for(context_cache), prompt, stream)
+        except (NotFound, PermissionDenied):
+            if not context_cache or fallback is None:
+                raise
+            print("[Gemini] Context cache expired, resending full prompt")
+            self.context_cache_expired = True
+            return await self._call(self.model, fallback, stream)
+
+    async def _call(self, model, prompt: str, stream: bool):
+        """Request schema-constrained JSON where the model supports it."""
+        limiter = get_limiter("gemini")
+        # A stream holds its concurrency slot until the reply is complete
+        send = limiter.call_stream if stream else limiter.call
+        model_name = getattr(model, "model_name", "")
+        if not get_settings().gemini_structured_output or model_name in _no_structured_output:
+            return await send(self._client.api_key, model.generate_content_async, prompt, stream=stream)
+        try:
+            return await send(
+                self._client.api_key, model.generate_content_async, prompt, stream=stream, generation_config=STRUCTURED_OUTPUT,
+            )
+        except InvalidArgument as e:
+            # A bad key or an oversized prompt is also InvalidArgument; only a
+            # rejected schema turns structured output off, and only for this model
+            if not _rejects_structured_output(e):
+                raise
+            print(f"[Gemini] {model_name} rejected structured output, using prompt-only JSON from now on: {e}")
+            _no_structured_output.add(model_name)
+            return await send(self._client.api_key, model.generate_content_async, prompt, stream=stream)
+
+    async def _generate(self, prompt: str, context_cache: str = None, fallback: str = None) -> str:
+        started = time.perf_counter()
+        with self._lease():
+            response = await self._open(prompt, context_cache, fallback, stream=False)
+        self._record_usage(response.usage_metadata, started)
+        return response.text
+
+    async def _stream(self, prompt: str, context_cache: str = None, fallback: str = None) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        usage = None
+        # The lease lasts until the stream is done with the channel. The
+        # stream is closed even if the consumer stops early, which frees
+        # the upstream slot.
+        with self._lease():
+            response = await self._open(prompt, context_cache, fallback, stream=True)
+            async with aclosing(response):
+                async for chunk in response:
+                    if chunk.usage_metadata:
+                        usage = chunk.usage_metadata
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. safety or finish metadata only)
+                        continue
+                    if text:
+                        yield text
+        self._record_usage(usage, started)
+
+    def _record_usage(self, usage, started: float) -> None:
+        self.last_usage = {
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0),
+            "cached_tokens": getattr(usage, "cached_content_token_count", 0),
+            "output_tokens": getattr(usage, "candidates_token_count", 0),
+            "latency_ms": round((time.perf_counter() - started) * 1000),
+        }
+        record_stage("gemini", time.perf_counter() - started)
+        for kind in ("prompt", "cached", "output"):
+            GEMINI_TOKENS.inc(self.last_usage[f"{kind}_tokens"] or 0, kind=kind)
+
+    def _system_prompt(self, custom_prompt: str = None, num_questions: int = 3) -> str:
         system_prompt = custom_prompt or SYSTEM_PROMPT
         # Replace the number of questions in the prompt if custom
         if num_questions != 3:
             system_prompt = system_prompt.replace("AFTER 3 ANSWERS:", f"AFTER {num_questions} ANSWERS:")
             system_prompt = system_prompt.replace("answered all three questions", f"answered all {num_questions} questions")
-        
-        prompt = f"""{system_prompt}
+        return system_prompt
+
+    def _build_start_prompt(self, assignment_text: str, custom_prompt: str = None, num_questions: int = 3, excerpt: str = None) -> str:
+        system_prompt = self._system_prompt(custom_prompt, num_questions)
+        note, text = _assignment_part(assignment_text, excerpt)
+        return f"""{system_prompt}
 
 {JSON_FORMAT_INSTRUCTIONS}
 
-Here is the student's assignment:
+Here is the student's assignment{note}:
 ---
-{assignment_text[:10000]}
+{text}
 ---
 
-Your response must include BOTH a greeting AND your first question in the "text" field. Example format:
-"Hi there! I've read your assignment about [specific topic from their work]. It's interesting how you approached [something specific]. My first question is: [your question about something specific from their assignment]?"
-
-Make sure the greeting mentions something specific from their assignment to show you actually read it."""
-
-        response = self.model.generate_content(prompt)
-        return self._parse_response(response.text)
+{START_INSTRUCTIONS}"""
 
-    def process_answer(self, assignment_text: str, conversation_history: list, answer: str, question_number: int, custom_prompt: str = None, num_questions: int = 3) -> dict:
-        system_prompt = custom_prompt or SYSTEM_PROMPT
-        # Replace the number of questions in the prompt if custom
-        if num_questions != 3:
-            system_prompt = system_prompt.replace("AFTER 3 ANSWERS:", f"AFTER {num_questions} ANSWERS:")
-            system_prompt = system_prompt.replace("answered all three questions", f"answered all {num_questions} questions")
-        
-        history_text = "\n".join([
+    def _history_text(self, conversation_history: list) -> str:
+        return "\n".join([
             f"{'Coach' if msg['role'] == 'ai' else 'Student'}: {msg['text']}"
             for msg in conversation_history[-6:]
         ])
 
+    def _answer_instruction(self, question_number: int, num_questions: int) -> str:
         if question_number < num_questions:
             next_q = question_number + 1
-            instruction = f"Now ask question {next_q}. Pick something different from what you already asked about. Reference a specific part of their assignment."
-        else:
-            instruction = f"""The student has answered all {num_questions} questions. Give a brief encouraging review (2-3 sentences) and an ACCURATE integrity score.
+            return f"Now ask question {next_q}. Pick something different from what you already asked about. Reference a specific part of their assignment."
+        return f"""The student has answered all {num_questions} questions. Give a brief encouraging review (2-3 sentences) and an ACCURATE integrity score.
 
 Use a PRECISE score (like 97, 88, 73, 91, 100) - NOT just multiples of 5!
 - If they answered excellently with clear understanding, give 95-100
@@ -115,97 +318,43 @@ Use a PRECISE score (like 97, 88, 73, 91, 100) - NOT just multiples of 5!
 - If adequate but some gaps, give 75-84
 - Score lower only if they struggled significantly"""
 
-        prompt = f"""{system_prompt}
+    def _build_answer_prompt(self, assignment_text: str, conversation_history: list, answer: str, question_number: int, custom_prompt: str = None, num_questions: int = 3, excerpt: str = None, acknowledgement: str = None) -> str:
+        system_prompt = self._system_prompt(custom_prompt, num_questions)
+        note, text = _assignment_part(assignment_text, excerpt)
+        return f"""{system_prompt}
 
 {JSON_FORMAT_INSTRUCTIONS}
 
-Assignment:
+Assignment{note}:
 ---
-{assignment_text[:4000]}
+{text}
 ---
 
-Conversation so far:
-{history_text}
+{self._build_turn_prompt(conversation_history, answer, question_number, num_questions, acknowledgement)}"""
+
+    def _build_turn_prompt(self, conversation_history: list, answer: str, question_number: int, num_questions: int = 3, acknowledgement: str = None) -> str:
+        """The per-turn part of the prompt: everything after the stable prefix."""
+        prompt = f"""Conversation so far:
+{self._history_text(conversation_history)}
 
 Student's latest answer: "{answer}"
 
-{instruction}"""
-
-        response = self.model.generate_content(prompt)
-        return self._parse_response(response.text)
-
-    def _parse_response(self, text: str) -> dict:
-        # Clean the response text
-        original_text = text
-        text = text.strip()
-        
-        print(f"[Gemini] Raw response length: {len(text)}")
-        print(f"[Gemini] Raw response preview: {text[:200]}...")
-        
-        # Remove markdown code blocks if present
-        if text.startswith("```"):
-            text = re.sub(r'^```(?:json)?\s*', '', text)
-            text = re.sub(r'\s*```$', '', text)
-        
-        # Try to parse as complete JSON first
-        try:
-            result = json.loads(text)
-            if isinstance(result, dict) and "text" in result:
-                print(f"[Gemini] Parsed JSON with text: {result['text'][:100]}...")
-                return result
-            if isinstance(result, dict) and "review" in result:
-                print(f"[Gemini] Parsed JSON with review")
-                return result
-        except json.JSONDecodeError as e:
-            print(f"[Gemini] JSON parse error: {e}")
-        
-        # Try to find JSON object with balanced braces
-        brace_count = 0
-        start_idx = -1
-        for i, char in enumerate(text):
-            if char == '{':
-                if start_idx == -1:
-                    start_idx = i
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0 and start_idx != -1:
-                    json_str = text[start_idx:i+1]
-                    try:
-                        result = json.loads(json_str)
-                        if isinstance(result, dict):
-                            print(f"[Gemini] Found embedded JSON")
-                            return result
-                    except json.JSONDecodeError:
-                        pass
-                    start_idx = -1
-        
-        # Last resort: extract text manually if JSON parsing completely fails
-        # Look for "text": "..." pattern
-        text_match = re.search(r'"text"\s*:\s*"([^"]*(?:\\.[^"]*)*)"', text)
-        if text_match:
-            extracted_text = text_match.group(1)
-            # Unescape JSON string
-            extracted_text = extracted_text.replace('\\"', '"').replace('\\n', '\n')
-            print(f"[Gemini] Extracted text from pattern: {extracted_text[:100]}...")
-            return {"type": "question", "number": 1, "text": extracted_text}
-        
-        # Try to extract review pattern
-        review_match = re.search(r'"review"\s*:\s*"([^"]*(?:\\.[^"]*)*)"', text)
-        if review_match:
-            extracted_review = review_match.group(1).replace('\\"', '"').replace('\\n', '\n')
-            score_match = re.search(r'"score"\s*:\s*(\d+)', text)
-            score = int(score_match.group(1)) if score_match else 75
-            print(f"[Gemini] Extracted review from pattern")
-            return {"type": "review", "score": score, "review": extracted_review, "observations": []}
-        
-        # If all else fails, use the raw text as a question
-        # Clean up any JSON artifacts
-        clean_text = re.sub(r'[\{\}"\[\]]', '', text)  # Remove JSON chars
-        clean_text = re.sub(r'\s+', ' ', clean_text).strip()  # Normalize whitespace
-        
-        if len(clean_text) < 10:
-            clean_text = "Hello! I've reviewed your assignment. Could you start by telling me about the main topic or goal of your work?"
-        
-        print(f"[Gemini] Using fallback text: {clean_text[:100]}...")
-        return {"type": "question", "number": 1, "text": clean_text}
+{self._answer_instruction(question_number, num_questions)}"""
+        if acknowledgement:
+            prompt += f"""
+
+You have already said "{acknowledgement}" out loud, so don't thank or acknowledge the answer again - continue directly from there."""
+        return prompt
+
+    def parse_response(self, text: str) -> dict:
+        """Parse a complete response, e.g. the accumulated chunks of a stream."""
+        parser = ResponseParser()
+        parser.feed(text)
+        result = parser.result()
+        self.record_outcome(parser.outcome)
+        return result
+
+    def record_outcome(self, outcome: str) -> None:
+        """Note in the last call's usage how its reply parsed (json, embedded_json, truncated or fallback)."""
+        if self.last_usage is not None:
+            self.last_usage["outcome"] = outcome
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for running several backend workers on one host.
+
+The app and its heavy libraries are imported once in the master and the
+workers are forked from it, so they start fast and share those pages
+copy-on-write. Run from backend/:
+    gunicorn main:app
+Needs a shared session store (SESSION_BACKEND=sqlite or redis).
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Warm-up finishes in the background, so workers boot well within this
+timeout = 60
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Libraries the app only imports on first use; loading them here puts them
+    # in the master's memory before the workers are forked
+    from startup import preload_modules
+
+    preload_modules()
@@ -0,0 +1,178 @@
+"""Turning a submission (one or more documents and zip archives) into one document."""
+
+import asyncio
+import io
+import time
+import zipfile
+from dataclasses import replace
+from typing import Iterator
+
+from config import get_settings
+from document_cache import parse_document_cached
+from executor import run_blocking
+from file_parser import ParsedDocument, Segment
+
+# Largest single document accepted, archive members included
+MAX_FILE_BYTES = 8 * 1024 * 1024
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "pptx", "txt")
+
+
+def extension(filename: str) -> str:
+    return filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+
+
+def iter_archive(data: bytes, max_total_bytes: int) -> Iterator[tuple]:
+    """Yield (filename, bytes) for the supported documents in a zip archive.
+
+    Sizes are checked from the archive directory before anything is
+    decompressed, so a zip bomb is rejected up front. Members are
+    decompressed in memory, one per step of the iterator; a member over
+    MAX_FILE_BYTES comes with None instead of its bytes.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not a valid zip archive: {e}")
+    entries = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and info.filename.rsplit("/", 1)[-1][:1] not in (".", "")
+        and extension(info.filename) in SUPPORTED_EXTENSIONS
+    ]
+    total = sum(info.file_size for info in entries)
+    if total > max_total_bytes:
+        raise ValueError(f"Archive expands to {total} bytes, more than the {max_total_bytes} byte limit")
+    for info in entries:
+        if info.file_size > MAX_FILE_BYTES:
+            yield info.filename, None
+            continue
+        yield info.filename, archive.read(info)
+
+
+def iter_submission(files: list, max_files: int, max_total_bytes: int) -> Iterator[tuple]:
+    """Yield (name, bytes) for every document of a submission, expanding zips as it goes.
+
+    Archive members are named "archive.zip/member.pdf". The limits apply to
+    the documents after expansion.
+    """
+    count = total = 0
+    for filename, data in files:
+        if extension(filename) == "zip":
+            prefix = f"{filename}/"
+            documents = iter_archive(data, max_total_bytes - total)
+        elif extension(filename) in SUPPORTED_EXTENSIONS:
+            prefix = ""
+            documents = [(filename, data if len(data) <= MAX_FILE_BYTES else None)]
+        else:
+            raise ValueError(f"{filename}: unsupported file type")
+        for name, document in documents:
+            count += 1
+            if count > max_files:
+                raise ValueError(f"Too many documents. Max {max_files} per submission.")
+            total += len(document) if document is not None else 0
+            if total > max_total_bytes:
+                raise ValueError("Submission too large")
+            yield prefix + name, document
+
+
+def merge(results: list, max_chars: int) -> ParsedDocument:
+    """One document from (name, ParsedDocument or exception) pairs, kept in order.
+
+    A single document keeps its text as extracted. Several are joined, each
+    under a line naming its file, up to `max_chars`. Either way every
+    segment records its file, and `sources` lists how each file fared.
+    """
+    sources = []
+    extracted = []
+    for name, result in results:
+        if isinstance(result, Exception):
+            sources.append({"name": name, "error": str(result) or type(result).__name__})
+            continue
+        sources.append({
+            "name": name, "chars": len(result.text), "segments": len(result.segments),
+            "truncated": result.truncated, "timed_out": result.timed_out,
+        })
+        if result.text:
+            extracted.append((name, result))
+    if not extracted:
+        failed = [source for source in sources if "error" in source]
+        if len(failed) == 1:
+            raise ValueError(f"Could not parse {failed[0]['name']}: {failed[0]['error']}")
+        raise ValueError("No text could be extracted from the submitted files")
+
+    if len(results) == 1:
+        name, document = extracted[0]
+        segments = [replace(segment, source=name) for segment in document.segments]
+        return replace(document, segments=segments, sources=sources)
+
+    parts = []
+    segments = []
+    length = 0
+    truncated = timed_out = False
+    for name, document in extracted:
+        header = f"[{name}]"
+        body = length + (1 if parts else 0) + len(header) + 1
+        if body >= max_chars:
+            truncated = True
+            break
+        text = document.text[:max_chars - body]
+        parts.append(f"{header}\n{text}")
+        for segment in document.segments:
+            if segment.start >= len(text):
+                break
+            end = min(segment.end, len(text))
+            segments.append(Segment(segment.kind, segment.index, text[segment.start:end], body + segment.start, body + end, name))
+        length = body + len(text)
+        truncated = truncated or document.truncated or len(text) < len(document.text)
+        timed_out = timed_out or document.timed_out
+    return ParsedDocument("\n".join(parts), segments, truncated, timed_out, sources)
+
+
+async def ingest(files: list) -> ParsedDocument:
+    """Extract every document of a submission in parallel and merge them in upload order.
+
+    Each document runs in the parse pool, at most one per pool process at a
+    time, and the next archive member is only decompressed once a process
+    is free for it. One wall-clock budget (INGEST_TIMEOUT_SECONDS) covers the
+    whole submission: a document gets what is left of it, and documents
+    reached after it ran out are skipped.
+    """
+    settings = get_settings()
+    deadline = time.monotonic() + settings.ingest_timeout_seconds
+    slots = asyncio.Semaphore(max(1, settings.parse_workers))
+    documents = iter_submission(files, settings.ingest_max_files, settings.ingest_max_total_bytes)
+    names = []
+    tasks = []
+
+    async def extract(name: str, data: bytes):
+        try:
+            if data is None:
+                raise ValueError("File too large. Max 8MB.")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Skipped: the submission ran out of time")
+            return await parse_document_cached(
+                name, data, max_chars=settings.parse_max_chars,
+                timeout=min(settings.parse_timeout_seconds, remaining),
+            )
+        except Exception as e:
+            return e
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            item = await run_blocking(next, documents, None)
+            if item is None:
+                slots.release()
+                break
+            names.append(item[0])
+            tasks.append(asyncio.create_task(extract(*item)))
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return merge(list(zip(names, results)), settings.parse_max_chars)
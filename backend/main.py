@@ -1,15 +1,63 @@
+import time
+
+# Measured from the top so the figure covers every import the app pulls in
+_import_started = time.perf_counter()
+
+import asyncio
+import base64
+import copy
+import json
+import math
+import secrets
+import struct
 import uuid
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
-from file_parser import parse_file
+from analytics import get_analytics
+from document_cache import get_document_cache
 from gemini_service import GeminiService
-from tts_service import text_to_speech_base64
+from response_parser import ResponseParser
+from stt_service import SAMPLE_RATE, SpeechStream, speech_available
+from tts_service import synthesize, tts_stats, SentenceSplitter, TurnVoice, split_sentences
+from audio_cache import get_audio_cache
 from config import get_settings
+from executor import run_blocking, shutdown_executors
+from session_store import create_session_store
+from excerpts import opening_excerpt, turn_excerpt, chunks_covered_by
+from clients import get_client_registry
+from speculation import get_speculator
+from upstream import UpstreamBusy, get_limiter
+from batch import get_batch_runner, get_prepared_sessions, new_job
+from ingest import ingest, iter_submission
+from opening_cache import get_opening_cache, replay
+from startup import is_ready, record_import, warm_up, worker_stats
+from metrics import REGISTRY, SESSIONS, record_component_stats, server_timing, start_request_spans, timed, update_ratios
+
+# Shared session storage; backend selected by SESSION_BACKEND
+sessions = create_session_store()
+
 
-app = FastAPI(title="Assignment Authenticity Checker API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warming = asyncio.create_task(warm_up(sessions))
+    yield
+    warming.cancel()
+    shutdown_executors()
+    await get_speculator().aclose()
+    await get_batch_runner().aclose()
+    await get_batch_runner().jobs.close()
+    await get_prepared_sessions().close()
+    await get_analytics().aclose()
+    await sessions.close()
+    await get_client_registry().aclose()
+
+
+app = FastAPI(title="Assignment Authenticity Checker API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,10 +65,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# In-memory session storage (use Redis/DB for production)
-sessions: dict = {}
+
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy(request, exc: UpstreamBusy):
+    """Shed load with a retry hint instead of failing the request."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy, please retry in {math.ceil(exc.retry_after)} seconds"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+@app.middleware("http")
+async def add_server_timing(request, call_next):
+    """Report the stages this request spent time in (before the body started streaming)."""
+    spans = start_request_spans()
+    response = await call_next(request)
+    if spans:
+        response.headers["Server-Timing"] = server_timing(spans)
+    return response
 
 
 class AnswerRequest(BaseModel):
@@ -32,86 +98,250 @@ class SessionResponse(BaseModel):
     session_id: str
     message_type: str  # "question" or "review"
     text: str
-    audio_base64: str
+    audio_url: Optional[str] = None  # GET for audio/mpeg; supports Range requests
     question_number: Optional[int] = None
     score: Optional[int] = None
     observations: Optional[list] = None
     assignment_text: Optional[str] = None
+    sources: Optional[list] = None  # Files the assignment was extracted from (upload only)
+    usage: Optional[dict] = None  # Gemini token counts and latency for this turn
 
 
-@app.post("/api/upload", response_model=SessionResponse)
-async def upload_assignment(
-    file: UploadFile = File(...),
-    gemini_api_key: Optional[str] = Form(None),
-    elevenlabs_api_key: Optional[str] = Form(None),
-    custom_prompt: Optional[str] = Form(None),
-    num_questions: Optional[int] = Form(None),
-):
-    """Upload an assignment file and start the interview session."""
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No file provided")
-
-    allowed_extensions = {"pdf", "docx", "pptx", "txt"}
-    ext = file.filename.lower().split(".")[-1] if "." in file.filename else ""
+def _check_extension(filename: str, archives: bool = False) -> None:
+    allowed_extensions = {"pdf", "docx", "pptx", "txt"} | ({"zip"} if archives else set())
+    ext = filename.lower().split(".")[-1] if "." in filename else ""
     if ext not in allowed_extensions:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Unsupported file type. Allowed: {', '.join(sorted(allowed_extensions))}"
         )
 
-    file_bytes = await file.read()
-    if len(file_bytes) > 8 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Max 8MB.")
 
+async def _read_assignment(files: List[UploadFile]) -> tuple:
+    """Validate the uploaded files (documents and/or zips of them) and extract their text as one assignment."""
+    if not files or not all(file.filename for file in files):
+        raise HTTPException(status_code=400, detail="No file provided")
+    for file in files:
+        _check_extension(file.filename, archives=True)
+
+    with timed("upload_read"):
+        submission = [(file.filename, await file.read()) for file in files]
+    return await _extract_assignment(submission)
+
+
+async def _extract_assignment(submission: list) -> tuple:
+    """(text, per-file sources) of a submission given as (filename, bytes) pairs."""
     try:
-        assignment_text = parse_file(file.filename, file_bytes)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Could not parse file: {str(e)}")
+        with timed("parse"):
+            document = await ingest(submission)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if document.truncated:
+        names = ", ".join(source["name"] for source in document.sources)
+        print(f"Extraction of {names} stopped early after {len(document.segments)} segments")
+    assignment_text = document.text
 
     if len(assignment_text.split()) < 50:
         raise HTTPException(
             status_code=400,
             detail="Assignment too short. Need at least 50 words."
         )
+    return assignment_text, document.sources
 
-    # Start Gemini session with custom settings
+
+def _gemini(api_key: Optional[str]) -> GeminiService:
     try:
-        gemini = GeminiService(api_key=gemini_api_key)
-        response = gemini.start_session(
-            assignment_text, 
-            custom_prompt=custom_prompt,
-            num_questions=num_questions or 3
-        )
+        return GeminiService(api_key=api_key)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
-    session_id = str(uuid.uuid4())
-    question_text = response.get("text", "")
 
-    # Generate audio with custom ElevenLabs key if provided
+async def _safe_tts(text: str, voice: TurnVoice) -> str:
     try:
-        audio_base64 = text_to_speech_base64(question_text, elevenlabs_api_key=elevenlabs_api_key)
+        _, audio = await voice.synthesize(text)
+        return base64.b64encode(audio).decode("utf-8")
     except Exception:
-        audio_base64 = ""
+        return ""
 
-    # Store session with custom settings
-    sessions[session_id] = {
+
+async def _safe_tts_bytes(text: str, voice: TurnVoice) -> bytes:
+    try:
+        _, audio = await voice.synthesize(text)
+        return audio
+    except Exception:
+        return b""
+
+
+async def _safe_synthesize(text: str, elevenlabs_api_key: Optional[str]) -> Optional[str]:
+    """Synthesize into the audio cache and return the cache key (None on failure)."""
+    try:
+        key, _ = await synthesize(text, elevenlabs_api_key=elevenlabs_api_key)
+        return key
+    except Exception:
+        return None
+
+
+async def _opening_question(gemini: GeminiService, assignment_text: str, custom_prompt: Optional[str], num_questions: int, context_cache: Optional[str] = None) -> dict:
+    """gemini.start_session, answered from the opening cache when the assignment was seen recently."""
+    excerpt = await run_blocking(opening_excerpt, assignment_text)
+    cache = get_opening_cache()
+    lookup = await cache.lookup(*gemini.start_inputs(assignment_text, custom_prompt, num_questions, excerpt))
+    if lookup.response is not None:
+        gemini.last_usage = {"opening_cache": lookup.match}
+        return lookup.response
+    return await cache.generate(lookup, lambda: gemini.start_session(
+        assignment_text, custom_prompt=custom_prompt, num_questions=num_questions,
+        context_cache=context_cache, excerpt=excerpt,
+    ))
+
+
+def _audio_url(session_id: str, turn: int) -> str:
+    return f"/api/session/{session_id}/audio/{turn}"
+
+
+async def _new_session(assignment_text: str, question_text: str, audio_key: Optional[str], custom_prompt, num_questions, gemini_api_key, elevenlabs_api_key, gemini: GeminiService, context_cache: Optional[str]) -> dict:
+    return {
         "assignment_text": assignment_text,
         "conversation": [{"role": "ai", "text": question_text}],
+        # Audio cache key per AI turn; None means synthesize on first request
+        "audio": [audio_key],
         "question_number": 1,
         "custom_prompt": custom_prompt,
-        "num_questions": num_questions or 3,
+        "num_questions": num_questions,
         "gemini_api_key": gemini_api_key,
         "elevenlabs_api_key": elevenlabs_api_key,
+        # Server-side Gemini context cache holding the prompt prefix, if enabled
+        "context_cache": None if gemini.context_cache_expired else context_cache,
+        "usage": [gemini.last_usage],
+        "started_at": time.time(),
+        # Excerpt chunks already asked about, so later turns move on to new material
+        "covered_chunks": await run_blocking(chunks_covered_by, assignment_text, question_text),
     }
 
+
+async def _answer_kwargs(session: dict, answer: str, prepared=None) -> dict:
+    """Arguments for a follow-up call; the excerpt is ranked on a worker thread."""
+    last_question = next((msg["text"] for msg in reversed(session["conversation"]) if msg["role"] == "ai"), "")
+    return dict(
+        assignment_text=session["assignment_text"],
+        conversation_history=session["conversation"],
+        answer=answer,
+        question_number=session["question_number"],
+        custom_prompt=session.get("custom_prompt"),
+        num_questions=session.get("num_questions", 3),
+        context_cache=session.get("context_cache"),
+        excerpt=await run_blocking(
+            turn_excerpt, session["assignment_text"], f"{last_question}\n{answer}", session.get("covered_chunks", []),
+            fresh=prepared.fresh_chunks if prepared else None,
+        ),
+    )
+
+
+async def _finish_turn(session_id: str, session: dict, response: dict, audio_key: Optional[str], gemini: GeminiService, elevenlabs_api_key: Optional[str] = None) -> SessionResponse:
+    """Record the AI reply in the session and build the client response."""
+    response_type = response.get("type", "question")
+    response_text = response.get("text") or response.get("review", "")
+
+    session["conversation"].append({"role": "ai", "text": response_text})
+    session.setdefault("audio", []).append(audio_key)
+    session.setdefault("usage", []).append(gemini.last_usage)
+    covered = await run_blocking(chunks_covered_by, session["assignment_text"], response_text)
+    session["covered_chunks"] = sorted(set(session.get("covered_chunks", [])) | set(covered))
+    audio_url = _audio_url(session_id, len(session["audio"]) - 1)
+    if gemini.context_cache_expired:
+        session["context_cache"] = None
+
+    if response_type == "review":
+        # Keep the finished session until its TTL so the review audio and
+        # transcript can still be fetched, but accept no further answers.
+        session["completed"] = True
+        session["score"] = response.get("score")
+        session["observations"] = response.get("observations", [])
+        await sessions.put(session_id, session)
+        get_analytics().record(session_id, session)
+        if session.get("context_cache"):
+            await gemini.delete_context_cache(session["context_cache"])
+        return SessionResponse(
+            session_id=session_id,
+            message_type="review",
+            text=response_text,
+            audio_url=audio_url,
+            score=response.get("score"),
+            observations=response.get("observations", []),
+            usage=gemini.last_usage,
+        )
+
+    session["question_number"] += 1
+    await sessions.put(session_id, session)
+    get_speculator().start(session_id, session, gemini, elevenlabs_api_key)
+    return SessionResponse(
+        session_id=session_id,
+        message_type="question",
+        text=response_text,
+        audio_url=audio_url,
+        question_number=session["question_number"],
+        usage=gemini.last_usage,
+    )
+
+
+async def _load_active_session(session_id: str) -> dict:
+    session = await sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.get("completed"):
+        raise HTTPException(status_code=409, detail="Session already completed")
+    return session
+
+
+@app.post("/api/upload", response_model=SessionResponse)
+async def upload_assignment(
+    file: List[UploadFile] = File(...),
+    gemini_api_key: Optional[str] = Form(None),
+    elevenlabs_api_key: Optional[str] = Form(None),
+    custom_prompt: Optional[str] = Form(None),
+    num_questions: Optional[int] = Form(None),
+):
+    """Upload an assignment and start the interview session.
+
+    Several files and zip archives may be sent as repeated `file` fields;
+    they are extracted in parallel and interviewed on as one assignment.
+    """
+    get_limiter("gemini").check()
+    assignment_text, sources = await _read_assignment(file)
+
+    # Start Gemini session with custom settings
+    gemini = _gemini(gemini_api_key)
+    try:
+        context_cache = await gemini.create_context_cache(assignment_text, custom_prompt, num_questions or 3)
+        response = await _opening_question(gemini, assignment_text, custom_prompt, num_questions or 3, context_cache)
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
+
+    session_id = str(uuid.uuid4())
+    question_text = response.get("text", "")
+
+    # Generate audio with custom ElevenLabs key if provided (a cache hit for a reused question)
+    audio_key = await _safe_synthesize(question_text, elevenlabs_api_key)
+
+    # Store session with custom settings
+    session = await _new_session(
+        assignment_text, question_text, audio_key, custom_prompt, num_questions or 3,
+        gemini_api_key, elevenlabs_api_key, gemini, context_cache,
+    )
+    await sessions.put(session_id, session)
+    get_speculator().start(session_id, session, gemini, elevenlabs_api_key)
+
     return SessionResponse(
         session_id=session_id,
         message_type="question",
         text=question_text,
-        audio_base64=audio_base64,
+        audio_url=_audio_url(session_id, 0),
         question_number=1,
         assignment_text=assignment_text[:3000],  # Send first 3000 chars for ElevenLabs context
+        sources=sources,
+        usage=gemini.last_usage,
     )
 
 
@@ -122,9 +352,8 @@ async def submit_answer(
     x_elevenlabs_api_key: Optional[str] = Header(None),
 ):
     """Submit a student answer and get the next question or final review."""
-    session = sessions.get(request.session_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+    get_limiter("gemini").check()
+    session = await _load_active_session(request.session_id)
 
     # Use API keys from headers or session
     gemini_api_key = x_gemini_api_key or session.get("gemini_api_key")
@@ -132,65 +361,710 @@ async def submit_answer(
 
     # Add student answer to conversation
     session["conversation"].append({"role": "student", "text": request.answer})
+    prepared = get_speculator().take(request.session_id, session["question_number"])
 
     # Get next response from Gemini
+    gemini = _gemini(gemini_api_key)
     try:
-        gemini = GeminiService(api_key=gemini_api_key)
-        response = gemini.process_answer(
-            assignment_text=session["assignment_text"],
-            conversation_history=session["conversation"],
-            answer=request.answer,
-            question_number=session["question_number"],
-            custom_prompt=session.get("custom_prompt"),
-            num_questions=session.get("num_questions", 3),
-        )
+        response = await gemini.process_answer(**await _answer_kwargs(session, request.answer, prepared))
+    except UpstreamBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
-    response_type = response.get("type", "question")
     response_text = response.get("text") or response.get("review", "")
 
     # Generate audio with custom ElevenLabs key if provided
+    audio_key = await _safe_synthesize(response_text, elevenlabs_api_key)
+
+    return await _finish_turn(request.session_id, session, response, audio_key, gemini, elevenlabs_api_key)
+
+
+# --- Streaming (Server-Sent Events) ---------------------------------------
+#
+# The streaming endpoints emit, in order:
+#   event: session  {"session_id", "assignment_text", "sources"}  (upload only)
+#   event: text     {"index", "text"}                      one per sentence
+#   event: audio    {"index", "audio_base64"}              in sentence order
+#   event: done     SessionResponse fields (audio_url replays the whole turn)
+#   event: error    {"detail"}
+
+def _error_payload(e: Exception) -> dict:
+    if isinstance(e, UpstreamBusy):
+        return {"detail": f"Server busy, please retry in {math.ceil(e.retry_after)} seconds", "retry_after": math.ceil(e.retry_after)}
+    return {"detail": f"AI service error: {str(e)}"}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_turn(gemini: GeminiService, chunks: AsyncIterator[str], elevenlabs_api_key: Optional[str], first_index: int = 0, binary_audio: bool = False) -> AsyncIterator[tuple]:
+    """Turn streamed Gemini output into sentence text and in-order audio events.
+
+    Each sentence is sent to TTS as soon as it is complete, so synthesis of
+    early sentences overlaps with generation of later ones. Sentence indexes
+    start at `first_index`. Audio events carry base64 ("audio_base64"), or raw
+    MP3 bytes ("audio") with `binary_audio`. The final ("result",
+    parsed_response) item is yielded last.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    pending: asyncio.Queue = asyncio.Queue()
+    tts_tasks = []
+    tts, audio_field = (_safe_tts_bytes, "audio") if binary_audio else (_safe_tts, "audio_base64")
+    # One engine for the whole reply, so its sentences share a voice
+    voice = TurnVoice(elevenlabs_api_key)
+
+    def speak(sentence: str):
+        index = first_index + len(tts_tasks)
+        task = asyncio.create_task(tts(sentence, voice))
+        tts_tasks.append(task)
+        events.put_nowait(("text", {"index": index, "text": sentence}))
+        pending.put_nowait((index, task))
+
+    async def produce():
+        parser = ResponseParser()
+        splitter = SentenceSplitter()
+        try:
+            async for chunk in chunks:
+                for sentence in splitter.feed(parser.feed(chunk)):
+                    speak(sentence)
+            for sentence in splitter.flush():
+                speak(sentence)
+            result = parser.result()
+            gemini.record_outcome(parser.outcome)
+            if not tts_tasks:
+                # Output wasn't JSON we could stream from; speak the parsed text instead
+                for sentence in split_sentences(result.get("text") or result.get("review", "")):
+                    speak(sentence)
+            return result
+        finally:
+            pending.put_nowait(None)
+
+    async def emit_audio():
+        while (item := await pending.get()) is not None:
+            index, task = item
+            events.put_nowait(("audio", {"index": index, audio_field: await task}))
+        events.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    emitter = asyncio.create_task(emit_audio())
     try:
-        audio_base64 = text_to_speech_base64(response_text, elevenlabs_api_key=elevenlabs_api_key)
-    except Exception:
-        audio_base64 = ""
+        while (event := await events.get()) is not None:
+            yield event
+        yield ("result", await producer)
+    finally:
+        for task in (producer, emitter, *tts_tasks):
+            task.cancel()
 
-    # Update session
-    session["conversation"].append({"role": "ai", "text": response_text})
 
-    if response_type == "review":
-        # Clean up session after review
-        del sessions[request.session_id]
-        return SessionResponse(
-            session_id=request.session_id,
-            message_type="review",
-            text=response_text,
-            audio_base64=audio_base64,
-            score=response.get("score"),
-            observations=response.get("observations", []),
+def _event_stream(body: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/upload/stream")
+async def upload_assignment_stream(
+    file: List[UploadFile] = File(...),
+    gemini_api_key: Optional[str] = Form(None),
+    elevenlabs_api_key: Optional[str] = Form(None),
+    custom_prompt: Optional[str] = Form(None),
+    num_questions: Optional[int] = Form(None),
+):
+    """Like /api/upload, but stream the opening question and its audio sentence by sentence."""
+    get_limiter("gemini").check()
+    assignment_text, sources = await _read_assignment(file)
+    gemini = _gemini(gemini_api_key)
+    session_id = str(uuid.uuid4())
+
+    async def body():
+        yield _sse("session", {"session_id": session_id, "assignment_text": assignment_text[:3000], "sources": sources})
+        response = None
+        try:
+            context_cache = await gemini.create_context_cache(assignment_text, custom_prompt, num_questions or 3)
+            excerpt = await run_blocking(opening_excerpt, assignment_text)
+            cache = get_opening_cache()
+            lookup = await cache.lookup(*gemini.start_inputs(assignment_text, custom_prompt, num_questions or 3, excerpt))
+            if lookup.response is not None:
+                # Replayed through the same path, so its sentences and (cached) audio still stream
+                chunks = replay(lookup.response)
+            else:
+                chunks = gemini.stream_start_session(
+                    assignment_text, custom_prompt=custom_prompt, num_questions=num_questions or 3,
+                    context_cache=context_cache, excerpt=excerpt,
+                )
+            async for event, data in _stream_turn(gemini, chunks, elevenlabs_api_key):
+                if event == "result":
+                    response = data
+                else:
+                    yield _sse(event, data)
+            if lookup.response is not None:
+                gemini.last_usage = {"opening_cache": lookup.match}
+            cache.store(lookup, response)
+        except Exception as e:
+            yield _sse("error", _error_payload(e))
+            return
+
+        question_text = response.get("text", "")
+        session = await _new_session(
+            assignment_text, question_text, None, custom_prompt, num_questions or 3,
+            gemini_api_key, elevenlabs_api_key, gemini, context_cache,
         )
-    else:
-        session["question_number"] += 1
-        return SessionResponse(
-            session_id=request.session_id,
-            message_type="question",
-            text=response_text,
-            audio_base64=audio_base64,
-            question_number=session["question_number"],
+        await sessions.put(session_id, session)
+        get_speculator().start(session_id, session, gemini, elevenlabs_api_key)
+        yield _sse("done", {
+            "session_id": session_id, "message_type": "question", "text": question_text,
+            "audio_url": _audio_url(session_id, 0), "question_number": 1, "usage": gemini.last_usage,
+        })
+
+    return _event_stream(body())
+
+
+async def _answer_events(session_id: str, session: dict, answer: str, gemini: GeminiService, elevenlabs_api_key: Optional[str], binary_audio: bool = False) -> AsyncIterator[tuple]:
+    """Run one answer turn, yielding the (event, data) pairs of /api/answer/stream.
+
+    The session is saved only once the reply is complete; a turn that fails
+    or is cancelled leaves the stored session untouched.
+    """
+    session["conversation"].append({"role": "student", "text": answer})
+    prepared = get_speculator().take(session_id, session["question_number"])
+    # A pre-synthesized acknowledgement plays while the reply is generated
+    acknowledgement = prepared.phrase if prepared and prepared.phrase_audio else None
+
+    first_index = 0
+    if acknowledgement:
+        yield ("text", {"index": 0, "text": acknowledgement})
+        if binary_audio:
+            yield ("audio", {"index": 0, "audio": base64.b64decode(prepared.phrase_audio)})
+        else:
+            yield ("audio", {"index": 0, "audio_base64": prepared.phrase_audio})
+        first_index = 1
+    chunks = gemini.stream_process_answer(**await _answer_kwargs(session, answer, prepared), acknowledgement=acknowledgement)
+    response = None
+    try:
+        async for event, data in _stream_turn(gemini, chunks, elevenlabs_api_key, first_index, binary_audio):
+            if event == "result":
+                response = data
+            else:
+                yield (event, data)
+    except Exception as e:
+        yield ("error", _error_payload(e))
+        return
+
+    if acknowledgement:
+        # Keep the transcript and turn audio in line with what was spoken
+        field = "text" if response.get("text") else "review"
+        response[field] = f"{acknowledgement} {response.get(field, '')}".strip()
+    message = await _finish_turn(session_id, session, response, None, gemini, elevenlabs_api_key)
+    yield ("done", message.model_dump(exclude_none=True))
+
+
+@app.post("/api/answer/stream")
+async def submit_answer_stream(
+    request: AnswerRequest,
+    x_gemini_api_key: Optional[str] = Header(None),
+    x_elevenlabs_api_key: Optional[str] = Header(None),
+):
+    """Like /api/answer, but stream the reply text and audio sentence by sentence."""
+    get_limiter("gemini").check()
+    session = await _load_active_session(request.session_id)
+
+    gemini_api_key = x_gemini_api_key or session.get("gemini_api_key")
+    elevenlabs_api_key = x_elevenlabs_api_key or session.get("elevenlabs_api_key")
+    gemini = _gemini(gemini_api_key)
+
+    async def body():
+        async for event, data in _answer_events(request.session_id, session, request.answer, gemini, elevenlabs_api_key):
+            yield _sse(event, data)
+
+    return _event_stream(body())
+
+
+# --- Interview WebSocket ---------------------------------------------------
+#
+# /api/session/{session_id}/ws carries a whole interview over one connection.
+# The session and API keys are loaded once and kept for the connection.
+#
+# Client -> server (JSON text frames):
+#   {"type": "hello", "gemini_api_key"?, "elevenlabs_api_key"?}   keys, once
+#   {"type": "answer", "text"}      start a turn
+#   {"type": "partial", "text"}     interim transcript; barges in on a running turn
+#   {"type": "cancel"}              stop the running turn
+#   {"type": "audio_start", "sample_rate"?}   server-side recognition (STT_ENABLED):
+#       binary frames of 16-bit mono PCM follow; speech barges in on a running
+#       turn and the turn starts by itself once the student stops talking
+#   {"type": "audio_end", "submit"?}  end the answer now (or drop it, submit=false)
+#   {"type": "ping"}
+# Server -> client:
+#   {"type": "ready", "session_id", "question_number", "completed", "stt", "sample_rate"}
+#   {"type": "listening", "sample_rate"}
+#   {"type": "transcript", "text", "final", "answered"?}   recognized speech; a
+#       final one with answered=true is followed by the turn's events
+#   {"type": "text", "index", "text"}, then a binary frame per sentence:
+#       4-byte big-endian sentence index + MP3 bytes
+#   {"type": "done", ...SessionResponse fields}
+#   {"type": "cancelled"}, {"type": "error", "detail", "source"?}, {"type": "pong"}
+# A cancelled or failed turn is not recorded, so the answer can be given again.
+# Errors with source "stt" concern recognition; the client falls back to its own.
+
+WS_SESSION_NOT_FOUND = 4404
+
+
+class _InterviewConnection:
+    """Per-connection interview state: the live session, keys and running turn."""
+
+    def __init__(self, websocket: WebSocket, session_id: str, session: dict):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.session = session
+        self.gemini_api_key = session.get("gemini_api_key")
+        self.elevenlabs_api_key = session.get("elevenlabs_api_key")
+        self.turn: Optional[asyncio.Task] = None
+        # Answer being recognized on the server, when the client streams audio
+        self.speech: Optional[SpeechStream] = None
+        self._heard = ""
+        # Turn events and control replies come from different tasks
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: dict) -> None:
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def send_audio(self, index: int, audio: bytes) -> None:
+        async with self._send_lock:
+            await self.websocket.send_bytes(struct.pack(">I", index) + audio)
+
+    @property
+    def turn_running(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    def start_turn(self, answer: str) -> None:
+        self.turn = asyncio.create_task(self._run_turn(answer))
+
+    async def cancel_turn(self) -> None:
+        if not self.turn_running:
+            return
+        self.turn.cancel()
+        try:
+            await self.turn
+        except asyncio.CancelledError:
+            pass
+        await self.send({"type": "cancelled"})
+
+    async def start_listening(self, sample_rate: int) -> None:
+        if not speech_available():
+            await self.send({"type": "error", "source": "stt", "detail": "Server speech recognition is not enabled"})
+            return
+        self.speech = SpeechStream(sample_rate)
+        self._heard = ""
+        await self.send({"type": "listening", "sample_rate": sample_rate})
+
+    async def hear(self, pcm: bytes) -> None:
+        """Feed microphone audio; once the student stops talking, the reply starts."""
+        if self.speech is None:
+            return
+        try:
+            update = await self.speech.feed(pcm)
+        except Exception as e:
+            # Missing package or model: the client falls back to browser recognition
+            print(f"Speech recognition failed: {e}")
+            self.speech = None
+            await self.send({"type": "error", "source": "stt", "detail": "Server speech recognition is unavailable"})
+            return
+        if update.started:
+            # The student started talking over the reply: drop it
+            await self.cancel_turn()
+        if update.text != self._heard:
+            self._heard = update.text
+            await self.send({"type": "transcript", "text": update.text, "final": False})
+        if update.ended:
+            await self.stop_listening(submit=True, resume=True)
+
+    async def stop_listening(self, submit: bool, resume: bool = False) -> None:
+        """End the answer being recognized; with `submit`, answer with its transcript.
+
+        With `resume`, an answer that turned out to be only noise keeps the
+        stream open for the actual answer.
+        """
+        speech, self.speech = self.speech, None
+        if speech is None:
+            return
+        text = (await speech.finish()).strip()
+        if not submit:
+            return
+        if not text:
+            if resume:
+                self.speech = SpeechStream(speech.sample_rate)
+                self._heard = ""
+            await self.send({"type": "transcript", "text": "", "final": True, "answered": False})
+            return
+        answered = not self.turn_running and not self.session.get("completed")
+        await self.send({"type": "transcript", "text": text, "final": True, "answered": answered})
+        if answered:
+            self.start_turn(text)
+
+    async def _run_turn(self, answer: str) -> None:
+        try:
+            get_limiter("gemini").check()
+            gemini = _gemini(self.gemini_api_key)
+        except UpstreamBusy as e:
+            await self.send({"type": "error", **_error_payload(e)})
+            return
+        except HTTPException as e:
+            await self.send({"type": "error", "detail": e.detail})
+            return
+        # Work on a copy so a cancelled turn leaves the connection's session as it was
+        working = copy.deepcopy(self.session)
+        try:
+            async for event, data in _answer_events(
+                self.session_id, working, answer, gemini, self.elevenlabs_api_key, binary_audio=True,
+            ):
+                if event == "audio":
+                    await self.send_audio(data["index"], data["audio"])
+                    continue
+                if event == "done":
+                    self.session = working
+                await self.send({"type": event, **data})
+        except (WebSocketDisconnect, RuntimeError):
+            # The client went away mid-turn
+            pass
+
+
+@app.websocket("/api/session/{session_id}/ws")
+async def interview_socket(websocket: WebSocket, session_id: str):
+    """One connection per interview: answers (text or audio) in, streamed question text and audio out."""
+    await websocket.accept()
+    session = await sessions.get(session_id)
+    if not session:
+        await websocket.close(code=WS_SESSION_NOT_FOUND, reason="Session not found")
+        return
+    connection = _InterviewConnection(websocket, session_id, session)
+    await connection.send({
+        "type": "ready", "session_id": session_id,
+        "question_number": session["question_number"], "completed": bool(session.get("completed")),
+        "stt": speech_available(), "sample_rate": SAMPLE_RATE,
+    })
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if frame.get("bytes") is not None:
+                # Microphone audio: 16-bit little-endian mono PCM
+                await connection.hear(frame["bytes"])
+                continue
+            try:
+                message = json.loads(frame.get("text") or "")
+                kind = message.get("type")
+            except (ValueError, AttributeError):
+                await connection.send({"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+
+            if kind == "hello":
+                connection.gemini_api_key = message.get("gemini_api_key") or connection.gemini_api_key
+                connection.elevenlabs_api_key = message.get("elevenlabs_api_key") or connection.elevenlabs_api_key
+            elif kind == "answer":
+                answer = str(message.get("text") or "").strip()
+                if connection.turn_running:
+                    await connection.send({"type": "error", "detail": "A reply is already being generated"})
+                elif connection.session.get("completed"):
+                    await connection.send({"type": "error", "detail": "Session already completed"})
+                elif not answer:
+                    await connection.send({"type": "error", "detail": "Empty answer"})
+                else:
+                    connection.start_turn(answer)
+            elif kind == "partial":
+                # The student started talking over the reply: drop it
+                if str(message.get("text") or "").strip():
+                    await connection.cancel_turn()
+            elif kind == "audio_start":
+                try:
+                    sample_rate = min(48000, max(8000, int(message.get("sample_rate") or SAMPLE_RATE)))
+                except (TypeError, ValueError):
+                    sample_rate = SAMPLE_RATE
+                await connection.start_listening(sample_rate)
+            elif kind == "audio_end":
+                # submit=false discards the audio, e.g. when the client sends the answer as text
+                await connection.stop_listening(submit=message.get("submit", True) is not False)
+            elif kind == "cancel":
+                await connection.cancel_turn()
+            elif kind == "ping":
+                await connection.send({"type": "pong"})
+            else:
+                await connection.send({"type": "error", "detail": f"Unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection.speech = None
+        if connection.turn_running:
+            connection.turn.cancel()
+
+
+# --- Batch preparation -----------------------------------------------------
+#
+# POST /api/batch takes many assignment files (and/or zips of them) and
+# prepares one ready-to-start session per submission in the background.
+# GET /api/batch/{job_id} reports progress and the prepared session ids;
+# a student starts theirs with GET /api/session/{session_id}/start.
+
+@app.post("/api/batch", status_code=202)
+async def create_batch(
+    files: List[UploadFile] = File(...),
+    gemini_api_key: Optional[str] = Form(None),
+    elevenlabs_api_key: Optional[str] = Form(None),
+    custom_prompt: Optional[str] = Form(None),
+    num_questions: Optional[int] = Form(None),
+):
+    """Queue a batch of submissions; their sessions are prepared in the background."""
+    settings = get_settings()
+    uploads = []
+    for file in files:
+        _check_extension(file.filename or "", archives=True)
+        uploads.append((file.filename or "", await file.read()))
+    # One budget for the whole batch: each archive may only expand into what
+    # the uploads before it left over, checked before a member is decompressed
+    documents = iter_submission(uploads, settings.batch_max_files, settings.batch_max_total_bytes)
+    try:
+        submissions = await run_blocking(list, documents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not submissions:
+        raise HTTPException(status_code=400, detail="No supported files in the batch")
+    _gemini(gemini_api_key)  # Fail now rather than per file if no Gemini key is available
+
+    job = new_job([filename for filename, _ in submissions])
+
+    async def prepare(filename: str, data: bytes) -> str:
+        assignment_text, _ = await _extract_assignment([(filename, data)])
+        gemini = _gemini(gemini_api_key)
+        # No context cache: it would likely expire before the student starts
+        response = await _opening_question(gemini, assignment_text, custom_prompt, num_questions or 3)
+        question_text = response.get("text", "")
+        audio_key = await _safe_synthesize(question_text, elevenlabs_api_key)
+        session = await _new_session(
+            assignment_text, question_text, audio_key, custom_prompt, num_questions or 3,
+            gemini_api_key, elevenlabs_api_key, gemini, None,
         )
+        session["batch"] = {"job_id": job["job_id"], "filename": filename}
+        session_id = str(uuid.uuid4())
+        await get_prepared_sessions().put(session_id, session)
+        return session_id
+
+    runner = get_batch_runner()
+    await runner.jobs.put(job["job_id"], job)
+    runner.submit(job, submissions, prepare)
+    return {"job_id": job["job_id"], "status_url": f"/api/batch/{job['job_id']}", "total": job["total"]}
+
+
+@app.get("/api/batch/{job_id}")
+async def get_batch(job_id: str):
+    """Progress of a batch job and the sessions prepared so far."""
+    job = await get_batch_runner().jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+
+@app.get("/api/session/{session_id}/start", response_model=SessionResponse)
+async def start_prepared_session(
+    session_id: str,
+    x_gemini_api_key: Optional[str] = Header(None),
+    x_elevenlabs_api_key: Optional[str] = Header(None),
+):
+    """Open a session prepared by a batch job and return its first question."""
+    prepared = get_prepared_sessions()
+    session = await prepared.get(session_id)
+    if session:
+        # Move it to the live store, where idle sessions expire on the normal TTL
+        session["started_at"] = time.time()
+        await sessions.put(session_id, session)
+        await prepared.delete(session_id)
+    else:
+        session = await sessions.get(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if session.get("completed") or len(session["conversation"]) > 1:
+            raise HTTPException(status_code=409, detail="Session already started")
+    speculator = get_speculator()
+    if speculator.enabled:
+        try:
+            gemini = GeminiService(api_key=x_gemini_api_key or session.get("gemini_api_key"))
+        except Exception:
+            # No key on this worker (e.g. after a restart); the answer brings one in its headers
+            gemini = None
+        if gemini is not None:
+            speculator.start(session_id, session, gemini, x_elevenlabs_api_key or session.get("elevenlabs_api_key"))
+    return SessionResponse(
+        session_id=session_id,
+        message_type="question",
+        text=session["conversation"][0]["text"],
+        audio_url=_audio_url(session_id, 0),
+        question_number=1,
+        assignment_text=session["assignment_text"][:3000],
+        usage=session["usage"][0],
+    )
 
 
 @app.get("/api/session/{session_id}/transcript")
 async def get_transcript(session_id: str):
-    """Get the current conversation transcript."""
-    session = sessions.get(session_id)
+    """Get the current conversation transcript, or the archived one of an expired, completed interview."""
+    session = await sessions.get(session_id)
+    if not session:
+        archived = await get_analytics().transcript(session_id) if get_analytics().enabled else None
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return archived
+    return {
+        "conversation": session["conversation"], "usage": session.get("usage", []),
+        "score": session.get("score"), "observations": session.get("observations"),
+    }
+
+
+# Class-level results of completed interviews, when ANALYTICS_ENABLED is set.
+# Instructors only: each request sends INSTRUCTOR_TOKEN as X-Instructor-Token.
+# `since`/`until` are Unix timestamps; `batch_job` narrows to one batch's sessions.
+
+def _analytics(token: Optional[str]):
+    analytics = get_analytics()
+    if not analytics.enabled:
+        raise HTTPException(status_code=404, detail="Analytics are disabled (set ANALYTICS_ENABLED)")
+    expected = get_settings().instructor_token
+    if not expected:
+        raise HTTPException(status_code=404, detail="Analytics are off until INSTRUCTOR_TOKEN is set")
+    if not token or not secrets.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Instructor-Token")
+    return analytics
+
+
+@app.get("/api/analytics/summary")
+async def analytics_summary(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    batch_job: Optional[str] = None,
+    x_instructor_token: Optional[str] = Header(None),
+):
+    """Score distribution, per-turn Gemini latency and fallback rates of completed interviews."""
+    return await _analytics(x_instructor_token).summary(since, until, batch_job)
+
+
+@app.get("/api/analytics/interviews.csv")
+async def analytics_export(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    batch_job: Optional[str] = None,
+    x_instructor_token: Optional[str] = Header(None),
+):
+    """One CSV row per completed interview: score, observations, timing and token figures."""
+    body = await _analytics(x_instructor_token).export_csv(since, until, batch_job)
+    return Response(body, media_type="text/csv", headers={"Content-Disposition": 'attachment; filename="interviews.csv"'})
+
+
+_AUDIO_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[tuple]:
+    """Parse a single "bytes=start-end" range; raise 416 if unsatisfiable."""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _iter_chunks(view: memoryview):
+    for offset in range(0, len(view), _AUDIO_CHUNK_SIZE):
+        yield view[offset:offset + _AUDIO_CHUNK_SIZE]
+
+
+@app.get("/api/session/{session_id}/audio/{turn}")
+async def get_turn_audio(
+    session_id: str,
+    turn: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    x_elevenlabs_api_key: Optional[str] = Header(None),
+):
+    """Stream the MP3 for an AI turn (0 = opening question)."""
+    session = await sessions.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return {"conversation": session["conversation"]}
+    ai_turns = [msg["text"] for msg in session["conversation"] if msg["role"] == "ai"]
+    if turn < 0 or turn >= len(ai_turns):
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    audio_keys = session.get("audio", [])
+    audio_key = audio_keys[turn] if turn < len(audio_keys) else None
+    audio = await get_audio_cache().get(audio_key) if audio_key else None
+    if audio is None:
+        # Evicted from the cache or never synthesized (streamed turn): rebuild it
+        elevenlabs_api_key = x_elevenlabs_api_key or session.get("elevenlabs_api_key")
+        try:
+            audio_key, audio = await synthesize(ai_turns[turn], elevenlabs_api_key=elevenlabs_api_key)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"TTS service error: {str(e)}")
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "ETag": f'"{audio_key}"',
+    }
+    view = memoryview(audio)
+    byte_range = _parse_range(range_header, len(audio))
+    if byte_range is None:
+        headers["Content-Length"] = str(len(audio))
+        return StreamingResponse(_iter_chunks(view), media_type="audio/mpeg", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(audio)}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_chunks(view[start:end + 1]), status_code=206, media_type="audio/mpeg", headers=headers,
+    )
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text-format metrics for this worker."""
+    SESSIONS.set(await sessions.count())
+    record_component_stats("sessions", sessions.stats())
+    record_component_stats("audio_cache", get_audio_cache().stats())
+    record_component_stats("document_cache", get_document_cache().stats())
+    record_component_stats("opening_cache", get_opening_cache().stats())
+    record_component_stats("clients", get_client_registry().stats())
+    record_component_stats("speculation", get_speculator().stats())
+    record_component_stats("batch", get_batch_runner().stats())
+    record_component_stats("analytics", get_analytics().stats())
+    record_component_stats("tts", tts_stats())
+    record_component_stats("worker", worker_stats())
+    for provider in ("gemini", "elevenlabs"):
+        record_component_stats(f"{provider}_upstream", get_limiter(provider).stats())
+    update_ratios()
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "ready": is_ready(), "speculation": get_speculator().stats()}
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness probe: 503 until this worker has warmed up, so no traffic hits a cold worker."""
+    return JSONResponse(worker_stats(), status_code=200 if is_ready() else 503)
+
 
+record_import(_import_started)
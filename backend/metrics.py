@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Seconds; spans from cache hits (~1 ms) to slow Gemini turns
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Metric:
+    """Base for metrics kept in process memory and rendered in the Prometheus text format."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        # Observations also come from worker threads
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Yield (suffix, labels, value) tuples."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", key, value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield "_bucket", key + (("le", le),), cumulative
+            yield "_sum", key, total
+            yield "_count", key, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "interview_stage_seconds", "Time spent in each stage of handling a turn", ("stage",),
+))
+GEMINI_RESPONSES = REGISTRY.register(Counter(
+    "interview_gemini_responses_total", "Gemini responses by how they were parsed", ("outcome",),
+))
+GEMINI_TOKENS = REGISTRY.register(Counter(
+    "interview_gemini_tokens_total", "Gemini tokens by kind", ("kind",),
+))
+TTS_REQUESTS = REGISTRY.register(Counter(
+    "interview_tts_requests_total", "Synthesized clips by the engine that produced them", ("engine",),
+))
+TTS_FALLBACKS = REGISTRY.register(Counter(
+    "interview_tts_fallbacks_total", "ElevenLabs failures that fell back to gTTS",
+))
+UPSTREAM_EVENTS = REGISTRY.register(Counter(
+    "interview_upstream_events_total", "Upstream scheduling events: retry, shed, coalesced", ("provider", "event"),
+))
+SESSIONS = REGISTRY.register(Gauge(
+    "interview_sessions", "Live sessions in the session store",
+))
+RATIOS = REGISTRY.register(Gauge(
+    "interview_ratio", "Derived rates: TTS fallback and Gemini JSON repair", ("name",),
+))
+COMPONENT_STATS = REGISTRY.register(Gauge(
+    "interview_component_stat", "Numeric stats reported by caches, stores and pools", ("component", "stat"),
+))
+
+# Spans recorded while handling the current request, for the Server-Timing header
+_request_spans: ContextVar[Optional[list]] = ContextVar("request_spans", default=None)
+
+
+def start_request_spans() -> list:
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: list) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as one stage of the current turn."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_component_stats(component: str, stats: dict) -> None:
+    for stat, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            COMPONENT_STATS.set(value, component=component, stat=stat)
+
+
+def update_ratios() -> None:
+    # Share of ElevenLabs attempts that ended up on gTTS
+    attempts = TTS_REQUESTS.value(engine="elevenlabs") + TTS_FALLBACKS.total()
+    RATIOS.set(TTS_FALLBACKS.total() / attempts if attempts else 0.0, name="tts_fallback")
+    responses = GEMINI_RESPONSES.total()
+    repaired = responses - GEMINI_RESPONSES.value(outcome="json")
+    RATIOS.set(repaired / responses if responses else 0.0, name="gemini_json_repair")
@@ -0,0 +1,220 @@
+"""Reuse of opening questions generated for the same, or nearly the same, assignment."""
+
+import copy
+import hashlib
+import json
+import random
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from config import get_settings
+from executor import run_blocking
+from response_parser import FALLBACK_QUESTION
+from upstream import Coalescer
+
+# MinHash over word 5-grams: 64 hash functions, banded 16 x 4 for the
+# candidate index, so pairs above ~0.6 Jaccard similarity nearly always
+# share a band and the estimate is then checked against the threshold
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+BANDS = 16
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+
+MODES = ("off", "exact", "similar")
+
+
+def normalize(text: str) -> str:
+    """Case, Unicode form and whitespace folded, so trivially different extractions match."""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def minhash(text: str) -> tuple:
+    """MinHash signature of the word shingles of normalized text."""
+    words = text.split()
+    shingles = {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"), digest_size=8).digest(), "little")
+        for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    return tuple(min((a * shingle + b) % _PRIME for shingle in shingles) for a, b in _PERMUTATIONS)
+
+
+def similarity(a: tuple, b: tuple) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _bands(template: str, signature: tuple) -> list:
+    rows = NUM_PERM // BANDS
+    return [(template, band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+
+@dataclass
+class OpeningLookup:
+    """Where an opening question was looked up; `response` is set on a hit."""
+    key: Optional[str]
+    template: str = ""
+    signature: Optional[tuple] = None
+    response: Optional[dict] = None
+    match: str = ""  # "exact" or "similar" on a hit
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    response: dict
+    template: str
+    signature: Optional[tuple]
+
+
+class OpeningCache:
+    """Opening questions by prompt template and assignment text, per process.
+
+    The exact key hashes the template (model, system prompt, settings) and
+    the normalized assignment text sent with it. In "similar" mode a miss
+    also looks for a text of the same template whose MinHash similarity is
+    at least `threshold`. Entries expire `ttl_seconds` after they were
+    generated; past `max_entries` the oldest go first. Concurrent misses
+    for one key share a single generation.
+    """
+
+    def __init__(self, mode: str, ttl_seconds: int, max_entries: int, threshold: float):
+        self.mode = mode if mode in MODES else "off"
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # (template, band, rows) -> keys, for near-duplicate candidates
+        self._buckets = {}
+        self._inflight = Coalescer("gemini")
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        if entry.signature is not None:
+            for band in _bands(entry.template, entry.signature):
+                keys = self._buckets.get(band)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._buckets[band]
+
+    def _sweep(self, now: float) -> None:
+        # Insertion order is expiry order, since every entry gets the same TTL
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def _similar(self, template: str, signature: tuple) -> Optional[_Entry]:
+        candidates = set()
+        for band in _bands(template, signature):
+            candidates |= self._buckets.get(band, set())
+        best, score = None, self.threshold
+        for key in candidates:
+            entry = self._entries[key]
+            estimate = similarity(signature, entry.signature)
+            if estimate >= score:
+                best, score = entry, estimate
+        return best
+
+    async def lookup(self, template: str, material: str) -> OpeningLookup:
+        """Find a stored opening question for this prompt template and assignment text."""
+        if self.mode == "off":
+            return OpeningLookup(None)
+        text = normalize(material)
+        template = _digest(template)
+        lookup = OpeningLookup(_digest(f"{template}:{text}"), template)
+        self._sweep(time.monotonic())
+        entry = self._entries.get(lookup.key)
+        if entry is not None:
+            lookup.match = "exact"
+            self.hits += 1
+        elif self.mode == "similar":
+            lookup.signature = await run_blocking(minhash, text)
+            entry = self._similar(template, lookup.signature)
+            if entry is not None:
+                lookup.match = "similar"
+                self.similar_hits += 1
+        if entry is None:
+            self.misses += 1
+            return lookup
+        lookup.response = copy.deepcopy(entry.response)
+        return lookup
+
+    def store(self, lookup: OpeningLookup, response: dict) -> None:
+        """Keep a freshly generated opening question for later lookups of the same text."""
+        if lookup.key is None or lookup.response is not None:
+            return
+        text = response.get("text")
+        # The parser's stand-in for an unusable reply isn't worth reusing
+        if response.get("type", "question") != "question" or not text or text == FALLBACK_QUESTION:
+            return
+        if lookup.key in self._entries:
+            self._drop(lookup.key)
+        self._entries[lookup.key] = _Entry(
+            time.monotonic() + self.ttl_seconds, copy.deepcopy(response), lookup.template, lookup.signature,
+        )
+        if lookup.signature is not None:
+            for band in _bands(lookup.template, lookup.signature):
+                self._buckets.setdefault(band, set()).add(lookup.key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def generate(self, lookup: OpeningLookup, factory: Callable[[], Awaitable[dict]]) -> dict:
+        """Run `factory` for a lookup that missed and store its result.
+
+        Concurrent misses for the same key (a double-clicked upload, a
+        retry) wait for the first one's call instead of making their own.
+        """
+        if lookup.key is None:
+            return await factory()
+
+        async def generate_and_store() -> dict:
+            response = await factory()
+            self.store(lookup, response)
+            return response
+
+        return copy.deepcopy(await self._inflight.run(lookup.key, generate_and_store))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+        }
+
+
+async def replay(response: dict) -> AsyncIterator[str]:
+    """A stored reply as a one-chunk stream, for code that consumes Gemini streams."""
+    yield json.dumps(response)
+
+
+@lru_cache
+def get_opening_cache() -> OpeningCache:
+    settings = get_settings()
+    return OpeningCache(
+        mode=settings.opening_cache,
+        ttl_seconds=settings.opening_cache_ttl_seconds,
+        max_entries=settings.opening_cache_max_entries,
+        threshold=settings.opening_cache_similarity,
+    )
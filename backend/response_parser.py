@@ -0,0 +1,296 @@
+import json
+import math
+import re
+import time
+
+import google.ai.generativelanguage as glm
+
+from metrics import GEMINI_RESPONSES, record_stage
+
+# Structured output schema for Gemini: one object covering both a question and the review
+RESPONSE_SCHEMA = glm.Schema(
+    type_=glm.Type.OBJECT,
+    properties={
+        "type": glm.Schema(type_=glm.Type.STRING, format_="enum", enum=["question", "review"]),
+        "number": glm.Schema(type_=glm.Type.INTEGER),
+        "text": glm.Schema(type_=glm.Type.STRING),
+        "score": glm.Schema(type_=glm.Type.INTEGER),
+        "review": glm.Schema(type_=glm.Type.STRING),
+        "observations": glm.Schema(type_=glm.Type.ARRAY, items=glm.Schema(type_=glm.Type.STRING)),
+    },
+    required=["type"],
+)
+
+SPOKEN_FIELDS = ("text", "review")
+
+FALLBACK_QUESTION = "Hello! I've reviewed your assignment. Could you start by telling me about the main topic or goal of your work?"
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_STRING_RUN = re.compile(r'[^"\\]+')
+_SCALAR_RUN = re.compile(r'[^\s,:\[\]{}"]+')
+
+# Lexer states
+_SEEK, _STRUCTURE, _STRING, _DONE = range(4)
+
+
+class ResponseParser:
+    """Single-pass parser for Gemini's JSON replies, fed whole or in streamed chunks.
+
+    Text before the first "{" (code fences, stray prose) is skipped and
+    anything after the first complete object is ignored. A truncated
+    object yields the fields parsed so far, including a partial string
+    value. `feed` returns the newly decoded characters of the first
+    spoken field ("text" or "review"), so callers can start speaking
+    before the object is complete. Each input character is looked at
+    once.
+    """
+
+    def __init__(self):
+        self._state = _SEEK
+        self._raw = []
+        self._prefix = False
+        self._suffix = False
+        # Open containers, innermost last: [container, pending dict key or None]
+        self._stack = []
+        self._root = None
+        self._expect_key = False
+        self._string = []
+        self._string_is_key = False
+        self._escape = None  # None, or the escape sequence collected so far
+        self._high_surrogate = None
+        self._scalar = []
+        self._streaming = False
+        self._elapsed = 0.0
+        self._result = None
+        self.field = None
+        self.outcome = None
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk and return newly decoded spoken text."""
+        started = time.perf_counter()
+        self._raw.append(chunk)
+        spoken = []
+        i, n = 0, len(chunk)
+        while i < n:
+            state = self._state
+            if state == _STRING:
+                i = self._consume_string(chunk, i, spoken)
+            elif state == _STRUCTURE:
+                i = self._consume_structure(chunk, i)
+            elif state == _SEEK:
+                start = chunk.find("{", i)
+                if start == -1:
+                    self._prefix = self._prefix or bool(chunk[i:].strip())
+                    break
+                self._prefix = self._prefix or bool(chunk[i:start].strip())
+                self._open({})
+                self._state = _STRUCTURE
+                i = start + 1
+            else:
+                self._suffix = self._suffix or bool(chunk[i:].strip())
+                break
+        self._elapsed += time.perf_counter() - started
+        return "".join(spoken)
+
+    def _consume_string(self, chunk: str, i: int, spoken: list) -> int:
+        if self._escape is not None:
+            return self._consume_escape(chunk, i, spoken)
+        char = chunk[i]
+        if char == '"':
+            self._finish_string()
+            return i + 1
+        if char == "\\":
+            self._escape = ""
+            return i + 1
+        run = _STRING_RUN.match(chunk, i)
+        self._append_text(run.group(), spoken)
+        return run.end()
+
+    def _consume_escape(self, chunk: str, i: int, spoken: list) -> int:
+        self._escape += chunk[i]
+        escape = self._escape
+        if escape[0] != "u":
+            self._escape = None
+            self._append_text(_ESCAPES.get(escape, escape), spoken)
+            return i + 1
+        if len(escape) < 5:
+            return i + 1
+        self._escape = None
+        try:
+            code = int(escape[1:], 16)
+        except ValueError:
+            return i + 1
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate: wait for the low half
+            self._high_surrogate = code
+            return i + 1
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._append_text(chr(code), spoken)
+        return i + 1
+
+    def _append_text(self, text: str, spoken: list) -> None:
+        self._string.append(text)
+        if self._streaming:
+            spoken.append(text)
+
+    def _consume_structure(self, chunk: str, i: int) -> int:
+        char = chunk[i]
+        if char in " \t\r\n":
+            self._finish_scalar()
+            return i + 1
+        if char == '"':
+            self._finish_scalar()
+            self._start_string()
+            return i + 1
+        if char == "{":
+            self._open({})
+        elif char == "[":
+            self._open([])
+        elif char in "}]":
+            self._finish_scalar()
+            self._close()
+        elif char == ",":
+            self._finish_scalar()
+            self._expect_key = isinstance(self._stack[-1][0], dict)
+        elif char == ":":
+            self._expect_key = False
+        else:
+            run = _SCALAR_RUN.match(chunk, i)
+            if run is None:
+                return i + 1
+            self._scalar.append(run.group())
+            return run.end()
+        return i + 1
+
+    def _start_string(self) -> None:
+        self._state = _STRING
+        self._string = []
+        self._string_is_key = self._expect_key
+        container, key = self._stack[-1]
+        self._streaming = (
+            not self._string_is_key
+            and self.field is None
+            and len(self._stack) == 1
+            and key in SPOKEN_FIELDS
+        )
+        if self._streaming:
+            self.field = key
+
+    def _finish_string(self) -> None:
+        self._state = _STRUCTURE
+        value = "".join(self._string)
+        self._string = []
+        if self._string_is_key:
+            self._stack[-1][1] = value
+        else:
+            self._store(value)
+        self._streaming = False
+
+    def _finish_scalar(self) -> None:
+        if not self._scalar:
+            return
+        token = "".join(self._scalar)
+        self._scalar = []
+        try:
+            value = json.loads(token)
+        except ValueError:
+            value = token
+        self._store(value)
+
+    def _store(self, value) -> None:
+        container, key = self._stack[-1]
+        if isinstance(container, dict):
+            if key is not None:
+                container[key] = value
+                self._stack[-1][1] = None
+        else:
+            container.append(value)
+
+    def _open(self, container) -> None:
+        if self._stack:
+            self._store(container)
+        else:
+            self._root = container
+        self._stack.append([container, None])
+        self._expect_key = isinstance(container, dict)
+
+    def _close(self) -> None:
+        if not self._stack:
+            return
+        self._stack.pop()
+        if self._stack:
+            self._expect_key = False
+        else:
+            self._state = _DONE
+
+    def result(self) -> dict:
+        """The parsed reply, normalized to the question/review shape.
+
+        Records the parse outcome and time the first time it is called.
+        """
+        if self._result is not None:
+            return self._result
+        truncated = self._state not in (_DONE, _SEEK)
+        if truncated:
+            # Keep whatever the cut-off object already held
+            if self._state == _STRING and not self._string_is_key:
+                self._store("".join(self._string))
+            elif self._state == _STRUCTURE:
+                self._finish_scalar()
+        started = time.perf_counter()
+        result = self._normalize(self._root)
+        if result is None:
+            self.outcome = "fallback"
+            result = self._fallback("".join(self._raw))
+        elif truncated:
+            self.outcome = "truncated"
+        elif self._prefix or self._suffix:
+            self.outcome = "embedded_json"
+        else:
+            self.outcome = "json"
+        self._elapsed += time.perf_counter() - started
+        GEMINI_RESPONSES.inc(outcome=self.outcome)
+        record_stage("response_parse", self._elapsed)
+        self._result = result
+        return result
+
+    @staticmethod
+    def _normalize(obj) -> dict:
+        if not isinstance(obj, dict):
+            return None
+        if isinstance(obj.get("text"), str) and obj["text"].strip():
+            obj.setdefault("type", "question")
+            obj.setdefault("number", 1)
+            return obj
+        if isinstance(obj.get("review"), str) and obj["review"].strip():
+            obj["type"] = "review"
+            obj["score"] = ResponseParser._score(obj.get("score"))
+            if not isinstance(obj.get("observations"), list):
+                obj["observations"] = []
+            return obj
+        return None
+
+    @staticmethod
+    def _score(value) -> int:
+        """A reported score as an int (82.0 and "82" included); 75 if missing or not a number."""
+        if isinstance(value, str):
+            try:
+                value = float(value.strip().rstrip("%"))
+            except ValueError:
+                return 75
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            return 75
+        return int(round(value))
+
+    @staticmethod
+    def _fallback(raw: str) -> dict:
+        # Not JSON we can use: speak the raw text without JSON artifacts
+        text = re.sub(r"```(?:json)?", "", raw)
+        text = re.sub(r'[\{\}"\[\]]', "", text)
+        text = re.sub(r"\s+", " ", text).strip()
+        if len(text) < 10:
+            text = FALLBACK_QUESTION
+        print(f"[Gemini] Unparseable response, using raw text: {text[:100]}...")
+        return {"type": "question", "number": 1, "text": text}
@@ -0,0 +1,394 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from config import get_settings
+from metrics import timed
+
+
+def serialize_session(session: dict) -> bytes:
+    """Encode a session as compact, compressed JSON."""
+    with timed("session_serialize"):
+        raw = json.dumps(session, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return zlib.compress(raw, 6)
+
+
+def deserialize_session(blob: bytes) -> dict:
+    with timed("session_deserialize"):
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class SessionStore(ABC):
+    """Shared interview session storage.
+
+    Records are serialized on write, so `get` always returns a fresh dict;
+    callers must `put` the session back after mutating it.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def put(self, session_id: str, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process LRU store with a sliding TTL.
+
+    Every access pushes the entry to the back of the LRU order with a fresh
+    expiry, so entries stay sorted by expiry and expired ones can be swept
+    from the front without scanning the whole store.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+
+    def _sweep(self, now: float) -> None:
+        while self._entries:
+            session_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[session_id]
+            self.evictions += 1
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[session_id] = (now + self.ttl_seconds, entry[1])
+        self._entries.move_to_end(session_id)
+        return deserialize_session(entry[1])
+
+    async def put(self, session_id: str, session: dict) -> None:
+        now = time.monotonic()
+        self._sweep(now)
+        self._entries[session_id] = (now + self.ttl_seconds, serialize_session(session))
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+
+    async def count(self) -> int:
+        self._sweep(time.monotonic())
+        return len(self._entries)
+
+
+class RedisSessionStore(SessionStore):
+    """Store backed by any Redis-protocol server, shared across workers and nodes.
+
+    Expiry is handled by the server (sliding, via GETEX), so evictions are
+    not observable from here and stay at zero.
+    """
+
+    KEY_PREFIX = "session:"
+
+    def __init__(self, ttl_seconds: int, redis_url: str = None, client=None, key_prefix: str = None):
+        super().__init__(ttl_seconds)
+        if key_prefix is not None:
+            self.KEY_PREFIX = key_prefix
+        if client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package") from e
+            client = aioredis.Redis.from_url(redis_url)
+        self._redis = client
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        blob = await self._redis.getex(self.KEY_PREFIX + session_id, ex=self.ttl_seconds)
+        if blob is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return deserialize_session(blob)
+
+    async def put(self, session_id: str, session: dict) -> None:
+        await self._redis.set(self.KEY_PREFIX + session_id, serialize_session(session), ex=self.ttl_seconds)
+
+    async def delete(self, session_id: str) -> None:
+        await self._redis.delete(self.KEY_PREFIX + session_id)
+
+    async def count(self) -> int:
+        total = 0
+        async for _ in self._redis.scan_iter(match=self.KEY_PREFIX + "*", count=500):
+            total += 1
+        return total
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class SqliteSessionStore(SessionStore):
+    """Durable store in a local SQLite database (WAL), shared by the workers of one host.
+
+    A session is split so a turn doesn't rewrite the whole record:
+    - the assignment text is stored once per distinct document, compressed
+    - conversation entries are appended as rows of their own
+    - the remaining small state (question number, audio keys, usage) is
+      rewritten on each put
+
+    Sessions are read from disk on every `get`, so a restarted or different
+    worker picks up where the last one left off. API keys are never written
+    to disk: they stay in the memory of the worker that received them, and
+    requests elsewhere fall back to the key headers or the server's keys.
+    """
+
+    KIND = "session:"
+    SECRET_FIELDS = ("gemini_api_key", "elevenlabs_api_key")
+    SWEEP_INTERVAL_SECONDS = 60.0
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (hash TEXT PRIMARY KEY, text BLOB NOT NULL);
+        CREATE TABLE IF NOT EXISTS sessions (
+            kind TEXT NOT NULL, id TEXT NOT NULL, doc_hash TEXT, turns INTEGER,
+            state BLOB NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (kind, id)
+        );
+        CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at);
+        CREATE TABLE IF NOT EXISTS turns (
+            kind TEXT NOT NULL, session_id TEXT NOT NULL, seq INTEGER NOT NULL, record BLOB NOT NULL,
+            PRIMARY KEY (kind, session_id, seq)
+        );
+    """
+
+    def __init__(self, ttl_seconds: int, path: str, max_entries: int, key_prefix: str = None):
+        super().__init__(ttl_seconds)
+        self.kind = key_prefix or self.KIND
+        self.max_entries = max_entries
+        # One thread owns the connection, which also serializes access to it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-sessions")
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        # Decompressed documents by hash (immutable, so safe to share between sessions)
+        self._documents: "OrderedDict[str, str]" = OrderedDict()
+        self._secrets: "OrderedDict[str, dict]" = OrderedDict()
+        self._last_sweep = 0.0
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use rather than at construction: the store may be
+        # created in a server master, and connections must not cross a fork
+        if self._connection is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            # Survives a process crash; only an OS crash can lose the last commits
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=5000")
+            db.executescript(self.SCHEMA)
+            self._connection = db
+        return self._connection
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, func, *args):
+        # Carry the request's context so stage timings land in its Server-Timing header
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, func, *args)
+
+    def _document(self, doc_hash: str) -> str:
+        text = self._documents.get(doc_hash)
+        if text is None:
+            row = self._db.execute("SELECT text FROM documents WHERE hash = ?", (doc_hash,)).fetchone()
+            text = zlib.decompress(row[0]).decode("utf-8") if row else ""
+            self._remember_document(doc_hash, text)
+        self._documents.move_to_end(doc_hash)
+        return text
+
+    def _remember_document(self, doc_hash: str, text: str) -> None:
+        self._documents[doc_hash] = text
+        while len(self._documents) > 32:
+            self._documents.popitem(last=False)
+
+    def _get(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        row = self._db.execute(
+            "SELECT doc_hash, turns, state FROM sessions WHERE kind = ? AND id = ? AND expires_at > ?",
+            (self.kind, session_id, now),
+        ).fetchone()
+        if row is None:
+            return None
+        doc_hash, turns, state = row
+        self._db.execute(
+            "UPDATE sessions SET expires_at = ? WHERE kind = ? AND id = ?",
+            (now + self.ttl_seconds, self.kind, session_id),
+        )
+        session = deserialize_session(state)
+        if doc_hash is not None:
+            session["assignment_text"] = self._document(doc_hash)
+        if turns is not None:
+            rows = self._db.execute(
+                "SELECT record FROM turns WHERE kind = ? AND session_id = ? AND seq < ? ORDER BY seq",
+                (self.kind, session_id, turns),
+            )
+            session["conversation"] = [deserialize_session(record) for (record,) in rows]
+        return session
+
+    def _put(self, session_id: str, session: dict) -> None:
+        session = dict(session)
+        text = session.pop("assignment_text", None)
+        conversation = session.pop("conversation", None)
+        for field in self.SECRET_FIELDS:
+            session.pop(field, None)
+
+        doc_hash = None
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if text is not None:
+                doc_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+                # Another worker's sweep may have dropped it, so check the table, not the memo
+                if not self._db.execute("SELECT 1 FROM documents WHERE hash = ?", (doc_hash,)).fetchone():
+                    self._db.execute(
+                        "INSERT INTO documents (hash, text) VALUES (?, ?)",
+                        (doc_hash, zlib.compress(text.encode("utf-8"), 6)),
+                    )
+                self._remember_document(doc_hash, text)
+            if conversation is not None:
+                row = self._db.execute(
+                    "SELECT turns FROM sessions WHERE kind = ? AND id = ?", (self.kind, session_id),
+                ).fetchone()
+                stored = row[0] if row and row[0] is not None else 0
+                if stored > len(conversation):
+                    # Not an append (shouldn't happen): rewrite the turns
+                    self._db.execute("DELETE FROM turns WHERE kind = ? AND session_id = ?", (self.kind, session_id))
+                    stored = 0
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO turns (kind, session_id, seq, record) VALUES (?, ?, ?, ?)",
+                    [
+                        (self.kind, session_id, seq, serialize_session(entry))
+                        for seq, entry in enumerate(conversation[stored:], start=stored)
+                    ],
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (kind, id, doc_hash, turns, state, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.kind, session_id, doc_hash, None if conversation is None else len(conversation),
+                    serialize_session(session), time.time() + self.ttl_seconds,
+                ),
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._maybe_sweep()
+
+    def _delete(self, session_id: str) -> None:
+        self._db.execute("DELETE FROM sessions WHERE kind = ? AND id = ?", (self.kind, session_id))
+        self._db.execute("DELETE FROM turns WHERE kind = ? AND session_id = ?", (self.kind, session_id))
+
+    def _maybe_sweep(self) -> None:
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        expired = self._db.execute(
+            "DELETE FROM sessions WHERE kind = ? AND expires_at <= ?", (self.kind, now),
+        ).rowcount
+        self.evictions += max(0, expired)
+        self._db.execute(
+            "DELETE FROM turns WHERE kind = ? AND NOT EXISTS "
+            "(SELECT 1 FROM sessions s WHERE s.kind = turns.kind AND s.id = turns.session_id)",
+            (self.kind,),
+        )
+        self._db.execute(
+            "DELETE FROM documents WHERE NOT EXISTS (SELECT 1 FROM sessions s WHERE s.doc_hash = documents.hash)"
+        )
+
+    def _count(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM sessions WHERE kind = ? AND expires_at > ?", (self.kind, time.time()),
+        ).fetchone()[0]
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        session = await self._run(self._get, session_id)
+        if session is None:
+            self.misses += 1
+            self._secrets.pop(session_id, None)
+            return None
+        self.hits += 1
+        secrets = self._secrets.get(session_id)
+        if secrets:
+            self._secrets.move_to_end(session_id)
+            session.update(secrets)
+        return session
+
+    async def put(self, session_id: str, session: dict) -> None:
+        secrets = {field: session[field] for field in self.SECRET_FIELDS if session.get(field)}
+        if secrets:
+            self._secrets[session_id] = secrets
+            self._secrets.move_to_end(session_id)
+            while len(self._secrets) > self.max_entries:
+                self._secrets.popitem(last=False)
+        await self._run(self._put, session_id, session)
+
+    async def delete(self, session_id: str) -> None:
+        self._secrets.pop(session_id, None)
+        await self._run(self._delete, session_id)
+
+    async def count(self) -> int:
+        return await self._run(self._count)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+
+def create_session_store(ttl_seconds: int = None, key_prefix: str = None) -> SessionStore:
+    """Store on the configured backend; other record kinds pass their own TTL and Redis key prefix."""
+    settings = get_settings()
+    ttl_seconds = ttl_seconds or settings.session_ttl_seconds
+    if settings.session_backend == "redis":
+        return RedisSessionStore(ttl_seconds, redis_url=settings.redis_url, key_prefix=key_prefix)
+    if settings.session_backend == "sqlite":
+        return SqliteSessionStore(
+            ttl_seconds, settings.session_db_path, settings.session_max_entries, key_prefix=key_prefix,
+        )
+    if settings.session_backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {settings.session_backend}")
+    return MemorySessionStore(ttl_seconds, settings.session_max_entries)
@@ -0,0 +1,171 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from config import get_settings
+from excerpts import get_excerpt_index
+from executor import run_blocking
+from tts_service import text_to_speech_base64
+
+# Spoken while the next question is generated; pre-synthesized, so they cost
+# nothing after the first session that uses them
+ACKNOWLEDGEMENTS = [
+    "Thanks, that's helpful.",
+    "Okay, thanks for explaining that.",
+    "Got it, thank you.",
+]
+CLOSING_ACKNOWLEDGEMENT = "Thanks, that was the last question. Let me put together your review."
+
+
+@dataclass
+class PreparedTurn:
+    """Answer-independent material for a session's next turn."""
+    question_number: int
+    fresh_chunks: list
+    phrase: str
+    phrase_audio: str  # base64 MP3, "" if synthesis failed
+
+
+class Speculator:
+    """Prepares the next turn in the background while the student is answering.
+
+    Work per session is cancelled when superseded and capped by a time
+    budget; the number of sessions being prepared at once is bounded.
+    Results live in this process, so an answer routed to another worker
+    simply counts as a miss. A result nobody claims (the student left) is
+    dropped `result_ttl_seconds` after its preparation started.
+    """
+
+    def __init__(self, enabled: bool, budget_seconds: float, max_inflight: int, result_ttl_seconds: float = 600.0):
+        self.enabled = enabled
+        self.budget_seconds = budget_seconds
+        self.max_inflight = max_inflight
+        self.result_ttl_seconds = result_ttl_seconds
+        # session_id -> (task, started_at), oldest first
+        self._tasks: "OrderedDict[str, tuple]" = OrderedDict()
+        self._running = 0
+        self.expired = 0
+        self.started = 0
+        self.skipped = 0
+        self.used = 0
+        self.missed = 0
+        self.cancelled = 0
+        self.timed_out = 0
+
+    def start(self, session_id: str, session: dict, gemini, elevenlabs_api_key: Optional[str]) -> None:
+        """Begin preparing the turn that follows the question just sent."""
+        if not self.enabled:
+            return
+        self.cancel(session_id)
+        self._sweep(time.monotonic())
+        if self._running >= self.max_inflight:
+            self.skipped += 1
+            return
+        # Snapshot what we need now; the caller keeps mutating the session
+        snapshot = {
+            "assignment_text": session["assignment_text"],
+            "covered_chunks": list(session.get("covered_chunks", [])),
+            "question_number": session["question_number"],
+            "is_last": session["question_number"] >= session.get("num_questions", 3),
+        }
+        task = asyncio.create_task(self._run(snapshot, gemini, elevenlabs_api_key))
+        self._running += 1
+        task.add_done_callback(self._finished)
+        self._tasks[session_id] = (task, time.monotonic())
+        self.started += 1
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running -= 1
+
+    def _sweep(self, now: float) -> None:
+        # Entries are in start order and every task ends within the budget,
+        # so the expired ones are finished and at the front
+        deadline = now - self.budget_seconds - self.result_ttl_seconds
+        while self._tasks:
+            session_id, (task, started_at) = next(iter(self._tasks.items()))
+            if started_at > deadline or not task.done():
+                break
+            del self._tasks[session_id]
+            self.expired += 1
+
+    async def _run(self, snapshot: dict, gemini, elevenlabs_api_key: Optional[str]) -> Optional[PreparedTurn]:
+        try:
+            return await asyncio.wait_for(self._prepare(snapshot, gemini, elevenlabs_api_key), self.budget_seconds)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return None
+
+    async def _prepare(self, snapshot: dict, gemini, elevenlabs_api_key: Optional[str]) -> PreparedTurn:
+        index = await run_blocking(get_excerpt_index, snapshot["assignment_text"])
+        fresh = index.fresh_candidates(snapshot["covered_chunks"])
+        phrase = CLOSING_ACKNOWLEDGEMENT if snapshot["is_last"] else random.choice(ACKNOWLEDGEMENTS)
+        try:
+            phrase_audio = await text_to_speech_base64(phrase, elevenlabs_api_key=elevenlabs_api_key)
+        except Exception:
+            phrase_audio = ""
+        try:
+            await gemini.warm()
+        except Exception:
+            pass
+        return PreparedTurn(snapshot["question_number"], fresh, phrase, phrase_audio)
+
+    def take(self, session_id: str, question_number: int) -> Optional[PreparedTurn]:
+        """Claim the prepared turn if it finished; unfinished work is cancelled."""
+        if not self.enabled:
+            return None
+        task, _ = self._tasks.pop(session_id, (None, None))
+        if task is None:
+            self.missed += 1
+            return None
+        if not task.done():
+            task.cancel()
+            self.cancelled += 1
+            self.missed += 1
+            return None
+        prepared = None if task.cancelled() or task.exception() else task.result()
+        if prepared is None or prepared.question_number != question_number:
+            self.missed += 1
+            return None
+        self.used += 1
+        return prepared
+
+    def cancel(self, session_id: str) -> None:
+        task, _ = self._tasks.pop(session_id, (None, None))
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    async def aclose(self) -> None:
+        for session_id in list(self._tasks):
+            self.cancel(session_id)
+
+    def stats(self) -> dict:
+        claimed = self.used + self.missed
+        self._sweep(time.monotonic())
+        return {
+            "started": self.started,
+            "skipped": self.skipped,
+            "used": self.used,
+            "missed": self.missed,
+            "cancelled": self.cancelled,
+            "timed_out": self.timed_out,
+            "expired": self.expired,
+            "inflight": self._running,
+            "held": len(self._tasks),
+            "use_ratio": self.used / claimed if claimed else 0.0,
+        }
+
+
+@lru_cache
+def get_speculator() -> Speculator:
+    settings = get_settings()
+    return Speculator(
+        enabled=settings.speculation_enabled,
+        budget_seconds=settings.speculation_budget_seconds,
+        max_inflight=settings.speculation_max_inflight,
+        result_ttl_seconds=settings.speculation_result_ttl_seconds,
+    )
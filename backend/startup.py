@@ -0,0 +1,109 @@
+"""Worker start-up: module preloading, warm-up before serving, and per-worker footprint."""
+
+import asyncio
+import importlib
+import os
+import resource
+import time
+
+from audio_cache import get_audio_cache
+from clients import get_client_registry
+from config import get_settings
+from document_cache import get_document_cache
+from executor import run_blocking, run_cpu_bound, run_speech
+from file_parser import preload_parsers
+from gemini_service import GeminiService
+from session_store import SessionStore
+from stt_service import get_speech_model
+
+# Imported on first use by the code that needs them; preloading moves the
+# cost to the server master, where forked workers share the pages
+LAZY_MODULES = ("gtts",)
+
+_state = {
+    # Process that imported the app; a different pid means this worker was forked from it
+    "import_pid": os.getpid(),
+    "import_seconds": None,
+    "warmup_seconds": None,
+    "ready": False,
+}
+
+
+def preload_modules() -> None:
+    """Import the libraries the app otherwise loads lazily (document parsers, gTTS)."""
+    preload_parsers()
+    for module in LAZY_MODULES:
+        importlib.import_module(module)
+
+
+def record_import(started: float) -> None:
+    """Note how long importing the app took, given its perf_counter start."""
+    _state["import_seconds"] = time.perf_counter() - started
+
+
+def _memory() -> dict:
+    """Resident and private (not shared with the master) memory of this process, in bytes."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            next(f)  # Address range header
+            kb = {name: int(value.split()[0]) for name, value in (line.split(":", 1) for line in f)}
+        return {"rss_bytes": kb["Rss"] * 1024, "private_bytes": (kb["Private_Clean"] + kb["Private_Dirty"]) * 1024}
+    except (OSError, KeyError, ValueError):
+        # No /proc (e.g. macOS): peak RSS is the best available figure
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_bytes": peak if os.uname().sysname == "Darwin" else peak * 1024}
+
+
+def _noop() -> None:
+    pass
+
+
+async def _step(name: str, coro, timeout: float) -> None:
+    # Warm-up is best effort: a failing step is logged and costs only a cold first request
+    try:
+        await asyncio.wait_for(coro, timeout)
+    except Exception as e:
+        print(f"Warm-up step {name} failed: {e}")
+
+
+async def warm_up(sessions: SessionStore) -> None:
+    """Get this worker ready to serve, then mark it ready.
+
+    Opens the upstream clients, caches and session store, starts the parse
+    pool's processes and loads the speech model (if enabled) so the first
+    requests don't pay for it.
+    """
+    settings = get_settings()
+    started = time.perf_counter()
+    timeout = settings.startup_warm_timeout_seconds
+    if settings.startup_preload:
+        # Before the parse pool forks, so its processes inherit the modules
+        await run_blocking(preload_modules)
+    get_client_registry().http()
+    await _step("audio_cache", run_blocking(get_audio_cache), timeout)
+    await _step("document_cache", run_blocking(get_document_cache), timeout)
+    await _step("sessions", sessions.count(), timeout)
+    # One task per pool slot starts every process (a no-op for the thread pool)
+    workers = max(1, settings.parse_workers)
+    await _step("parse_pool", asyncio.gather(*(run_cpu_bound(_noop) for _ in range(workers))), timeout)
+    if settings.gemini_api_key:
+        await _step("gemini", GeminiService().warm(), timeout)
+    if settings.stt_enabled:
+        await _step("speech_model", run_speech(get_speech_model), timeout)
+    _state["warmup_seconds"] = time.perf_counter() - started
+    _state["ready"] = True
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def worker_stats() -> dict:
+    return {
+        "pid": os.getpid(),
+        "preloaded": int(os.getpid() != _state["import_pid"]),
+        "ready": int(_state["ready"]),
+        "import_seconds": _state["import_seconds"],
+        "warmup_seconds": _state["warmup_seconds"],
+        **_memory(),
+    }
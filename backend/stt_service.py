@@ -0,0 +1,151 @@
+"""Server-side speech recognition: streamed PCM in, partial and final transcripts out."""
+
+import json
+import math
+import sys
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+
+from config import get_settings
+from executor import run_speech
+from metrics import timed
+
+# Audio the client sends: 16-bit little-endian mono PCM at this rate
+SAMPLE_RATE = 16000
+
+
+class VoiceActivity:
+    """Energy-based detection of where an answer starts and ends.
+
+    A 30 ms frame is speech when its RMS is well above an adaptive noise
+    floor. Speech starts after a short run of speech frames, which ignores
+    clicks. The answer ends after `end_silence` seconds without speech,
+    once at least `min_speech` seconds of speech were heard.
+    """
+
+    FRAME_SECONDS = 0.03
+    ONSET_SECONDS = 0.09
+    # Speech must be this many times louder than the noise floor, and above an absolute minimum
+    RATIO = 3.0
+    MIN_RMS = 200.0
+
+    def __init__(self, sample_rate: int, end_silence: float, min_speech: float):
+        self.frame_bytes = int(sample_rate * self.FRAME_SECONDS) * 2
+        self.end_silence = end_silence
+        self.min_speech = min_speech
+        self.noise = None
+        self.speaking = False
+        self.speech_seconds = 0.0
+        self._voiced_run = 0.0
+        self._silent_run = 0.0
+        self._pending = b""
+
+    def _rms(self, frame: bytes) -> float:
+        samples = array("h", frame)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+    def feed(self, pcm: bytes) -> tuple:
+        """Process a chunk; return (speech started, answer ended) for this chunk."""
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        started = ended = False
+        for offset in range(0, usable, self.frame_bytes):
+            rms = self._rms(data[offset:offset + self.frame_bytes])
+            if self.noise is None:
+                self.noise = rms
+            voiced = rms > max(self.MIN_RMS, self.noise * self.RATIO)
+            if voiced:
+                self._voiced_run += self.FRAME_SECONDS
+                self._silent_run = 0.0
+                if self.speaking:
+                    self.speech_seconds += self.FRAME_SECONDS
+                elif self._voiced_run >= self.ONSET_SECONDS:
+                    self.speaking = started = True
+                    self.speech_seconds = self._voiced_run
+            else:
+                # The floor only follows non-speech frames, so a long answer doesn't raise it
+                self.noise = 0.95 * self.noise + 0.05 * rms
+                self._voiced_run = 0.0
+                self._silent_run += self.FRAME_SECONDS
+                if (self.speaking and self.speech_seconds >= self.min_speech
+                        and self._silent_run >= self.end_silence):
+                    ended = True
+        return started, ended
+
+
+@dataclass
+class SpeechUpdate:
+    text: str
+    started: bool = False
+    ended: bool = False
+
+
+def _vosk():
+    try:
+        import vosk
+    except ImportError as e:
+        raise RuntimeError("STT_ENABLED requires the 'vosk' package") from e
+    return vosk
+
+
+@lru_cache
+def get_speech_model():
+    """Load the Vosk model once per worker; recognizers share it."""
+    vosk = _vosk()
+    vosk.SetLogLevel(-1)
+    return vosk.Model(get_settings().stt_model_path)
+
+
+def speech_available() -> bool:
+    return get_settings().stt_enabled
+
+
+class SpeechStream:
+    """One answer being transcribed as its audio arrives.
+
+    Chunks are decoded in the speech pool, one at a time per stream since a
+    recognizer isn't thread-safe. The transcript so far is the finished
+    segments (Vosk ends one at each pause) plus the current partial.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        settings = get_settings()
+        self.sample_rate = sample_rate
+        self.max_seconds = settings.stt_max_seconds
+        self.vad = VoiceActivity(sample_rate, settings.stt_end_silence_seconds, settings.stt_min_speech_seconds)
+        self.seconds = 0.0
+        self._recognizer = None
+        self._segments = []
+
+    def _text(self, partial: str = "") -> str:
+        return " ".join(part for part in self._segments + [partial] if part)
+
+    def _feed(self, pcm: bytes) -> SpeechUpdate:
+        if self._recognizer is None:
+            self._recognizer = _vosk().KaldiRecognizer(get_speech_model(), self.sample_rate)
+        started, ended = self.vad.feed(pcm)
+        if self._recognizer.AcceptWaveform(pcm):
+            self._segments.append(json.loads(self._recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        self.seconds += len(pcm) / 2 / self.sample_rate
+        return SpeechUpdate(self._text(partial), started, ended or self.seconds >= self.max_seconds)
+
+    def _finish(self) -> str:
+        if self._recognizer is not None:
+            self._segments.append(json.loads(self._recognizer.FinalResult()).get("text", ""))
+            self._recognizer = None
+        return self._text()
+
+    async def feed(self, pcm: bytes) -> SpeechUpdate:
+        return await run_speech(self._feed, pcm)
+
+    async def finish(self) -> str:
+        """The full transcript; flushes the audio the recognizer still holds."""
+        with timed("stt_final"):
+            return await run_speech(self._finish)
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The backend is a flat set of modules imported by name, as the server runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import get_settings  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """The process settings, with attribute changes undone after the test."""
+    current = get_settings()
+
+    class Overrides:
+        def __getattr__(self, name):
+            return getattr(current, name)
+
+        def __setattr__(self, name, value):
+            monkeypatch.setattr(current, name, value)
+
+    return Overrides()
@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from audio_cache import get_audio_cache
+
+AUDIO = bytes(range(256)) * 4
+AUDIO_KEY = "test-audio-range"
+
+
+@pytest.fixture
+def url():
+    session_id = str(uuid.uuid4())
+    session = {"conversation": [{"role": "ai", "text": "First question?"}], "audio": [AUDIO_KEY]}
+    asyncio.run(get_audio_cache().put(AUDIO_KEY, AUDIO))
+    asyncio.run(main.sessions.put(session_id, session))
+    yield main._audio_url(session_id, 0)
+    asyncio.run(main.sessions.delete(session_id))
+
+
+@pytest.fixture
+def client():
+    # No lifespan: the worker warm-up isn't needed to serve cached audio
+    return TestClient(main.app)
+
+
+def test_no_range_returns_everything(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(AUDIO))
+    assert response.headers["etag"] == f'"{AUDIO_KEY}"'
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=100-", 100, len(AUDIO) - 1),
+    ("bytes=1000-5000", 1000, len(AUDIO) - 1),
+    ("bytes=-24", len(AUDIO) - 24, len(AUDIO) - 1),
+    ("bytes=-5000", 0, len(AUDIO) - 1),
+])
+def test_single_range(client, url, header, start, end):
+    response = client.get(url, headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == AUDIO[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(AUDIO)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=50-10", "bytes=-0"])
+def test_unsatisfiable_range(client, url, header):
+    response = client.get(url, headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+
+@pytest.mark.parametrize("header", ["bytes=0-9,20-29", "items=0-9", "bytes=abc-"])
+def test_unsupported_range_returns_everything(client, url, header):
+    response = client.get(url, headers={"Range": header})
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+
+def test_unknown_turn(client, url):
+    assert client.get(url[:-1] + "1").status_code == 404
+    assert client.get("/api/session/missing/audio/0").status_code == 404
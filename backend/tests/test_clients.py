@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import clients
+from clients import ClientRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+class _Transport:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class _AsyncClient:
+    def __init__(self):
+        self.transport = _Transport()
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Entries built without the SDK; the registry's own bookkeeping still runs
+    monkeypatch.setattr(clients, "_service_client", lambda client_cls, api_key: _AsyncClient())
+    monkeypatch.setattr(clients.genai, "GenerativeModel", lambda name: SimpleNamespace())
+    return ClientRegistry(idle_ttl=60, max_entries=1, http_limits=None, http_timeout=None)
+
+
+async def _settle():
+    # Closing is scheduled as a task on the loop
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_evicted_client_closes_after_its_last_call(registry):
+    first = registry.gemini("key-a")
+    with first.lease():
+        registry.gemini("key-b")  # over max_entries: key-a is evicted
+        await _settle()
+        assert first.retired
+        assert not first.async_client.transport.closed
+    await _settle()
+    assert first.async_client.transport.closed
+
+
+async def test_unused_client_closes_at_once(registry):
+    first = registry.gemini("key-a")
+    registry.gemini("key-b")
+    await _settle()
+    assert first.async_client.transport.closed
+
+
+async def test_retired_client_is_not_reused(registry):
+    first = registry.gemini("key-a")
+    registry.gemini("key-b")
+    again = registry.gemini("key-a")
+    assert again is not first and not again.retired
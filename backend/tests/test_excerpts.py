@@ -0,0 +1,95 @@
+import pytest
+
+from excerpts import CHARS_PER_TOKEN, ExcerptIndex, chunk_text, opening_excerpt, turn_excerpt
+from gemini_service import EXCERPT_NOTE, _assignment_part
+
+TOPICS = ["photosynthesis", "irrigation", "salinity", "pollination", "drought", "germination", "erosion", "nitrogen"]
+
+
+def _document(paragraphs: int = 40) -> str:
+    return "\n".join(
+        f"Section {n} discusses {TOPICS[n % len(TOPICS)]} in arid farmland and how it was measured over the season."
+        for n in range(paragraphs)
+    )
+
+
+def _size(index: ExcerptIndex, chunk_ids: list) -> int:
+    return sum(len(index.chunks[i]) for i in chunk_ids)
+
+
+def test_chunks_respect_target_size():
+    text = _document() + "\n" + "A very long sentence without a break. " * 60
+    chunks = chunk_text(text, target_chars=300)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
+
+
+def test_search_ranks_matching_chunks_first():
+    index = ExcerptIndex(chunk_text(_document(), target_chars=120))
+    ranked = index.search("How was salinity measured?")
+    matching = [i for i, chunk in enumerate(index.chunks) if "salinity" in chunk]
+    # "measured" is in every chunk; the rarer term decides the order
+    assert set(ranked[:len(matching)]) == set(matching)
+    assert index.search("salinity", k=2) == ranked[:2]
+    assert index.search("unrelated zebra") == []
+
+
+@pytest.mark.parametrize("budget", [200, 500, 1200])
+def test_select_stays_within_budget(budget):
+    index = ExcerptIndex(chunk_text(_document(), target_chars=120))
+    chosen = index.select("pollination timing", budget, covered=[0, 1])
+    assert chosen == sorted(chosen)
+    assert 0 < _size(index, chosen) <= budget
+    assert any("pollination" in index.chunks[i] for i in chosen)
+
+
+def test_select_spends_the_rest_on_uncovered_chunks():
+    index = ExcerptIndex(chunk_text(_document(), target_chars=120))
+    covered = list(range(0, len(index.chunks), 2))
+    chosen = index.select("drought", 800, covered=covered)
+    relevant = set(index.search("drought"))
+    fresh = [i for i in chosen if i not in relevant]
+    assert fresh and all(i not in covered for i in fresh)
+
+
+def test_select_returns_everything_that_fits():
+    index = ExcerptIndex(chunk_text(_document(5), target_chars=120))
+    assert index.select("anything", index.total_chars) == list(range(len(index.chunks)))
+
+
+def test_overview_starts_at_the_beginning_and_spreads():
+    index = ExcerptIndex(chunk_text(_document(), target_chars=120))
+    chosen = index.overview(600)
+    assert chosen[0] == 0
+    assert _size(index, chosen) <= 600
+    assert chosen[-1] > len(index.chunks) // 2
+
+
+def test_render_marks_gaps():
+    index = ExcerptIndex(["a", "b", "c", "d"])
+    assert index.render([0, 1, 3]) == "a\nb\n[...]\nd"
+    assert index.render([1]) == "[...]\nb\n[...]"
+
+
+def test_short_assignment_is_sent_whole(settings):
+    settings.excerpt_start_tokens = 10_000
+    settings.excerpt_turn_tokens = 10_000
+    text = _document(8)
+    assert opening_excerpt(text) == text
+    assert turn_excerpt(text, "drought", []) == text
+    assert _assignment_part(text, opening_excerpt(text)) == ("", text)
+
+
+def test_long_assignment_is_excerpted_within_budget(settings):
+    settings.excerpt_chunk_chars = 120
+    settings.excerpt_start_tokens = 150
+    settings.excerpt_turn_tokens = 100
+    text = _document(200)
+    opening = opening_excerpt(text)
+    turn = turn_excerpt(text, "What limited germination?", covered=[0, 1, 2])
+    assert "[...]" in opening and "[...]" in turn
+    # The budget covers the chunks; "[...]" markers and joins come on top
+    assert len(opening.replace("[...]\n", "")) <= 150 * CHARS_PER_TOKEN + 200
+    assert len(turn.replace("[...]\n", "")) <= 100 * CHARS_PER_TOKEN + 200
+    assert "germination" in turn
+    assert _assignment_part(text, turn) == (EXCERPT_NOTE, turn)
@@ -0,0 +1,36 @@
+import pytest
+
+from gemini_service import EXCERPT_NOTE, GeminiService
+
+pytestmark = pytest.mark.anyio
+
+# Longer than any slice the cache used to take
+ASSIGNMENT = "".join(f"Paragraph {n} on irrigation schedules in arid farmland.\n" for n in range(2000))
+
+
+class _CacheService:
+    def __init__(self):
+        self.created = None
+
+    async def create_cached_content(self, cached_content):
+        self.created = cached_content
+        return type("Cache", (), {"name": "cachedContents/1"})()
+
+
+async def test_context_cache_holds_the_whole_assignment(settings):
+    settings.gemini_context_cache = True
+    gemini = GeminiService("test-key")
+    service = _CacheService()
+    gemini._client.cache_client = service
+    assert await gemini.create_context_cache(ASSIGNMENT) == "cachedContents/1"
+    cached = service.created.contents[0].parts[0].text
+    assert ASSIGNMENT in cached
+
+
+def test_cached_turns_send_only_the_turn_and_keep_the_excerpt_for_the_fallback():
+    gemini = GeminiService("test-key")
+    history = [{"role": "ai", "text": "Why irrigate at night?"}]
+    excerpt = "[...]\nParagraph 7 on irrigation schedules in arid farmland.\n[...]"
+    prompt, fallback = gemini._answer_prompts(ASSIGNMENT, history, "Less evaporation.", 1, None, 3, "cachedContents/1", excerpt, None)
+    assert ASSIGNMENT not in prompt and "Less evaporation." in prompt
+    assert f"Assignment{EXCERPT_NOTE}" in fallback and excerpt in fallback
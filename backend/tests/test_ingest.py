@@ -0,0 +1,140 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+import ingest
+from file_parser import ParsedDocument, Segment
+from ingest import iter_archive, iter_submission, merge
+
+pytestmark = pytest.mark.anyio
+
+
+def _zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _document(text: str, **flags) -> ParsedDocument:
+    segments = []
+    start = 0
+    for index, line in enumerate(text.split("\n")):
+        segments.append(Segment("paragraph", index, line, start, start + len(line)))
+        start += len(line) + 1
+    return ParsedDocument(text, segments, **flags)
+
+
+def test_archive_lists_supported_documents_only():
+    data = _zip({
+        "report.pdf": b"%PDF report", "notes/summary.txt": b"summary", "photo.png": b"png",
+        "__MACOSX/._report.pdf": b"resource fork", "notes/.hidden.txt": b"hidden", "empty/": b"",
+    })
+    assert list(iter_archive(data, 10_000)) == [("report.pdf", b"%PDF report"), ("notes/summary.txt", b"summary")]
+
+
+def test_zip_bomb_is_rejected_before_decompressing():
+    data = _zip({"bomb.txt": bytes(2_000_000)})
+    assert len(data) < 10_000
+    with pytest.raises(ValueError, match="expands to 2000000 bytes"):
+        next(iter_archive(data, 1_000_000))
+
+
+def test_oversized_member_comes_without_its_bytes(monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_FILE_BYTES", 100)
+    data = _zip({"big.txt": b"x" * 101, "small.txt": b"fits"})
+    assert list(iter_archive(data, 10_000)) == [("big.txt", None), ("small.txt", b"fits")]
+
+
+def test_not_a_zip():
+    with pytest.raises(ValueError, match="Not a valid zip"):
+        list(iter_archive(b"plain bytes", 10_000))
+
+
+def test_submission_expands_archives_in_order():
+    files = [("intro.txt", b"intro"), ("slides.zip", _zip({"a.txt": b"a", "b.pptx": b"b"})), ("end.docx", b"end")]
+    assert list(iter_submission(files, max_files=10, max_total_bytes=10_000)) == [
+        ("intro.txt", b"intro"), ("slides.zip/a.txt", b"a"), ("slides.zip/b.pptx", b"b"), ("end.docx", b"end"),
+    ]
+
+
+def test_submission_caps_the_number_of_documents():
+    files = [("notes.zip", _zip({f"{n}.txt": b"x" for n in range(3)}))]
+    documents = iter_submission(files, max_files=2, max_total_bytes=10_000)
+    assert len([next(documents), next(documents)]) == 2
+    with pytest.raises(ValueError, match="Too many documents"):
+        next(documents)
+
+
+def test_archives_share_one_byte_budget():
+    first = ("first.zip", _zip({"a.txt": b"x" * 600}))
+    second = ("second.zip", _zip({"b.txt": b"y" * 600}))
+    documents = iter_submission([first, second], max_files=10, max_total_bytes=1000)
+    assert next(documents) == ("first.zip/a.txt", b"x" * 600)
+    # The second archive only gets what the first left over
+    with pytest.raises(ValueError, match="more than the 400 byte limit"):
+        next(documents)
+
+
+def test_plain_files_count_against_the_budget():
+    files = [("a.txt", b"x" * 600), ("b.txt", b"y" * 600)]
+    with pytest.raises(ValueError, match="too large"):
+        list(iter_submission(files, max_files=10, max_total_bytes=1000))
+
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError, match="unsupported"):
+        list(iter_submission([("virus.exe", b"MZ")], max_files=10, max_total_bytes=1000))
+
+
+def test_merge_keeps_order_and_labels_files():
+    merged = merge([
+        ("a.txt", _document("alpha one\nalpha two")),
+        ("b.pdf", ValueError("encrypted")),
+        ("c.docx", _document("gamma")),
+    ], max_chars=1000)
+    assert merged.text == "[a.txt]\nalpha one\nalpha two\n[c.docx]\ngamma"
+    assert [source.get("error") for source in merged.sources] == [None, "encrypted", None]
+    for segment in merged.segments:
+        assert merged.text[segment.start:segment.end] == segment.text
+    assert [segment.source for segment in merged.segments] == ["a.txt", "a.txt", "c.docx"]
+    assert not merged.truncated
+
+
+def test_merge_stops_at_max_chars():
+    merged = merge([("a.txt", _document("a" * 30)), ("b.txt", _document("b" * 30))], max_chars=52)
+    assert merged.text == "[a.txt]\n" + "a" * 30 + "\n[b.txt]\n" + "b" * 5
+    assert merged.truncated
+    assert merged.segments[-1].text == "b" * 5
+    assert all(segment.end <= len(merged.text) for segment in merged.segments)
+
+
+def test_single_document_is_kept_as_extracted():
+    merged = merge([("a.txt", _document("just this"))], max_chars=1000)
+    assert merged.text == "just this"
+    assert merged.segments[0].source == "a.txt"
+
+
+def test_merge_reports_a_single_failure():
+    with pytest.raises(ValueError, match="Could not parse a.pdf: encrypted"):
+        merge([("a.pdf", ValueError("encrypted"))], max_chars=1000)
+
+
+async def test_ingest_skips_documents_once_the_deadline_passes(monkeypatch, settings):
+    settings.parse_workers = 1
+    settings.ingest_timeout_seconds = 0.05
+    parsed = []
+
+    async def parse(name, data, max_chars, timeout):
+        parsed.append(name)
+        await asyncio.sleep(0.1)
+        return _document(data.decode())
+
+    monkeypatch.setattr(ingest, "parse_document_cached", parse)
+    merged = await ingest.ingest([("first.txt", b"first"), ("second.txt", b"second")])
+    assert parsed == ["first.txt"]
+    assert merged.text == "[first.txt]\nfirst"
+    assert merged.sources[1] == {"name": "second.txt", "error": "Skipped: the submission ran out of time"}
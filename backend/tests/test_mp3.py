@@ -0,0 +1,77 @@
+import mp3
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 144 * 128000 // 44100 = 417 bytes
+HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+FRAME_LENGTH = 417
+
+
+def _frame(fill: int) -> bytes:
+    return HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+
+def _info_frame() -> bytes:
+    body = bytes(32) + b"Info" + bytes(FRAME_LENGTH - 40)
+    return HEADER + body
+
+
+def _id3v2(payload: bytes = b"TIT2 tag data") -> bytes:
+    size = len(payload)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + payload
+
+
+def _id3v1() -> bytes:
+    return b"TAG" + bytes(125)
+
+
+def _clip(*fills: int, tags: bool = True) -> tuple:
+    """(whole file, its audio frames)."""
+    frames = b"".join(_frame(fill) for fill in fills)
+    if not tags:
+        return frames, frames
+    return _id3v2() + _info_frame() + frames + _id3v1(), frames
+
+
+def test_frame_length():
+    assert mp3.frame_length(_frame(1), 0) == FRAME_LENGTH
+    padded = HEADER[:2] + bytes([0x92]) + HEADER[3:]
+    assert mp3.frame_length(padded + bytes(FRAME_LENGTH), 0) == FRAME_LENGTH + 1
+    # MPEG-2, 64 kbps, 22.05 kHz: 72 * 64000 // 22050
+    assert mp3.frame_length(bytes([0xFF, 0xF3, 0x80, 0x00]), 0) == 208
+
+
+def test_frame_length_rejects_non_frames():
+    assert mp3.frame_length(b"ID3\x04", 0) == 0
+    assert mp3.frame_length(bytes([0xFF, 0xFB, 0xF0, 0x00]), 0) == 0  # bitrate index 15
+    assert mp3.frame_length(bytes([0xFF, 0xFD, 0x90, 0x00]), 0) == 0  # Layer II
+    assert mp3.frame_length(HEADER[:3], 0) == 0
+
+
+def test_audio_frames_strips_tags_and_info_frame():
+    whole, frames = _clip(1, 2, 3)
+    assert mp3.audio_frames(whole) == frames
+    assert mp3.audio_frames(frames) == frames
+
+
+def test_concat_joins_frames_only():
+    first, first_frames = _clip(1, 2)
+    second, second_frames = _clip(3)
+    third, third_frames = _clip(4, 5, tags=False)
+    joined = mp3.concat([first, second, third])
+    assert joined == first_frames + second_frames + third_frames
+    assert b"ID3" not in joined and b"TAG" not in joined and b"Info" not in joined
+    # Every frame boundary lines up
+    offset = 0
+    while offset < len(joined):
+        assert mp3.frame_length(joined, offset) == FRAME_LENGTH
+        offset += FRAME_LENGTH
+    assert offset == len(joined)
+
+
+def test_single_clip_is_returned_unchanged():
+    whole, _ = _clip(1)
+    assert mp3.concat([whole]) is whole
+
+
+def test_unrecognized_data_is_joined_as_is():
+    assert mp3.concat([b"not audio", b" either"]) == b"not audio either"
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from opening_cache import OpeningCache, minhash, normalize, similarity
+from response_parser import FALLBACK_QUESTION
+
+pytestmark = pytest.mark.anyio
+
+_rng = random.Random(7)
+_VOCABULARY = [f"{stem}{n}" for stem in ("water", "shrub", "stem", "leaf", "season", "site", "soil", "root") for n in range(25)]
+# A thousand words with few repeated 5-word shingles, like a real essay
+ESSAY = " ".join(_rng.choice(_VOCABULARY) for _ in range(1000))
+QUESTION = {"type": "question", "number": 1, "text": "How did you take the field measurements?"}
+
+
+def _edited(text: str, every: int) -> str:
+    """`text` with every `every`-th word replaced."""
+    words = text.split()
+    return " ".join("CHANGED" if i % every == 0 else word for i, word in enumerate(words))
+
+
+def test_normalize_folds_case_width_and_whitespace():
+    assert normalize("  Ｄesert\tPLANTS\n\nstore  water ") == "desert plants store water"
+
+
+def test_identical_text_has_similarity_one():
+    assert similarity(minhash(normalize(ESSAY)), minhash(normalize(ESSAY))) == 1.0
+
+
+def test_similarity_tracks_edits():
+    original = minhash(normalize(ESSAY))
+    light = similarity(original, minhash(normalize(_edited(ESSAY, 200))))
+    heavy = similarity(original, minhash(normalize(_edited(ESSAY, 4))))
+    unrelated = similarity(original, minhash(normalize("A report on medieval trade routes across the Baltic sea. " * 20)))
+    assert light >= 0.9
+    assert heavy < light
+    assert unrelated < 0.1
+
+
+def test_short_text_still_gets_a_signature():
+    assert len(minhash("too short")) == len(minhash(normalize(ESSAY)))
+
+
+async def test_exact_mode_matches_normalized_text_only():
+    cache = OpeningCache("exact", ttl_seconds=60, max_entries=10, threshold=0.9)
+    lookup = await cache.lookup("template", ESSAY)
+    assert lookup.response is None
+    cache.store(lookup, QUESTION)
+    assert (await cache.lookup("template", "  " + ESSAY.upper())).response == QUESTION
+    assert (await cache.lookup("template", _edited(ESSAY, 200))).response is None
+    assert (await cache.lookup("other template", ESSAY)).response is None
+
+
+async def test_similar_mode_matches_near_duplicates():
+    cache = OpeningCache("similar", ttl_seconds=60, max_entries=10, threshold=0.9)
+    cache.store(await cache.lookup("template", ESSAY), QUESTION)
+    near = await cache.lookup("template", _edited(ESSAY, 200))
+    assert near.match == "similar"
+    assert near.response == QUESTION
+    assert (await cache.lookup("template", _edited(ESSAY, 4))).response is None
+    assert (await cache.lookup("other template", _edited(ESSAY, 200))).response is None
+    assert cache.stats()["similar_hits"] == 1
+
+
+async def test_hits_are_copies():
+    cache = OpeningCache("exact", ttl_seconds=60, max_entries=10, threshold=0.9)
+    cache.store(await cache.lookup("template", ESSAY), QUESTION)
+    (await cache.lookup("template", ESSAY)).response["text"] = "changed"
+    assert (await cache.lookup("template", ESSAY)).response == QUESTION
+
+
+async def test_fallback_replies_are_not_stored():
+    cache = OpeningCache("similar", ttl_seconds=60, max_entries=10, threshold=0.9)
+    cache.store(await cache.lookup("template", ESSAY), {"type": "question", "text": FALLBACK_QUESTION})
+    assert (await cache.lookup("template", ESSAY)).response is None
+    assert cache.stats()["entries"] == 0
+
+
+async def test_oldest_entries_are_evicted():
+    cache = OpeningCache("similar", ttl_seconds=60, max_entries=2, threshold=0.9)
+    texts = [ESSAY, "A report on medieval trade routes. " * 30, "Notes on protein folding in yeast. " * 30]
+    for text in texts:
+        cache.store(await cache.lookup("template", text), QUESTION)
+    assert cache.stats()["entries"] == 2
+    assert (await cache.lookup("template", ESSAY)).response is None
+    # Its band entries went with it, so near-duplicates don't find a dangling key
+    assert (await cache.lookup("template", _edited(ESSAY, 200))).response is None
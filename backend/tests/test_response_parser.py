@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from response_parser import FALLBACK_QUESTION, ResponseParser
+
+QUESTION = {"type": "question", "number": 2, "text": "Why did you pick a desert species?"}
+
+
+def _feed(raw: str, size: int) -> tuple:
+    """(result, spoken text) from feeding `raw` in chunks of `size` characters."""
+    parser = ResponseParser()
+    spoken = "".join(parser.feed(raw[i:i + size]) or "" for i in range(0, len(raw), size))
+    return parser, parser.result(), spoken
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_whole_object_in_any_chunking(size):
+    parser, result, spoken = _feed(json.dumps(QUESTION), size)
+    assert result == QUESTION
+    assert spoken == QUESTION["text"]
+    assert parser.outcome == "json"
+
+
+@pytest.mark.parametrize("raw", [
+    f"```json\n{json.dumps(QUESTION)}\n```",
+    f"Sure! Here is the next question: {json.dumps(QUESTION)} Let me know.",
+    f"{json.dumps(QUESTION)}{json.dumps({'text': 'a second object'})}",
+])
+def test_embedded_object(raw):
+    parser, result, _ = _feed(raw, 5)
+    assert result == QUESTION
+    assert parser.outcome == "embedded_json"
+
+
+def test_truncated_string_keeps_partial_text():
+    parser, result, spoken = _feed('{"type": "question", "number": 3, "text": "How did you measure wat', 4)
+    assert result["text"] == "How did you measure wat"
+    assert result["number"] == 3
+    assert spoken == result["text"]
+    assert parser.outcome == "truncated"
+
+
+def test_truncated_after_field_keeps_scalar():
+    parser, result, _ = _feed('{"type": "review", "review": "Well argued.", "score": 87', 6)
+    assert result["type"] == "review"
+    assert result["score"] == 87
+    assert result["observations"] == []
+    assert parser.outcome == "truncated"
+
+
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_escapes_split_across_chunks(size):
+    text = 'She said "hi"\nthen left\\ café é 😀 tab\there'
+    raw = json.dumps({"type": "question", "text": text})
+    assert "\\ud83d\\ude00" in raw
+    _, result, spoken = _feed(raw, size)
+    assert result["text"] == text
+    assert spoken == text
+
+
+def test_keys_and_other_fields_are_not_spoken():
+    raw = json.dumps({"number": 1, "observations": ["text: not this"], "text": "Only this."})
+    _, result, spoken = _feed(raw, 3)
+    assert spoken == "Only this."
+    assert result["observations"] == ["text: not this"]
+
+
+def test_review_is_spoken_and_normalized():
+    raw = json.dumps({"type": "review", "review": "Clear understanding.", "score": "91.6", "observations": "n/a"})
+    _, result, spoken = _feed(raw, 4)
+    assert spoken == "Clear understanding."
+    assert result["score"] == 92
+    assert result["observations"] == []
+
+
+@pytest.mark.parametrize("score, expected", [(88, 88), (82.0, 82), ("79%", 79), (True, 75), (None, 75), ("high", 75), (float("nan"), 75)])
+def test_score(score, expected):
+    assert ResponseParser._score(score) == expected
+
+
+def test_prose_falls_back_to_cleaned_text():
+    parser = ResponseParser()
+    parser.feed('Tell me about "your method" [briefly].')
+    assert parser.result() == {"type": "question", "number": 1, "text": "Tell me about your method briefly."}
+    assert parser.outcome == "fallback"
+
+
+@pytest.mark.parametrize("raw", ["", "{}", '```json\n{"n": 1}\n```'])
+def test_nothing_speakable_falls_back_to_stock_question(raw):
+    parser = ResponseParser()
+    parser.feed(raw)
+    assert parser.result()["text"] == FALLBACK_QUESTION
@@ -0,0 +1,138 @@
+import pytest
+
+import session_store
+from session_store import MemorySessionStore, RedisSessionStore, SqliteSessionStore
+
+pytestmark = pytest.mark.anyio
+
+TTL = 60
+
+
+def _session(turns: int = 1) -> dict:
+    conversation = []
+    for n in range(turns):
+        conversation.append({"role": "ai", "text": f"Question {n + 1}: why this approach? ✓"})
+        conversation.append({"role": "student", "text": f"Answer {n + 1}"})
+    return {
+        "assignment_text": "An essay on photosynthesis in desert plants. " * 50,
+        "conversation": conversation,
+        "audio": [None] * turns,
+        "question_number": turns,
+        "gemini_api_key": "gemini-secret",
+        "usage": [{"prompt_tokens": 10}],
+    }
+
+
+@pytest.fixture(params=["memory", "redis", "sqlite"])
+async def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemorySessionStore(TTL, max_entries=100)
+    elif request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        store = RedisSessionStore(TTL, client=fakeredis.FakeAsyncRedis())
+    else:
+        store = SqliteSessionStore(TTL, str(tmp_path / "sessions.db"), max_entries=100)
+    yield store
+    await store.close()
+
+
+async def test_round_trip(store):
+    session = _session(turns=2)
+    await store.put("s1", session)
+    assert await store.get("s1") == session
+    assert await store.count() == 1
+    assert store.stats()["hits"] == 1
+
+
+async def test_get_returns_a_copy(store):
+    await store.put("s1", _session())
+    loaded = await store.get("s1")
+    loaded["conversation"].append({"role": "student", "text": "not saved"})
+    assert len((await store.get("s1"))["conversation"]) == 2
+
+
+async def test_missing_and_deleted(store):
+    assert await store.get("nope") is None
+    await store.put("s1", _session())
+    await store.delete("s1")
+    assert await store.get("s1") is None
+    assert await store.count() == 0
+    assert store.stats()["misses"] == 2
+
+
+async def test_appended_turns_are_kept(store):
+    session = _session(turns=1)
+    await store.put("s1", session)
+    session = await store.get("s1")
+    session["conversation"].append({"role": "ai", "text": "Question 2"})
+    session["question_number"] = 2
+    await store.put("s1", session)
+    loaded = await store.get("s1")
+    assert loaded["conversation"][-1] == {"role": "ai", "text": "Question 2"}
+    assert loaded["question_number"] == 2
+
+
+async def test_memory_store_expires_and_evicts(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "monotonic", lambda: now[0])
+    store = MemorySessionStore(TTL, max_entries=2)
+    for session_id in ("a", "b", "c"):
+        await store.put(session_id, _session())
+    # Over max_entries: the least recently used goes first
+    assert await store.get("a") is None
+    assert await store.get("b") is not None
+    now[0] += TTL - 1
+    # Reading "b" slid its expiry; "c" was last touched a full TTL ago
+    assert await store.get("b") is not None
+    now[0] += 2
+    assert await store.get("c") is None
+    assert await store.count() == 1
+    assert store.stats()["evictions"] == 2
+
+
+async def test_sqlite_store_expires(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    store = SqliteSessionStore(TTL, str(tmp_path / "sessions.db"), max_entries=100)
+    await store.put("s1", _session())
+    now[0] += TTL + 1
+    assert await store.get("s1") is None
+    assert await store.count() == 0
+    await store.close()
+
+
+async def test_sqlite_store_keeps_api_keys_off_disk(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first = SqliteSessionStore(TTL, path, max_entries=100)
+    await first.put("s1", _session())
+    assert (await first.get("s1"))["gemini_api_key"] == "gemini-secret"
+    # Another worker reads the same database but never saw the key
+    second = SqliteSessionStore(TTL, path, max_entries=100)
+    loaded = await second.get("s1")
+    assert "gemini_api_key" not in loaded
+    assert loaded["conversation"] == _session()["conversation"]
+    await first.close()
+    await second.close()
+
+
+async def test_sqlite_store_shares_documents(tmp_path):
+    store = SqliteSessionStore(TTL, str(tmp_path / "sessions.db"), max_entries=100)
+    await store.put("s1", _session())
+    await store.put("s2", _session())
+    documents = await store._run(lambda: store._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
+    assert documents == 1
+    assert (await store.get("s2"))["assignment_text"] == _session()["assignment_text"]
+    await store.close()
+
+
+async def test_redis_store_key_prefix():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis()
+    sessions = RedisSessionStore(TTL, client=client)
+    prepared = RedisSessionStore(TTL, client=client, key_prefix="prepared:")
+    await sessions.put("s1", _session())
+    await prepared.put("p1", _session())
+    assert await sessions.count() == 1
+    assert await prepared.get("s1") is None
+    assert 0 < await client.ttl("session:s1") <= TTL
+    await client.aclose()
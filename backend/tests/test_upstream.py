@@ -0,0 +1,240 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+import tts_service
+import upstream
+from upstream import Coalescer, RetryableError, TokenBucket, UpstreamBusy, UpstreamLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+def _limiter(**overrides) -> UpstreamLimiter:
+    options = dict(rate=1000, burst=1000, concurrency=2, max_queue=100, queue_timeout=2.0, retries=2, backoff=0.01)
+    options.update(overrides)
+    return UpstreamLimiter("test", **options)
+
+
+class _Gate:
+    """An upstream call that runs until released, counting how many run at once."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def __call__(self, value=None):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await self.release.wait()
+            return value
+        finally:
+            self.running -= 1
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_bucket_allows_a_burst_then_paces(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(upstream.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+    now[0] += 1.0
+    # Two tokens refilled, both already owed
+    assert bucket.reserve() == 0.5
+
+
+async def test_bucket_wait_past_the_deadline_is_refused():
+    limiter = _limiter(rate=1, burst=1, queue_timeout=0.2)
+    gate = _Gate()
+    gate.release.set()
+    assert await limiter.call("key", gate, "ok") == "ok"
+    with pytest.raises(UpstreamBusy) as busy:
+        await limiter.call("key", gate, "ok")
+    assert gate.calls == 1
+    assert busy.value.retry_after >= 1.0
+
+
+async def test_concurrency_is_limited_per_key():
+    limiter = _limiter(concurrency=2)
+    gate = _Gate()
+    calls = [asyncio.ensure_future(limiter.call("key", gate)) for _ in range(5)]
+    other = asyncio.ensure_future(limiter.call("other key", gate))
+    await _settle()
+    # Two for "key", one for the other key, which has its own limit
+    assert gate.running == 3
+    assert limiter.spare("key") == -3
+    gate.release.set()
+    await asyncio.gather(*calls, other)
+    assert gate.calls == 6 and gate.peak == 3
+    assert limiter.spare("key") == 2
+
+
+async def test_full_queue_sheds_new_calls():
+    limiter = _limiter(concurrency=1, max_queue=1)
+    gate = _Gate()
+    running = asyncio.ensure_future(limiter.call("key", gate))
+    await _settle()
+    waiting = asyncio.ensure_future(limiter.call("key", gate))
+    await _settle()
+    assert limiter.stats()["waiting"] == 1
+    with pytest.raises(UpstreamBusy):
+        await limiter.call("key", gate)
+    gate.release.set()
+    await asyncio.gather(running, waiting)
+    assert gate.calls == 2
+
+
+async def test_slot_wait_times_out_as_busy():
+    limiter = _limiter(concurrency=1, queue_timeout=0.05)
+    gate = _Gate()
+    running = asyncio.ensure_future(limiter.call("key", gate))
+    await _settle()
+    with pytest.raises(UpstreamBusy):
+        await limiter.call("key", gate)
+    gate.release.set()
+    await running
+
+
+async def test_retry_waits_for_retry_after():
+    limiter = _limiter(backoff=0.001)
+    attempts = []
+
+    async def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RetryableError("429", retry_after=0.1)
+        return "ok"
+
+    assert await limiter.call("key", flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.1
+
+
+async def test_retries_give_up_as_busy():
+    limiter = _limiter(retries=1, backoff=0.001)
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        raise RetryableError("503")
+
+    with pytest.raises(UpstreamBusy):
+        await limiter.call("key", failing)
+    assert len(attempts) == 2
+    assert limiter.spare("key") == 2
+
+
+async def test_other_errors_are_not_retried():
+    limiter = _limiter()
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await limiter.call("key", broken)
+    assert len(attempts) == 1
+
+
+async def _items(*items, fail_first: bool = False):
+    if fail_first:
+        raise RetryableError("503")
+    for item in items:
+        yield item
+
+
+async def test_stream_holds_its_slot_until_closed():
+    limiter = _limiter(concurrency=1, queue_timeout=0.05)
+
+    async def open_stream():
+        return _items("a", "b", "c")
+
+    stream = await limiter.call_stream("key", open_stream)
+    assert await stream.__anext__() == "a"
+    assert limiter.spare("key") == 0
+    # The reply is still generating, so a second call can't start
+    with pytest.raises(UpstreamBusy):
+        await limiter.call_stream("key", open_stream)
+    await stream.aclose()
+    assert limiter.spare("key") == 1
+    again = await limiter.call_stream("key", open_stream)
+    assert [item async for item in again] == ["a", "b", "c"]
+    assert limiter.spare("key") == 1
+
+
+async def test_stream_is_reopened_on_failure_before_the_first_item():
+    limiter = _limiter(backoff=0.001)
+    opened = []
+
+    async def open_stream():
+        opened.append(1)
+        return _items("a", "b", fail_first=len(opened) == 1)
+
+    stream = await limiter.call_stream("key", open_stream)
+    assert [item async for item in stream] == ["a", "b"]
+    assert len(opened) == 2
+    assert limiter.spare("key") == 2
+
+
+async def test_stream_failure_after_output_is_raised():
+    limiter = _limiter(backoff=0.001)
+    opened = []
+
+    async def broken_midway():
+        yield "a"
+        raise RetryableError("503")
+
+    async def open_stream():
+        opened.append(1)
+        return broken_midway()
+
+    stream = await limiter.call_stream("key", open_stream)
+    received = []
+    with pytest.raises(RetryableError):
+        async for item in stream:
+            received.append(item)
+    # A retry would repeat "a"
+    assert received == ["a"] and len(opened) == 1
+    assert limiter.spare("key") == 2
+
+
+async def test_coalescer_shares_one_call():
+    coalescer = Coalescer("test")
+    gate = _Gate()
+    callers = [asyncio.ensure_future(coalescer.run("clip", lambda: gate("audio"))) for _ in range(4)]
+    await _settle()
+    callers[0].cancel()
+    gate.release.set()
+    results = await asyncio.gather(*callers[1:])
+    # One caller leaving doesn't cancel the call for the rest
+    assert results == ["audio"] * 3
+    assert gate.calls == 1
+    assert coalescer.stats()["inflight"] == 0
+
+
+async def test_identical_tts_requests_make_one_upstream_call(monkeypatch, settings):
+    settings.tts_hedge_enabled = False
+    calls = []
+
+    async def elevenlabs(text, api_key, model_id):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        return b"ID3" + text.encode()
+
+    monkeypatch.setattr(tts_service, "_elevenlabs_tts", elevenlabs)
+    text = f"Why did you water the plots at night? {uuid.uuid4().hex[:6]}"
+    results = await asyncio.gather(*(tts_service.synthesize(text, elevenlabs_api_key="key") for _ in range(5)))
+    assert len(calls) == 1
+    assert len({key for key, _ in results}) == 1
+    assert all(audio == b"ID3" + text.encode() for _, audio in results)
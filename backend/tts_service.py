@@ -1,8 +1,17 @@
+import asyncio
 import io
+import re
+import time
 import base64
-import os
-import requests
+from collections import deque
+import httpx
+import mp3
 from config import get_settings
+from clients import get_client_registry
+from executor import run_gtts
+from audio_cache import audio_cache_key, get_audio_cache
+from metrics import TTS_FALLBACKS, TTS_REQUESTS, UPSTREAM_EVENTS, timed
+from upstream import Coalescer, RetryableError, get_limiter
 
 # ElevenLabs voice IDs - you can change this to any voice from their library
 # Some good options:
@@ -13,34 +22,362 @@ from config import get_settings
 # - "pNInz6obpgDQGcFmaJgB" - Adam (professional male)
 ELEVENLABS_VOICE_ID = "EXAVITQu4vr4xnSDxMaL"  # Bella - friendly and natural
 
-# Model options:
-# - "eleven_multilingual_v2" - highest quality
-# - "eleven_turbo_v2_5" - faster, still good quality
-# - "eleven_flash_v2_5" - fastest, lowest latency
-ELEVENLABS_MODEL = "eleven_turbo_v2_5"
+# Model tiers, best quality first (ELEVENLABS_MODEL picks the best one used):
+# - "multilingual" - highest quality
+# - "turbo" - faster, still good quality
+# - "flash" - fastest, lowest latency
+# Each has a prior latency in seconds for (short, long) texts, used until
+# enough calls have been observed.
+ELEVENLABS_MODELS = {
+    "multilingual": ("eleven_multilingual_v2", (2.0, 5.0)),
+    "turbo": ("eleven_turbo_v2_5", (1.0, 2.5)),
+    "flash": ("eleven_flash_v2_5", (0.5, 1.2)),
+}
 
+ELEVENLABS_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75,
+    "style": 0.0,
+    "use_speaker_boost": True
+}
 
-def text_to_speech_base64(text: str, lang: str = "en", elevenlabs_api_key: str = None) -> str:
-    """Convert text to speech using ElevenLabs and return as base64-encoded MP3."""
+# A sentence ends at ., ! or ? (plus closing quotes/brackets) followed by whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+class SentenceSplitter:
+    """Cut incrementally arriving text into sentences for per-sentence TTS.
+
+    Very short sentences are merged with the next one so we don't pay a
+    TTS round trip for fragments like "Great!".
+    """
+
+    def __init__(self, min_chars: int = 24):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str, min_chars: int = 24) -> list:
+    splitter = SentenceSplitter(min_chars)
+    return splitter.feed(text) + splitter.flush()
+
+
+# Shortest segment of a long text synthesized on its own; shorter
+# sentences are merged with the next one
+SEGMENT_MIN_CHARS = 80
+
+class LatencyWindow:
+    """Recent call latencies for one engine and text length."""
+
+    def __init__(self, prior: float, size: int = 50, min_samples: int = 5):
+        self.prior = prior
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        if len(self._samples) < self.min_samples:
+            return self.prior
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# (model tier, is long text) -> LatencyWindow
+_latency = {
+    (tier, long_text): LatencyWindow(priors[long_text])
+    for tier, (_, priors) in ELEVENLABS_MODELS.items()
+    for long_text in (False, True)
+}
+
+# Concurrent requests for the same clip share one synthesis
+_inflight = Coalescer("tts")
+
+# ElevenLabs API key -> concurrency slots held by segmented syntheses
+_segment_slots = {}
+
+
+def _model_tiers() -> list:
+    """The allowed ElevenLabs tiers, best first, capped by ELEVENLABS_MODEL."""
+    tiers = list(ELEVENLABS_MODELS)
+    best = get_settings().elevenlabs_model
+    if best in tiers:
+        return tiers[tiers.index(best):]
+    # A raw model ID names one model
+    for tier, (model_id, _) in ELEVENLABS_MODELS.items():
+        if model_id == best:
+            return tiers[tiers.index(tier):]
+    return tiers[1:]
+
+
+def choose_model(text: str, budget: float) -> str:
+    """Pick the best allowed tier whose recent p90 latency fits the budget."""
     settings = get_settings()
+    long_text = len(text) > settings.tts_long_text_chars
+    tiers = _model_tiers()
+    for tier in tiers:
+        if _latency[tier, long_text].percentile(0.9) <= budget:
+            return tier
+    return tiers[-1]
+
+
+def _elevenlabs_key(text: str, tier: str) -> str:
+    return audio_cache_key(
+        text, "elevenlabs",
+        voice_id=ELEVENLABS_VOICE_ID, model=ELEVENLABS_MODELS[tier][0], voice_settings=ELEVENLABS_VOICE_SETTINGS,
+    )
+
+
+async def synthesize(text: str, lang: str = "en", elevenlabs_api_key: str = None, budget: float = None) -> tuple:
+    """Convert text to MP3 using ElevenLabs (gTTS fallback), served from cache when possible.
+
+    The ElevenLabs model is chosen to fit `budget` seconds (TTS_BUDGET_SECONDS
+    by default). A call slower than usual is hedged with gTTS and the first
+    clip to arrive is used. Text longer than TTS_SEGMENT_CHARS is synthesized
+    sentence by sentence in parallel. Returns (cache_key, audio_bytes); the
+    key addresses the audio in the audio cache.
+    """
+    settings = get_settings()
+    budget = settings.tts_budget_seconds if budget is None else budget
     
     # Use provided key or fall back to settings
     api_key = elevenlabs_api_key or settings.elevenlabs_api_key
     
+    if settings.tts_segment_chars and len(text) > settings.tts_segment_chars:
+        segments = split_sentences(text, SEGMENT_MIN_CHARS)
+        parallel = min(len(segments), _segment_parallelism(api_key))
+        if parallel > 1:
+            return await _synthesize_segments(segments, lang, api_key, budget, parallel)
+    return await _synthesize_one(text, lang, api_key, budget)
+
+
+class TurnVoice:
+    """Engine choice shared by the sentences of one streamed reply.
+
+    Only the first sentence may be hedged with gTTS. Whichever engine
+    delivers it speaks the rest of the reply, so the voice doesn't change
+    from one sentence to the next. Later sentences start on ElevenLabs
+    right away and are redone with gTTS if the first one ended up there;
+    once any sentence falls back to gTTS, so do the ones after it.
+    """
+
+    def __init__(self, elevenlabs_api_key: str = None, lang: str = "en", budget: float = None):
+        settings = get_settings()
+        self.api_key = elevenlabs_api_key or settings.elevenlabs_api_key
+        self.lang = lang
+        self.budget = settings.tts_budget_seconds if budget is None else budget
+        # Resolves to whether the first sentence was spoken by gTTS
+        self._first_on_gtts: asyncio.Future = None
+        self._gtts_only = not self.api_key
+
+    async def synthesize(self, text: str) -> tuple:
+        """(cache_key, audio_bytes) for one sentence of the reply."""
+        if self._gtts_only:
+            return await _gtts(text, self.lang)
+        if self._first_on_gtts is None:
+            self._first_on_gtts = asyncio.get_running_loop().create_future()
+            on_gtts = False
+            try:
+                key, audio = await _synthesize_one(text, self.lang, self.api_key, self.budget)
+                on_gtts = key == _gtts_key(text, self.lang)
+                return key, audio
+            finally:
+                # A cancelled or failed first sentence leaves the rest on ElevenLabs
+                self._first_on_gtts.set_result(on_gtts)
+                self._gtts_only = self._gtts_only or on_gtts
+
+        key, audio = await _synthesize_one(text, self.lang, self.api_key, self.budget, hedge=False)
+        if key == _gtts_key(text, self.lang):
+            self._gtts_only = True
+            return key, audio
+        if await asyncio.shield(self._first_on_gtts) or self._gtts_only:
+            return await _gtts(text, self.lang)
+        return key, audio
+
+
+def _segment_parallelism(api_key: str) -> int:
+    """Segments a long text may synthesize at once.
+
+    Splitting only pays off while ElevenLabs has idle capacity for the key;
+    under load the extra requests would queue behind other students' clips.
+    Half of the key's concurrency is left for requests that arrive meanwhile.
+    """
+    parallel = get_settings().tts_segment_concurrency
+    if api_key:
+        limiter = get_limiter("elevenlabs")
+        idle = limiter.spare(api_key) - _segment_slots.get(api_key, 0) - limiter.concurrency // 2
+        parallel = min(parallel, idle)
+    return parallel
+
+
+async def _synthesize_one(text: str, lang: str, api_key: str, budget: float, hedge: bool = True) -> tuple:
     # Try ElevenLabs first if API key is available
     if api_key:
-        try:
-            return _elevenlabs_tts(text, api_key)
-        except Exception as e:
-            print(f"ElevenLabs TTS failed, falling back to gTTS: {e}")
+        # A clip from any allowed model will do, best first
+        for tier in _model_tiers():
+            key = _elevenlabs_key(text, tier)
+            audio = await get_audio_cache().get(key)
+            if audio is not None:
+                TTS_REQUESTS.inc(engine="cache")
+                return key, audio
+        tier = choose_model(text, budget)
+        return await _hedged(text, lang, tier, api_key, budget, hedge)
     
-    # Fallback to gTTS
-    return _gtts_fallback(text, lang)
+    return await _gtts(text, lang)
+
+
+async def _synthesize_segments(segments: list, lang: str, api_key: str, budget: float, parallel: int) -> tuple:
+    """Synthesize sentences concurrently and join the clips frame by frame.
+
+    Each sentence is cached on its own. Segments are not hedged, so the
+    voice only changes if ElevenLabs fails; then every segment is redone
+    with gTTS, because clips from different engines can't share a stream.
+    """
+    slots = asyncio.Semaphore(parallel)
+
+    async def one(segment: str) -> tuple:
+        async with slots:
+            return await _synthesize_one(segment, lang, api_key, budget, hedge=False)
+
+    # Hold the slots until done so concurrent long texts don't all split at once
+    if api_key:
+        _segment_slots[api_key] = _segment_slots.get(api_key, 0) + parallel
+    try:
+        with timed("tts_segments"):
+            results = await asyncio.gather(*(one(segment) for segment in segments))
+            on_gtts = [key == _gtts_key(segment, lang) for segment, (key, _) in zip(segments, results)]
+            if any(on_gtts) and not all(on_gtts):
+                results = await asyncio.gather(*(_gtts(segment, lang) for segment in segments))
+    finally:
+        if api_key:
+            _segment_slots[api_key] -= parallel
+            if not _segment_slots[api_key]:
+                del _segment_slots[api_key]
+    keys = [key for key, _ in results]
+    key = audio_cache_key("", "segments", parts=keys)
+    audio = mp3.concat([audio for _, audio in results])
+    await get_audio_cache().put(key, audio)
+    return key, audio
+
+
+def _gtts_key(text: str, lang: str) -> str:
+    return audio_cache_key(text, "gtts", lang=lang)
+
+
+async def _gtts(text: str, lang: str) -> tuple:
+    key = _gtts_key(text, lang)
+    audio = await get_audio_cache().get(key)
+    if audio is not None:
+        TTS_REQUESTS.inc(engine="cache")
+        return key, audio
+    return key, await _inflight.run(key, lambda: _gtts_cached(key, text, lang))
+
+
+async def _hedged(text: str, lang: str, tier: str, api_key: str, budget: float, hedge: bool = True) -> tuple:
+    """Race ElevenLabs against a gTTS hedge started once the call runs long."""
+    settings = get_settings()
+    key = _elevenlabs_key(text, tier)
+    window = _latency[tier, len(text) > settings.tts_long_text_chars]
+    primary = asyncio.ensure_future(_inflight.run(key, lambda: _elevenlabs_cached(key, text, api_key, tier, window)))
+    hedge_after = min(budget, max(settings.tts_hedge_min_seconds, window.percentile(settings.tts_hedge_percentile)))
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after if hedge and settings.tts_hedge_enabled else None)
+        if primary in done and primary.exception() is None:
+            return key, primary.result()
+        if primary in done:
+            TTS_FALLBACKS.inc()
+            print(f"ElevenLabs TTS failed, falling back to gTTS: {primary.exception()}")
+            return await _gtts(text, lang)
+
+        UPSTREAM_EVENTS.inc(provider="tts", event="hedged")
+        fallback = asyncio.ensure_future(_gtts(text, lang))
+        pending = {primary, fallback}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if primary in done and primary.exception() is None:
+                    return key, primary.result()
+                if fallback in done and fallback.exception() is None:
+                    UPSTREAM_EVENTS.inc(provider="tts", event="hedge_won")
+                    return fallback.result()
+            # Both failed: report the primary's error
+            raise primary.exception()
+        finally:
+            fallback.cancel()
+    finally:
+        # Cancels the ElevenLabs call unless another request is sharing it
+        primary.cancel()
+
+
+async def _elevenlabs_cached(key: str, text: str, api_key: str, tier: str, window: LatencyWindow) -> bytes:
+    started = time.monotonic()
+    try:
+        with timed("tts_elevenlabs"):
+            audio = await get_limiter("elevenlabs").call(api_key, _elevenlabs_tts, text, api_key, ELEVENLABS_MODELS[tier][0])
+    except asyncio.CancelledError:
+        # Lost a hedge race: the call took at least this long
+        window.observe(time.monotonic() - started)
+        raise
+    window.observe(time.monotonic() - started)
+    TTS_REQUESTS.inc(engine="elevenlabs")
+    await get_audio_cache().put(key, audio)
+    return audio
+
+
+async def _gtts_cached(key: str, text: str, lang: str) -> bytes:
+    # Blocking HTTP inside the library, so keep it off the loop
+    with timed("tts_gtts"):
+        audio = await run_gtts(_gtts_fallback, text, lang)
+    TTS_REQUESTS.inc(engine="gtts")
+    await get_audio_cache().put(key, audio)
+    return audio
+
+
+def tts_stats() -> dict:
+    """Recent p50/p90 ElevenLabs latency per model tier and text length."""
+    stats = {}
+    for (tier, long_text), window in _latency.items():
+        length = "long" if long_text else "short"
+        stats[f"{tier}_{length}_p50_seconds"] = window.percentile(0.5)
+        stats[f"{tier}_{length}_p90_seconds"] = window.percentile(0.9)
+    stats.update(_inflight.stats())
+    return stats
+
+
+async def text_to_speech(text: str, lang: str = "en", elevenlabs_api_key: str = None) -> bytes:
+    """Convert text to speech and return the raw MP3 bytes."""
+    _, audio = await synthesize(text, lang=lang, elevenlabs_api_key=elevenlabs_api_key)
+    return audio
+
+
+async def text_to_speech_base64(text: str, lang: str = "en", elevenlabs_api_key: str = None) -> str:
+    """Convert text to speech using ElevenLabs and return as base64-encoded MP3."""
+    audio = await text_to_speech(text, lang=lang, elevenlabs_api_key=elevenlabs_api_key)
+    return base64.b64encode(audio).decode("utf-8")
 
 
-def _elevenlabs_tts(text: str, api_key: str) -> str:
+async def _elevenlabs_tts(text: str, api_key: str, model_id: str) -> bytes:
     """Use ElevenLabs API for high-quality TTS."""
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+    url = f"{get_settings().elevenlabs_base_url}/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
     
     headers = {
         "Accept": "audio/mpeg",
@@ -50,30 +387,32 @@ def _elevenlabs_tts(text: str, api_key: str) -> str:
     
     data = {
         "text": text,
-        "model_id": ELEVENLABS_MODEL,
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75,
-            "style": 0.0,
-            "use_speaker_boost": True
-        }
+        "model_id": model_id,
+        "voice_settings": ELEVENLABS_VOICE_SETTINGS,
     }
     
-    response = requests.post(url, json=data, headers=headers)
+    try:
+        response = await get_client_registry().http().post(url, json=data, headers=headers)
+    except httpx.TransportError as e:
+        raise RetryableError(f"ElevenLabs API unreachable: {e}")
     
+    if response.status_code == 429 or response.status_code >= 500:
+        retry_after = response.headers.get("Retry-After")
+        raise RetryableError(
+            f"ElevenLabs API error: {response.status_code} - {response.text}",
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
     if response.status_code != 200:
         raise Exception(f"ElevenLabs API error: {response.status_code} - {response.text}")
     
-    # Convert audio bytes to base64
-    return base64.b64encode(response.content).decode("utf-8")
+    return response.content
 
 
-def _gtts_fallback(text: str, lang: str = "en") -> str:
+def _gtts_fallback(text: str, lang: str = "en") -> bytes:
     """Fallback to gTTS if ElevenLabs is not available."""
     from gtts import gTTS
     
-    tts = gTTS(text=text, lang=lang)
+    tts = gTTS(text=text, lang=lang, timeout=get_settings().gtts_timeout_seconds)
     audio_buffer = io.BytesIO()
     tts.write_to_fp(audio_buffer)
-    audio_buffer.seek(0)
-    return base64.b64encode(audio_buffer.read()).decode("utf-8")
+    return audio_buffer.getvalue()
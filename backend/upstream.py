@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import math
+import random
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from google.api_core.exceptions import InternalServerError, ResourceExhausted, ServiceUnavailable
+
+from config import get_settings
+from metrics import UPSTREAM_EVENTS, record_stage
+
+
+class UpstreamBusy(Exception):
+    """An upstream call could not be made in time; the client should retry later."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is busy, retry in {math.ceil(retry_after)}s")
+        self.provider = provider
+        self.retry_after = max(1.0, retry_after)
+
+
+class RetryableError(Exception):
+    """A transient upstream failure (rate limit, 5xx) worth retrying."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Reservation-style token bucket: a call takes a token now and waits off any debt."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token; return how long to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self) -> None:
+        self.tokens += 1
+
+
+class _KeyState:
+    __slots__ = ("bucket", "slots", "users")
+
+    def __init__(self, rate: float, burst: int, concurrency: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = asyncio.Semaphore(concurrency)
+        # Calls queued or running; the state is only dropped when idle
+        self.users = 0
+
+
+class UpstreamLimiter:
+    """Schedules calls to one provider.
+
+    Each API key gets a token bucket (rate and burst) and a concurrency
+    limit. Calls wait for both, but only until the queue timeout. The
+    number of waiting calls per provider is bounded. Transient failures
+    are retried with jittered exponential backoff within the same
+    deadline. A call that cannot start or keeps failing raises
+    UpstreamBusy with a retry hint instead of the raw error.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int, concurrency: int, max_queue: int,
+                 queue_timeout: float, retries: int, backoff: float, retryable: tuple = (), max_keys: int = 256):
+        self.provider = provider
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retryable = (RetryableError,) + tuple(retryable)
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[str, _KeyState]" = OrderedDict()
+        self.waiting = 0
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def _state(self, api_key: str) -> _KeyState:
+        key_id = self._key_id(api_key)
+        state = self._keys.get(key_id)
+        if state is None:
+            state = self._keys[key_id] = _KeyState(self.rate, self.burst, self.concurrency)
+            if len(self._keys) > self.max_keys:
+                for old_id, old in list(self._keys.items()):
+                    if old.users == 0 and old is not state:
+                        del self._keys[old_id]
+                        if len(self._keys) <= self.max_keys:
+                            break
+        self._keys.move_to_end(key_id)
+        return state
+
+    def _busy(self, retry_after: float) -> UpstreamBusy:
+        UPSTREAM_EVENTS.inc(provider=self.provider, event="shed")
+        return UpstreamBusy(self.provider, retry_after)
+
+    def spare(self, api_key: str) -> int:
+        """Concurrency slots of a key not taken by queued or running calls."""
+        state = self._keys.get(self._key_id(api_key))
+        return self.concurrency - (state.users if state else 0)
+
+    def check(self) -> None:
+        """Refuse new work up front while the queue is full."""
+        if self.waiting >= self.max_queue:
+            raise self._busy(self.waiting / (self.rate or 1))
+
+    async def _acquire(self, state: _KeyState, deadline: float) -> None:
+        started = time.monotonic()
+        wait = state.bucket.reserve()
+        if started + wait > deadline:
+            state.bucket.refund()
+            raise self._busy(wait)
+        self.waiting += 1
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                await asyncio.wait_for(state.slots.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise self._busy(self.queue_timeout / 2) from None
+        finally:
+            self.waiting -= 1
+            record_stage(f"{self.provider}_queue", time.monotonic() - started)
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> float:
+        """Backoff before the next attempt, or UpstreamBusy if there is none left."""
+        hint = getattr(error, "retry_after", None) or 0.0
+        # Full jitter around an exponential step, never below the server's hint
+        delay = max(hint, random.uniform(0.5, 1.5) * self.backoff * 2 ** attempt)
+        if attempt == self.retries or time.monotonic() + delay > deadline:
+            raise self._busy(delay) from error
+        UPSTREAM_EVENTS.inc(provider=self.provider, event="retry")
+        return delay
+
+    async def call(self, api_key: str, func: Callable[..., Awaitable], *args, **kwargs):
+        self.check()
+        deadline = time.monotonic() + self.queue_timeout
+        state = self._state(api_key)
+        state.users += 1
+        try:
+            for attempt in range(self.retries + 1):
+                await self._acquire(state, deadline)
+                try:
+                    return await func(*args, **kwargs)
+                except self.retryable as e:
+                    delay = self._retry_delay(e, attempt, deadline)
+                finally:
+                    state.slots.release()
+                await asyncio.sleep(delay)
+        finally:
+            state.users -= 1
+
+    async def call_stream(self, api_key: str, func: Callable[..., Awaitable], *args, **kwargs) -> AsyncIterator:
+        """Like call, for a call that opens a stream; returns an async iterator over it.
+
+        The key's concurrency slot stays taken until the iterator is
+        exhausted or closed, so a reply counts against the limit for as
+        long as it is generating. The iterator must be consumed. A retryable
+        failure before the first item reopens the stream like a failed
+        call; after that it is raised, since a retry would repeat output.
+        """
+        self.check()
+        deadline = time.monotonic() + self.queue_timeout
+        state = self._state(api_key)
+        state.users += 1
+        attempt = 0
+        try:
+            while True:
+                await self._acquire(state, deadline)
+                try:
+                    stream = await func(*args, **kwargs)
+                    break
+                except self.retryable as e:
+                    state.slots.release()
+                    delay = self._retry_delay(e, attempt, deadline)
+                except BaseException:
+                    state.slots.release()
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+        except BaseException:
+            state.users -= 1
+            raise
+        return self._held_stream(state, deadline, attempt, stream, func, args, kwargs)
+
+    async def _held_stream(self, state: _KeyState, deadline: float, attempt: int, stream, func, args, kwargs) -> AsyncIterator:
+        held = True
+        try:
+            while True:
+                yielded = False
+                try:
+                    if stream is None:
+                        stream = await func(*args, **kwargs)
+                    async for item in stream:
+                        yielded = True
+                        yield item
+                    return
+                except self.retryable as e:
+                    if yielded:
+                        raise
+                    delay = self._retry_delay(e, attempt, deadline)
+                stream = None
+                state.slots.release()
+                held = False
+                attempt += 1
+                await asyncio.sleep(delay)
+                await self._acquire(state, deadline)
+                held = True
+        finally:
+            if held:
+                state.slots.release()
+            state.users -= 1
+
+    def stats(self) -> dict:
+        return {"keys": len(self._keys), "waiting": self.waiting}
+
+
+class Coalescer:
+    """Share one in-flight call among concurrent callers asking for the same key.
+
+    The call is cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # key -> [future, number of waiting callers]
+        self._inflight = {}
+
+    def _done(self, key: str, future: asyncio.Future) -> None:
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            future.exception()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable]):
+        entry = self._inflight.get(key)
+        if entry is None:
+            future = asyncio.ensure_future(factory())
+            entry = self._inflight[key] = [future, 0]
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            UPSTREAM_EVENTS.inc(provider=self.name, event="coalesced")
+        future = entry[0]
+        entry[1] += 1
+        try:
+            # One caller giving up must not cancel the call for the others
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not future.done():
+                # Nobody is left to use the result; later callers start afresh
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                future.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight)}
+
+
+@lru_cache
+def get_limiter(provider: str) -> UpstreamLimiter:
+    settings = get_settings()
+    common = dict(
+        max_queue=settings.upstream_max_queue,
+        queue_timeout=settings.upstream_queue_timeout_seconds,
+        retries=settings.upstream_retries,
+        backoff=settings.upstream_backoff_seconds,
+        max_keys=settings.client_max_entries,
+    )
+    if provider == "gemini":
+        return UpstreamLimiter(
+            "gemini", settings.gemini_rate_per_second, settings.gemini_burst, settings.gemini_max_concurrency,
+            retryable=(ResourceExhausted, ServiceUnavailable, InternalServerError), **common,
+        )
+    if provider == "elevenlabs":
+        return UpstreamLimiter(
+            "elevenlabs", settings.elevenlabs_rate_per_second, settings.elevenlabs_burst,
+            settings.elevenlabs_max_concurrency, **common,
+        )
+    raise ValueError(f"Unknown upstream provider: {provider}")
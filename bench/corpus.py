@@ -0,0 +1,160 @@
+"""
+Generates the benchmark corpus: sample assignments as PDF, DOCX, PPTX and TXT
+in several sizes. Output is deterministic for a given seed.
+
+Run: python bench/corpus.py --out bench/corpus
+"""
+
+import argparse
+import io
+import os
+import random
+
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+# Approximate word counts per size
+SIZES = {"small": 300, "medium": 3000, "large": 30000}
+FORMATS = ("txt", "docx", "pptx", "pdf")
+
+TOPICS = [
+    ("photosynthesis", "desert plants", "water loss", "stomata", "CAM metabolism"),
+    ("the industrial revolution", "textile mills", "urban growth", "child labour", "steam power"),
+    ("supply chains", "inventory buffers", "demand shocks", "lead times", "safety stock"),
+    ("neural networks", "gradient descent", "overfitting", "regularisation", "validation data"),
+]
+TEMPLATES = [
+    "This section examines how {a} relates to {b}.",
+    "Earlier studies of {a} often overlooked the role of {c}.",
+    "To test this, I compared {b} under different levels of {d}.",
+    "The results suggest that {d} has a stronger effect on {c} than expected.",
+    "One limitation is that {e} was measured only indirectly.",
+    "A different approach would have been to model {e} explicitly.",
+    "Overall, the evidence points to {a} being shaped by {c} and {d}.",
+    "I chose this method because it isolates {b} from {e}.",
+]
+
+
+def essay_paragraphs(words: int, seed: int) -> list:
+    rng = random.Random(seed)
+    a, b, c, d, e = rng.choice(TOPICS)
+    paragraphs = []
+    count = 0
+    while count < words:
+        sentences = [rng.choice(TEMPLATES).format(a=a, b=b, c=c, d=d, e=e) for _ in range(rng.randint(4, 8))]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        count += len(paragraph.split())
+    return paragraphs
+
+
+def to_txt(paragraphs: list) -> bytes:
+    return "\n\n".join(paragraphs).encode("utf-8")
+
+
+def to_docx(paragraphs: list) -> bytes:
+    doc = Document()
+    for paragraph in paragraphs:
+        doc.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def to_pptx(paragraphs: list) -> bytes:
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # Blank
+    for paragraph in paragraphs:
+        slide = prs.slides.add_slide(layout)
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6))
+        box.text_frame.word_wrap = True
+        box.text_frame.text = paragraph
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def _wrap(text: str, width: int = 90) -> list:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def to_pdf(paragraphs: list, lines_per_page: int = 50) -> bytes:
+    """A minimal text-only PDF (Helvetica, one content stream per page)."""
+    lines = []
+    for paragraph in paragraphs:
+        lines.extend(_wrap(paragraph))
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for number, page_lines in enumerate(pages):
+        page_id, content_id = 4 + number * 2, 5 + number * 2
+        kids.append(f"{page_id} 0 R")
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in page_lines)
+        stream = "BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        stream = stream.encode("latin-1", errors="replace")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = out.tell()
+        out.write(f"{object_id} 0 obj\n".encode() + objects[object_id] + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for object_id in sorted(objects):
+        out.write(f"{offsets[object_id]:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+WRITERS = {"txt": to_txt, "docx": to_docx, "pptx": to_pptx, "pdf": to_pdf}
+
+
+def build_corpus(out_dir: str, seed: int = 7, sizes=SIZES, formats=FORMATS) -> list:
+    """Write the corpus to `out_dir` (skipping files that exist) and return the paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for size_index, (size, words) in enumerate(sizes.items()):
+        for format_index, ext in enumerate(formats):
+            path = os.path.join(out_dir, f"{size}.{ext}")
+            if not os.path.exists(path):
+                paragraphs = essay_paragraphs(words, seed + size_index * 10 + format_index)
+                with open(path, "wb") as f:
+                    f.write(WRITERS[ext](paragraphs))
+            paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus"))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    for path in build_corpus(args.out, args.seed):
+        print(f"{path}  {os.path.getsize(path):>10,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Local stand-in for the ElevenLabs text-to-speech API, for benchmarks.
+Point the backend at it with ELEVENLABS_BASE_URL=http://localhost:<port>.
+
+Run: python bench/fake_elevenlabs.py --port 8101 --latency 0.4 --jitter 0.2
+"""
+
+import argparse
+import asyncio
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# Roughly what a 128 kbps MP3 takes per character of speech
+BYTES_PER_CHAR = 1000
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz), behind a minimal ID3v2 tag
+FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+ID3_TAG = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+
+
+def create_app(latency: float, jitter: float, failure_rate: float, per_char: float = 0.001) -> FastAPI:
+    app = FastAPI(title="Fake ElevenLabs")
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        body = await request.json()
+        text = body.get("text", "")
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter) + len(text) * per_char))
+        if random.random() < failure_rate:
+            return JSONResponse({"detail": "Injected failure"}, status_code=503)
+        # Silence, framed like real MP3 and the size a real clip would have
+        frames = max(1, len(text) * BYTES_PER_CHAR // len(FRAME))
+        return Response(ID3_TAG + FRAME * frames, media_type="audio/mpeg")
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.4, help="Mean seconds per request, plus --per-char")
+    parser.add_argument("--per-char", type=float, default=0.001, help="Extra seconds per character of text")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests failing with 503")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8101)
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.jitter, args.failure_rate, args.per_char)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Local stand-in for the Gemini API (plaintext gRPC), for benchmarks.
+Point the backend at it with GEMINI_API_ENDPOINT=localhost:<port>.
+
+Run: python bench/fake_gemini.py --port 50051 --latency 0.8 --jitter 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+
+import grpc
+import google.ai.generativelanguage as glm
+
+SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+
+class FakeGemini:
+    def __init__(self, latency: float, jitter: float, failure_rate: float, chunk_chars: int, chunk_delay: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+
+    def _reply(self, prompt: str) -> str:
+        """A response in the JSON shape the backend asks for."""
+        if "has answered all" in prompt:
+            return json.dumps({
+                "type": "review",
+                "score": random.randint(70, 100),
+                "review": "Thanks for walking me through your work. You explained your choices clearly and knew the details.",
+                "observations": ["Explained the method clearly", "Knew the key sources"],
+            })
+        match = re.search(r"Now ask question (\d+)", prompt)
+        number = int(match.group(1)) if match else 1
+        words = re.findall(r"[A-Za-z]{7,}", prompt[-4000:]) or ["assignment"]
+        return json.dumps({
+            "type": "question",
+            "number": number,
+            "text": f"Thanks for that. For question {number}, you mention {random.choice(words).lower()} in your work. "
+                    f"Can you explain why you chose that approach and what alternatives you considered?",
+        })
+
+    def _response(self, text: str, prompt_tokens: int, final: bool) -> glm.GenerateContentResponse:
+        candidate = glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)], role="model"))
+        if final:
+            candidate.finish_reason = glm.Candidate.FinishReason.STOP
+        response = glm.GenerateContentResponse(candidates=[candidate])
+        if final:
+            response.usage_metadata = glm.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=len(text) // 4,
+                total_token_count=prompt_tokens + len(text) // 4,
+            )
+        return response
+
+    async def _wait(self, context) -> None:
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.failure_rate:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Injected failure")
+
+    @staticmethod
+    def _prompt(request: glm.GenerateContentRequest) -> str:
+        return "\n".join(part.text for content in request.contents for part in content.parts)
+
+    async def generate(self, request: glm.GenerateContentRequest, context) -> glm.GenerateContentResponse:
+        prompt = self._prompt(request)
+        await self._wait(context)
+        return self._response(self._reply(prompt), len(prompt) // 4, final=True)
+
+    async def stream(self, request: glm.GenerateContentRequest, context):
+        prompt = self._prompt(request)
+        # Latency here is time to first chunk
+        await self._wait(context)
+        reply = self._reply(prompt)
+        for start in range(0, len(reply), self.chunk_chars):
+            if start:
+                await asyncio.sleep(self.chunk_delay)
+            final = start + self.chunk_chars >= len(reply)
+            yield self._response(reply[start:start + self.chunk_chars], len(prompt) // 4, final)
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(SERVICE, {
+            "GenerateContent": grpc.unary_unary_rpc_method_handler(
+                self.generate,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+            "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                self.stream,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+        })
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.8, help="Mean seconds before the (first) response")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls failing with UNAVAILABLE")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="Characters per streamed chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="Seconds between streamed chunks")
+
+
+async def serve(port: int, fake: FakeGemini) -> None:
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((fake.handler(),))
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    await server.start()
+    print(f"Fake Gemini listening on 127.0.0.1:{port}", flush=True)
+    await server.wait_for_termination()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=50051)
+    add_arguments(parser)
+    args = parser.parse_args()
+    fake = FakeGemini(args.latency, args.jitter, args.failure_rate, args.chunk_chars, args.chunk_delay)
+    asyncio.run(serve(args.port, fake))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Offline load test for the backend.
+
+Starts the fake Gemini and ElevenLabs servers and the backend (unless
+--target is given), then simulates N concurrent students going through
+upload -> answer x questions for each concurrency level. Reports throughput,
+p50/p95/p99 latency per request type and backend memory, plus the backend's
+own per-stage timings from /api/metrics.
+
+Run from the project root:
+    python bench/load.py --concurrency 1,8,32 --interviews 2
+    python bench/load.py --concurrency 16 --stream --tts-failure-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from corpus import build_corpus
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+
+ANSWERS = [
+    "I picked that method because it let me control for the other variables, and I checked it against a second source.",
+    "Honestly the first draft used a different approach, but the results were noisy so I switched halfway through.",
+    "The main idea came from the lecture notes, then I read two papers to see how they measured it.",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident memory of a process and its children in bytes (Linux only, else 0)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class Stack:
+    """The fake upstreams and the backend, as subprocesses."""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.backend_pid = None
+        self.url = args.target
+
+    def _spawn(self, cmd: list, cwd: str, env: dict = None) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            cmd, cwd=cwd, env=env,
+            stdout=None if self.args.verbose else subprocess.DEVNULL,
+            stderr=None if self.args.verbose else subprocess.DEVNULL,
+        )
+        self.processes.append(proc)
+        return proc
+
+    def start(self) -> None:
+        if self.url:
+            return
+        args = self.args
+        gemini_port, tts_port, backend_port = free_port(), free_port(), free_port()
+        self._spawn([
+            sys.executable, "fake_gemini.py", "--port", str(gemini_port),
+            "--latency", str(args.gemini_latency), "--jitter", str(args.gemini_jitter),
+            "--failure-rate", str(args.gemini_failure_rate),
+            "--chunk-chars", str(args.chunk_chars), "--chunk-delay", str(args.chunk_delay),
+        ], cwd=BENCH_DIR)
+        self._spawn([
+            sys.executable, "fake_elevenlabs.py", "--port", str(tts_port),
+            "--latency", str(args.tts_latency), "--jitter", str(args.tts_jitter),
+            "--failure-rate", str(args.tts_failure_rate),
+        ], cwd=BENCH_DIR)
+
+        env = dict(os.environ)
+        env.update({
+            "GEMINI_API_KEY": "bench",
+            "ELEVENLABS_API_KEY": "bench",
+            "GEMINI_API_ENDPOINT": f"127.0.0.1:{gemini_port}",
+            "ELEVENLABS_BASE_URL": f"http://127.0.0.1:{tts_port}",
+            "PYTHONUNBUFFERED": "1",
+        })
+        for item in args.env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        backend = self._spawn([
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(backend_port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ], cwd=BACKEND_DIR, env=env)
+        self.backend_pid = backend.pid
+        self.url = f"http://127.0.0.1:{backend_port}"
+
+    async def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                try:
+                    if (await client.get(f"{self.url}/api/health")).status_code == 200:
+                        # Give the fake upstreams a moment too
+                        await asyncio.sleep(0.5)
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"Backend at {self.url} did not become healthy")
+
+    def rss(self) -> int:
+        return process_tree_rss(self.backend_pid) if self.backend_pid else 0
+
+    def stop(self) -> None:
+        for proc in self.processes:
+            proc.terminate()
+        for proc in self.processes:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.interviews = 0
+
+    def record(self, op: str, seconds: float) -> None:
+        self.latencies.setdefault(op, []).append(seconds)
+
+    def error(self, op: str, detail: str) -> None:
+        self.errors.setdefault(op, []).append(detail)
+
+
+async def upload(client: httpx.AsyncClient, path: str, unique: bool, results: Results) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+    if unique:
+        # Trailing bytes after the document end make each upload a document-cache miss
+        data += f"\n{random.getrandbits(64):016x}\n".encode()
+    started = time.perf_counter()
+    response = await client.post("/api/upload", files={"file": (os.path.basename(path), data)})
+    results.record("upload", time.perf_counter() - started)
+    response.raise_for_status()
+    return response.json()
+
+
+async def answer(client: httpx.AsyncClient, session_id: str, text: str, results: Results) -> dict:
+    started = time.perf_counter()
+    response = await client.post("/api/answer", json={"session_id": session_id, "answer": text})
+    results.record("answer", time.perf_counter() - started)
+    response.raise_for_status()
+    return response.json()
+
+
+async def answer_stream(client: httpx.AsyncClient, session_id: str, text: str, results: Results) -> dict:
+    started = time.perf_counter()
+    first_audio = None
+    done = None
+    event = None
+    async with client.stream("POST", "/api/answer/stream", json={"session_id": session_id, "answer": text}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "audio" and first_audio is None:
+                    first_audio = time.perf_counter() - started
+            elif line.startswith("data:") and event in ("done", "error"):
+                done = json.loads(line[5:])
+                if event == "error":
+                    raise RuntimeError(done.get("detail"))
+    results.record("answer_stream", time.perf_counter() - started)
+    if first_audio is not None:
+        results.record("answer_first_audio", first_audio)
+    return done or {}
+
+
+async def student(client: httpx.AsyncClient, corpus: list, args, results: Results) -> None:
+    for _ in range(args.interviews):
+        op = "upload"
+        try:
+            reply = await upload(client, random.choice(corpus), args.unique_uploads, results)
+            session_id = reply["session_id"]
+            while reply.get("message_type") == "question":
+                op = "answer_stream" if args.stream else "answer"
+                await asyncio.sleep(args.think_time)
+                send = answer_stream if args.stream else answer
+                reply = await send(client, session_id, random.choice(ANSWERS), results)
+            results.interviews += 1
+        except Exception as e:
+            results.error(op, f"{type(e).__name__}: {e}")
+
+
+async def run_level(stack: Stack, corpus: list, args, concurrency: int) -> dict:
+    results = Results()
+    peak_rss = stack.rss()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=stack.url, limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        workers = asyncio.gather(*(student(client, corpus, args, results) for _ in range(concurrency)))
+        while not workers.done():
+            await asyncio.sleep(0.25)
+            peak_rss = max(peak_rss, stack.rss())
+        await workers
+        elapsed = time.perf_counter() - started
+
+    requests = sum(len(values) for op, values in results.latencies.items() if op != "answer_first_audio")
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "interviews": results.interviews,
+        "interviews_per_s": results.interviews / elapsed,
+        "requests_per_s": requests / elapsed,
+        "latency": {
+            op: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for op, values in results.latencies.items()
+        },
+        "errors": {op: len(errors) for op, errors in results.errors.items()},
+        "error_samples": {op: errors[:3] for op, errors in results.errors.items()},
+        "rss_peak_mb": peak_rss / 2**20,
+        "rss_end_mb": stack.rss() / 2**20,
+    }
+
+
+async def stage_means(url: str) -> dict:
+    """Mean seconds per backend stage, from /api/metrics (one worker's view)."""
+    async with httpx.AsyncClient() as client:
+        try:
+            text = (await client.get(f"{url}/api/metrics")).text
+        except httpx.HTTPError:
+            return {}
+    sums, counts = {}, {}
+    for match in re.finditer(r'^interview_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', text, re.M):
+        kind, stage, value = match.groups()
+        (sums if kind == "sum" else counts)[stage] = float(value)
+    return {stage: (sums[stage] / counts[stage], int(counts[stage])) for stage in sums if counts.get(stage)}
+
+
+def print_level(report: dict) -> None:
+    print(f"\n--- concurrency {report['concurrency']} ---")
+    print(f"  {report['interviews']} interviews in {report['elapsed_s']:.1f}s: "
+          f"{report['interviews_per_s']:.2f} interviews/s, {report['requests_per_s']:.2f} requests/s")
+    print(f"  backend RSS: peak {report['rss_peak_mb']:.0f} MB, end {report['rss_end_mb']:.0f} MB")
+    print(f"  {'request':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for op, stats in report["latency"].items():
+        print(f"  {op:<20}{stats['count']:>7}{stats['p50'] * 1000:>10.0f}{stats['p95'] * 1000:>10.0f}{stats['p99'] * 1000:>10.0f}")
+    for op, count in report["errors"].items():
+        print(f"  errors in {op}: {count}  e.g. {report['error_samples'][op][0]}")
+
+
+async def main_async(args) -> list:
+    corpus = build_corpus(args.corpus_dir)
+    if args.formats:
+        corpus = [path for path in corpus if path.rsplit(".", 1)[-1] in args.formats.split(",")]
+    if args.sizes:
+        corpus = [path for path in corpus if os.path.basename(path).split(".")[0] in args.sizes.split(",")]
+
+    stack = Stack(args)
+    stack.start()
+    try:
+        await stack.wait_ready()
+        reports = []
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            report = await run_level(stack, corpus, args, concurrency)
+            print_level(report)
+            reports.append(report)
+        stages = await stage_means(stack.url)
+        if stages:
+            print("\n--- backend stages (mean, all levels) ---")
+            for stage, (mean, count) in sorted(stages.items(), key=lambda item: -item[1][0]):
+                print(f"  {stage:<22}{mean * 1000:>10.1f} ms  x{count}")
+        return reports
+    finally:
+        stack.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels to run in turn")
+    parser.add_argument("--interviews", type=int, default=2, help="Interviews per simulated student per level")
+    parser.add_argument("--stream", action="store_true", help="Answer through /api/answer/stream")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a student waits before answering")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request")
+    parser.add_argument("--formats", default="", help="Restrict the corpus, e.g. pdf,docx")
+    parser.add_argument("--sizes", default="", help="Restrict the corpus, e.g. small,medium")
+    parser.add_argument("--no-unique-uploads", dest="unique_uploads", action="store_false",
+                        help="Upload identical bytes each time (exercises the document cache)")
+    parser.add_argument("--corpus-dir", default=os.path.join(BENCH_DIR, "corpus"))
+    parser.add_argument("--target", default="", help="Benchmark an already running backend instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started backend")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE for the started backend (repeatable)")
+    parser.add_argument("--json", default="", help="Also write the reports to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show output from the started servers")
+
+    gemini = parser.add_argument_group("fake Gemini")
+    gemini.add_argument("--gemini-latency", type=float, default=0.8)
+    gemini.add_argument("--gemini-jitter", type=float, default=0.3)
+    gemini.add_argument("--gemini-failure-rate", type=float, default=0.0)
+    gemini.add_argument("--chunk-chars", type=int, default=40)
+    gemini.add_argument("--chunk-delay", type=float, default=0.05)
+    tts = parser.add_argument_group("fake ElevenLabs")
+    tts.add_argument("--tts-latency", type=float, default=0.4)
+    tts.add_argument("--tts-jitter", type=float, default=0.2)
+    tts.add_argument("--tts-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    reports = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
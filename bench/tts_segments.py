@@ -0,0 +1,116 @@
+"""
+Compares single-request TTS with sentence-parallel synthesis on long texts.
+
+Starts the fake ElevenLabs server and calls the backend's tts_service
+directly. Every clip is a cache miss, so each run measures synthesis.
+gTTS hedging is disabled so nothing leaves the machine.
+
+Run from the project root:
+    python bench/tts_segments.py --lengths 300,800,1600 --repeat 5 --concurrency 1,8
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+from corpus import TEMPLATES, TOPICS
+from load import BACKEND_DIR, BENCH_DIR, free_port, percentile
+
+
+def review_text(chars: int, rng: random.Random) -> str:
+    a, b, c, d, e = rng.choice(TOPICS)
+    sentences = []
+    while sum(len(sentence) + 1 for sentence in sentences) < chars:
+        sentences.append(rng.choice(TEMPLATES).format(a=a, b=b, c=c, d=d, e=e))
+    # A random opener keeps every text unique, so nothing comes from the cache
+    return f"Review {rng.getrandbits(48):x}. " + " ".join(sentences)
+
+
+def count_frames(audio: bytes, mp3) -> int:
+    """Frames in a joined clip; raises if the stream isn't frame-aligned."""
+    audio = mp3.audio_frames(audio)
+    offset = frames = 0
+    while offset < len(audio):
+        length = mp3.frame_length(audio, offset)
+        if not length:
+            raise ValueError(f"No frame header at byte {offset}")
+        offset += length
+        frames += 1
+    return frames
+
+
+async def run(tts_service, mp3, settings, mode: str, length: int, concurrency: int, args, rng) -> list:
+    settings.tts_segment_chars = 0 if mode == "single" else args.segment_chars
+    latencies = []
+
+    async def one() -> None:
+        text = review_text(length, rng)
+        started = time.perf_counter()
+        _, audio = await tts_service.synthesize(text)
+        latencies.append(time.perf_counter() - started)
+        count_frames(audio, mp3)
+
+    for _ in range(args.repeat):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    return latencies
+
+
+async def main_async(args) -> None:
+    sys.path.insert(0, BACKEND_DIR)
+    import mp3
+    import tts_service
+    from clients import get_client_registry
+    from config import get_settings
+
+    rng = random.Random(args.seed)
+    print(f"{'mode':<10}{'chars':>7}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    try:
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            for length in (int(chars) for chars in args.lengths.split(",")):
+                for mode in ("single", "segments"):
+                    latencies = await run(tts_service, mp3, get_settings(), mode, length, concurrency, args, rng)
+                    print(f"{mode:<10}{length:>7}{concurrency:>6}"
+                          f"{percentile(latencies, 50) * 1000:>10.0f}{percentile(latencies, 95) * 1000:>10.0f}")
+    finally:
+        await get_client_registry().aclose()
+
+
+def main():
+    args = parser.parse_args()
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, "fake_elevenlabs.py", "--port", str(port),
+        "--latency", str(args.tts_latency), "--jitter", str(args.tts_jitter), "--per-char", str(args.per_char),
+    ], cwd=BENCH_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ.update({
+        "ELEVENLABS_API_KEY": "bench",
+        "ELEVENLABS_BASE_URL": f"http://127.0.0.1:{port}",
+        "TTS_HEDGE_ENABLED": "false",
+        "TTS_CACHE_DIR": "",
+        "ELEVENLABS_RATE_PER_SECOND": "1000",
+        "ELEVENLABS_BURST": "1000",
+    })
+    try:
+        time.sleep(1.5)
+        asyncio.run(main_async(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--lengths", default="300,800,1600", help="Comma-separated text lengths in characters")
+parser.add_argument("--repeat", type=int, default=5, help="Rounds per mode and length")
+parser.add_argument("--concurrency", default="1,8", help="Comma-separated numbers of texts synthesized at once")
+parser.add_argument("--segment-chars", type=int, default=240, help="TTS_SEGMENT_CHARS for the segmented mode")
+parser.add_argument("--tts-latency", type=float, default=0.4)
+parser.add_argument("--tts-jitter", type=float, default=0.1)
+parser.add_argument("--per-char", type=float, default=0.002)
+parser.add_argument("--seed", type=int, default=7)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-import React, { useCallback, useState, useEffect } from "react";
-import { useSpeechRecognition } from "./hooks/useSpeechRecognition";
+import React, { useCallback, useState, useEffect, useRef } from "react";
+import { useInterviewSpeech } from "./hooks/useInterviewSpeech";
 import { useAudioPlayer } from "./hooks/useAudioPlayer";
-import { uploadAssignment, submitAnswer } from "./api";
+import { uploadAssignment, startPreparedSession, submitAnswerStream, openInterviewSocket, resolveAudioUrl } from "./api";
 import { StepTracker } from "./components/StepTracker";
 import { UploadPanel } from "./components/UploadPanel";
 import { ReadyPanel } from "./components/ReadyPanel";
@@ -30,8 +30,15 @@ export default function App() {
   const [showSettings, setShowSettings] = useState(false);
   const [keysConfigured, setKeysConfigured] = useState(hasConfiguredKeys());
 
-  const speech = useSpeechRecognition();
   const audio = useAudioPlayer();
+  const stopAudio = audio.stop;
+  // Interview WebSocket; answers fall back to HTTP streaming while it's closed
+  const interviewRef = useRef(null);
+  // Answers the server recognized itself arrive with their reply already started
+  const serverAnswerRef = useRef(null);
+  // The answer being replied to: { inFlight, interrupted } until the next answer
+  const turnRef = useRef(null);
+  const speech = useInterviewSpeech(interviewRef, (text, follow) => serverAnswerRef.current?.(text, follow));
 
   // Show settings modal on first use if no API keys are configured
   useEffect(() => {
@@ -51,33 +58,51 @@ export default function App() {
     setSelectedModel(model);
   }, []);
 
-  const handleFileUpload = useCallback(async (file) => {
-    if (!file) return;
+  const applyOpening = useCallback((data) => {
+    setSessionId(data.session_id);
+    setAssignmentText(data.assignment_text || "");
+
+    if (selectedModel === "gemini") {
+      setQuestionNumber(data.question_number || 1);
+      setPendingAudio(resolveAudioUrl(data.audio_url));
+      setPendingGreeting(data.text);
+      setCurrentQuestion(data.text);
+      setCurrentQuestionAudio(resolveAudioUrl(data.audio_url));
+    }
+
+    setStep("ready");
+    setUploadStatus("success");
+  }, [selectedModel]);
+
+  // A ?session=<id> link opens a session prepared by a batch upload
+  useEffect(() => {
+    const preparedId = new URLSearchParams(window.location.search).get("session");
+    if (!preparedId) return;
+    setUploadStatus("uploading");
+    startPreparedSession(preparedId)
+      .then(applyOpening)
+      .catch((error) => {
+        setUploadError(error.message || "Could not open the session");
+        setUploadStatus("failed");
+      });
+  }, []);
+
+  // One assignment from one or more files (a report plus slides, or a zip)
+  const handleFileUpload = useCallback(async (files) => {
+    if (!files?.length) return;
     setUploadError("");
     setUploadStatus("uploading");
-    setFileName(file.name);
+    setFileName(files.length === 1 ? files[0].name : `${files[0].name} + ${files.length - 1} more`);
 
     try {
       const settings = loadSettings();
-      const data = await uploadAssignment(file, settings);
-      setSessionId(data.session_id);
-      setAssignmentText(data.assignment_text || "");
-      
-      if (selectedModel === "gemini") {
-      setQuestionNumber(data.question_number || 1);
-        setPendingAudio(data.audio_base64);
-        setPendingGreeting(data.text);
-        setCurrentQuestion(data.text);
-        setCurrentQuestionAudio(data.audio_base64);
-      }
-      
-      setStep("ready");
-      setUploadStatus("success");
+      const data = await uploadAssignment(files, settings);
+      applyOpening(data);
     } catch (error) {
       setUploadError(error.message || "Failed to upload file");
       setUploadStatus("failed");
     }
-  }, [selectedModel]);
+  }, [applyOpening]);
 
   const startConversation = useCallback(async () => {
     if (selectedModel === "elevenlabs") {
@@ -86,6 +111,9 @@ export default function App() {
     }
 
     // Gemini flow
+    openInterviewSocket(sessionId).then((interview) => {
+      interviewRef.current = interview;
+    });
     if (pendingGreeting) {
       setConversation([{ role: "ai", text: pendingGreeting }]);
       setPendingGreeting(null);
@@ -98,17 +126,58 @@ export default function App() {
     }
     
     speech.start();
-  }, [selectedModel, pendingAudio, pendingGreeting, audio, speech]);
+  }, [selectedModel, sessionId, pendingAudio, pendingGreeting, audio, speech]);
+
+  // Speech while a reply is running or playing is the student talking over it:
+  // stop the audio, and while the turn is in flight send the interim text so
+  // the server drops the reply (server-side recognition does that by itself)
+  useEffect(() => {
+    const turn = turnRef.current;
+    if (!turn || !speech.transcript.trim()) return;
+    if (turn.inFlight && !speech.serverSide) {
+      interviewRef.current?.partial(speech.transcript);
+    }
+    if (!turn.interrupted) {
+      turn.interrupted = true;
+      stopAudio();
+    }
+  }, [speech.transcript, speech.serverSide, stopAudio]);
 
-  const handleSubmitAnswer = useCallback(async (answerText) => {
+  // follow(onEvent) is given when the server already started the reply
+  const handleSubmitAnswer = useCallback(async (answerText, follow) => {
     if (!sessionId || !answerText.trim()) return;
 
-    speech.stop();
+    // Keep listening through the reply, from a clean transcript, so the
+    // student can talk over it
+    const turn = { inFlight: true, interrupted: false };
+    turnRef.current = turn;
+    speech.reset();
     setIsProcessing(true);
     setConversation((prev) => [...prev, { role: "student", text: answerText }]);
 
     try {
-      const data = await submitAnswer(sessionId, answerText);
+      // Start playing each sentence as soon as its audio arrives
+      const clips = [];
+      let objectUrls = false;
+      let playback = Promise.resolve();
+      const onEvent = (event, payload) => {
+        const clip = payload.audio_url || payload.audio_base64;
+        if (event === "audio" && clip) {
+          const objectUrl = clip.startsWith("blob:");
+          objectUrls = objectUrls || objectUrl;
+          clips.push(clip);
+          playback = playback
+            .then(() => (turn.interrupted ? undefined : audio.play(clip)))
+            .then(() => objectUrl && URL.revokeObjectURL(clip));
+        }
+      };
+      const interview = interviewRef.current?.isOpen() ? interviewRef.current : null;
+      const data = follow
+        ? await follow(onEvent)
+        : interview
+          ? await interview.answer(answerText, onEvent)
+          : await submitAnswerStream(sessionId, answerText, onEvent);
+      turn.inFlight = false;
       setConversation((prev) => [...prev, { role: "ai", text: data.text }]);
 
       if (data.message_type === "review") {
@@ -118,24 +187,31 @@ export default function App() {
           observations: data.observations || [],
           confidenceTag: data.score >= 85 ? "Likely original" : data.score >= 65 ? "Probably student-made" : "Needs verification",
         });
+        speech.stop();
         setStep("results");
-        await audio.play(data.audio_base64);
+        await playback;
       } else {
         setQuestionNumber(data.question_number || questionNumber + 1);
         setCurrentQuestion(data.text);
-        setCurrentQuestionAudio(data.audio_base64);
-        
-        await audio.play(data.audio_base64);
-        speech.start();
+        // Socket clips are object URLs, released once played; repeat from the server
+        setCurrentQuestionAudio(objectUrls ? resolveAudioUrl(data.audio_url) : clips);
+        await playback;
       }
     } catch (error) {
-      setConversation((prev) => [...prev, { role: "ai", text: `Error: ${error.message}` }]);
-      speech.start();
+      if (error.message === "cancelled") {
+        // Talked over: the server kept no reply, so this answer is given again
+        setConversation((prev) => prev.slice(0, -1));
+      } else {
+        setConversation((prev) => [...prev, { role: "ai", text: `Error: ${error.message}` }]);
+      }
     } finally {
+      turn.inFlight = false;
       setIsProcessing(false);
     }
   }, [sessionId, questionNumber, audio, speech]);
 
+  serverAnswerRef.current = handleSubmitAnswer;
+
   const handleFinishAnswer = useCallback(() => {
     if (speech.transcript.trim()) {
       handleSubmitAnswer(speech.transcript);
@@ -168,8 +244,11 @@ export default function App() {
   }, []);
 
   const handleRestart = useCallback(() => {
+    turnRef.current = null;
     speech.stop();
     audio.stop();
+    interviewRef.current?.close();
+    interviewRef.current = null;
     setStep("upload");
     setSelectedModel("gemini");
     setSessionId(null);
@@ -1,8 +1,17 @@
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
-export async function uploadAssignment(file, settings = {}) {
+// Turns a server-relative audio_url into something an <audio> element can load
+export function resolveAudioUrl(path) {
+  return path ? `${API_BASE}${path}` : null;
+}
+
+// `files` is a File or an array of them; several files (and zips) are
+// extracted and interviewed on as one assignment
+export async function uploadAssignment(files, settings = {}) {
   const formData = new FormData();
-  formData.append("file", file);
+  for (const file of [].concat(files)) {
+    formData.append("file", file);
+  }
   
   // Add settings to form data
   if (settings.geminiApiKey) {
@@ -31,28 +40,50 @@ export async function uploadAssignment(file, settings = {}) {
   return response.json();
 }
 
-export async function submitAnswer(sessionId, answer) {
-  // Load settings for API keys
-  let headers = { "Content-Type": "application/json" };
-  
+function storedKeys() {
   try {
     const stored = localStorage.getItem("integrity_checker_settings");
     if (stored) {
       const settings = JSON.parse(stored);
-      if (settings.geminiApiKey) {
-        headers["X-Gemini-Api-Key"] = settings.geminiApiKey;
-      }
-      if (settings.elevenlabsApiKey) {
-        headers["X-Elevenlabs-Api-Key"] = settings.elevenlabsApiKey;
-      }
+      return { gemini: settings.geminiApiKey, elevenlabs: settings.elevenlabsApiKey };
     }
   } catch (e) {
     console.error("Failed to load settings for API call:", e);
   }
+  return {};
+}
+
+function answerHeaders() {
+  // Load settings for API keys
+  let headers = { "Content-Type": "application/json" };
+  const keys = storedKeys();
+  if (keys.gemini) {
+    headers["X-Gemini-Api-Key"] = keys.gemini;
+  }
+  if (keys.elevenlabs) {
+    headers["X-Elevenlabs-Api-Key"] = keys.elevenlabs;
+  }
+  return headers;
+}
 
+// Opens a session an instructor prepared with a batch upload (/?session=<id> links)
+export async function startPreparedSession(sessionId) {
+  const response = await fetch(`${API_BASE}/api/session/${encodeURIComponent(sessionId)}/start`, {
+    headers: answerHeaders(),
+  });
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || "Could not open the session");
+  }
+
+  return response.json();
+}
+
+export async function submitAnswer(sessionId, answer) {
   const response = await fetch(`${API_BASE}/api/answer`, {
     method: "POST",
-    headers,
+    headers: answerHeaders(),
     body: JSON.stringify({ session_id: sessionId, answer }),
   });
 
@@ -64,3 +95,188 @@ export async function submitAnswer(sessionId, answer) {
   return response.json();
 }
 
+// Streams the reply as Server-Sent Events. onEvent(event, data) is called for
+// each "text" and "audio" event; resolves with the final "done" payload.
+export async function submitAnswerStream(sessionId, answer, onEvent) {
+  const response = await fetch(`${API_BASE}/api/answer/stream`, {
+    method: "POST",
+    headers: answerHeaders(),
+    body: JSON.stringify({ session_id: sessionId, answer }),
+  });
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || "Failed to submit answer");
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === "error") throw new Error(payload.detail || "Failed to submit answer");
+      if (event === "done") return payload;
+      onEvent?.(event, payload);
+    }
+  }
+
+  throw new Error("Stream ended before the reply was complete");
+}
+
+// One WebSocket per interview (/api/session/{id}/ws). Keys are sent once when
+// it opens. answer(text, onEvent) resolves with the "done" payload; onEvent
+// gets ("text", {index, text}) and ("audio", {index, audio_url}) as they arrive.
+// Audio URLs are object URLs; the caller revokes each once it has played.
+// Resolves once the server is ready, or with null if the connection can't be
+// opened, so callers can fall back to submitAnswerStream.
+export function openInterviewSocket(sessionId) {
+  const url = `${API_BASE.replace(/^http/, "ws")}/api/session/${encodeURIComponent(sessionId)}/ws`;
+  let socket;
+  try {
+    socket = new WebSocket(url);
+  } catch (e) {
+    return Promise.resolve(null);
+  }
+  socket.binaryType = "arraybuffer";
+
+  let turn = null; // { resolve, reject, onEvent } for the answer in flight
+  let listener = null; // { onTranscript, onAnswer, onError } while audio is streamed
+  let resolveOpen; // settles the returned promise once the server says "ready"
+
+  const finish = (error, payload) => {
+    const current = turn;
+    turn = null;
+    if (!current) return;
+    if (error) current.reject(error);
+    else current.resolve(payload);
+  };
+
+  socket.onmessage = (message) => {
+    if (message.data instanceof ArrayBuffer) {
+      // 4-byte big-endian sentence index, then the MP3 bytes
+      const onEvent = turn?.onEvent;
+      if (!onEvent) return;
+      const index = new DataView(message.data).getUint32(0);
+      const blob = new Blob([message.data.slice(4)], { type: "audio/mpeg" });
+      onEvent("audio", { index, audio_url: URL.createObjectURL(blob) });
+      return;
+    }
+    const payload = JSON.parse(message.data);
+    if (payload.type === "ready") {
+      interview.serverSpeech = Boolean(payload.stt);
+      interview.sampleRate = payload.sample_rate;
+      resolveOpen(interview);
+    } else if (payload.type === "transcript") {
+      const current = listener;
+      if (!payload.final) current?.onTranscript?.(payload.text);
+      else if (payload.answered) {
+        // The server heard the end of the answer and already started the reply
+        listener = null;
+        const reply = new Promise((resolve, reject) => {
+          turn = { resolve, reject, onEvent: null };
+        });
+        const follow = (onEvent) => {
+          if (turn) turn.onEvent = onEvent;
+          return reply;
+        };
+        current?.onAnswer?.(payload.text, follow);
+      }
+    } else if (payload.type === "error" && payload.source === "stt") {
+      const current = listener;
+      listener = null;
+      current?.onError?.(payload.detail);
+    } else if (payload.type === "done") finish(null, payload);
+    else if (payload.type === "error") finish(new Error(payload.detail || "Failed to submit answer"));
+    else if (payload.type === "cancelled") finish(new Error("cancelled"));
+    else if (payload.type === "text") turn?.onEvent?.("text", payload);
+  };
+
+  const interview = {
+    serverSpeech: false,
+    sampleRate: 16000,
+    answer(text, onEvent) {
+      if (socket.readyState !== WebSocket.OPEN) {
+        return Promise.reject(new Error("Connection to the interview was lost"));
+      }
+      return new Promise((resolve, reject) => {
+        turn = { resolve, reject, onEvent };
+        socket.send(JSON.stringify({ type: "answer", text }));
+      });
+    },
+    // Interim speech; the server drops a reply that is still being generated
+    partial(text) {
+      if (socket.readyState === WebSocket.OPEN && text) {
+        socket.send(JSON.stringify({ type: "partial", text }));
+      }
+    },
+    cancel() {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: "cancel" }));
+      }
+    },
+    // Server-side recognition (when serverSpeech): 16-bit PCM chunks go up via
+    // sendAudio and interim text comes back to onTranscript. When the student
+    // stops talking the server starts the reply itself and calls
+    // onAnswer(text, follow); follow(onEvent) resolves like answer().
+    listen({ sampleRate, onTranscript, onAnswer, onError }) {
+      if (socket.readyState !== WebSocket.OPEN) return false;
+      listener = { onTranscript, onAnswer, onError };
+      socket.send(JSON.stringify({ type: "audio_start", sample_rate: sampleRate }));
+      return true;
+    },
+    sendAudio(chunk) {
+      if (listener && socket.readyState === WebSocket.OPEN) socket.send(chunk);
+    },
+    // Stop streaming; the audio so far is dropped unless submit is true
+    stopListening(submit = false) {
+      if (!listener) return;
+      listener = null;
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: "audio_end", submit }));
+      }
+    },
+    isOpen() {
+      return socket.readyState === WebSocket.OPEN;
+    },
+    close() {
+      socket.close();
+    },
+  };
+
+  return new Promise((resolve) => {
+    resolveOpen = resolve;
+    socket.onopen = () => {
+      const keys = storedKeys();
+      socket.send(JSON.stringify({
+        type: "hello",
+        gemini_api_key: keys.gemini || undefined,
+        elevenlabs_api_key: keys.elevenlabs || undefined,
+      }));
+    };
+    socket.onerror = () => resolve(null);
+    socket.onclose = () => {
+      resolve(null);
+      finish(new Error("Connection to the interview was lost"));
+      const current = listener;
+      listener = null;
+      current?.onError?.("Connection to the interview was lost");
+    };
+  });
+}
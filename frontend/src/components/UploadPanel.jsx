@@ -1,7 +1,7 @@
 import React, { useRef, useState, useEffect } from "react";
 import { UploadIcon } from "./Icons";
 
-const ACCEPTED_INPUTS = ".pdf,.docx,.pptx,.txt";
+const ACCEPTED_INPUTS = ".pdf,.docx,.pptx,.txt,.zip";
 
 const AI_MODELS = [
   { id: "gemini", name: "Gemini AI", description: "Google's Gemini with text-to-speech", disabled: false },
@@ -39,8 +39,9 @@ export function UploadPanel({ onFileSelected, status, error, selectedModel, onMo
     }
   }, []);
 
-  const handleFile = (file) => {
-    if (file) onFileSelected(file);
+  const handleFiles = (fileList) => {
+    const files = Array.from(fileList || []);
+    if (files.length) onFileSelected(files);
   };
 
   const disabled = status === "uploading";
@@ -107,30 +108,31 @@ export function UploadPanel({ onFileSelected, status, error, selectedModel, onMo
         onDrop={(e) => {
           e.preventDefault();
           setIsDragging(false);
-          handleFile(e.dataTransfer?.files?.[0]);
+          handleFiles(e.dataTransfer?.files);
         }}
       >
         <div className="upload-icon">
           <UploadIcon />
         </div>
         <h2>Upload your assignment</h2>
-        <p className="hint">PDF, DOCX, PPTX, or TXT up to 8 MB</p>
+        <p className="hint">PDF, DOCX, PPTX, or TXT up to 8 MB each; several files or a ZIP count as one assignment</p>
         <button
           type="button"
           className="btn btn-primary"
           onClick={() => inputRef.current?.click()}
           disabled={disabled}
         >
-          {status === "uploading" ? "Uploading..." : "Select file"}
+          {status === "uploading" ? "Uploading..." : "Select files"}
         </button>
         <p className="hint-small">or drag and drop</p>
         <input
           ref={inputRef}
           type="file"
           accept={ACCEPTED_INPUTS}
+          multiple
           style={{ display: "none" }}
           onChange={(e) => {
-            handleFile(e.target.files?.[0]);
+            handleFiles(e.target.files);
             e.target.value = "";
           }}
         />
@@ -1,25 +1,29 @@
 import { useCallback, useRef, useState } from "react";
 
+// Clips are either audio URLs served by the backend or raw base64 MP3 data
+const isUrl = (clip) => /^(https?:|blob:|data:|\/api\/)/.test(clip);
+
 export function useAudioPlayer() {
   const [isSpeaking, setIsSpeaking] = useState(false);
   const audioRef = useRef(null);
   const lastAudioRef = useRef(null);
+  // Settles the clip that's playing; stop() calls it, since a paused clip fires no event
+  const finishRef = useRef(null);
+  // Bumped by stop() so a multi-clip play() doesn't go on to its next clip
+  const stopsRef = useRef(0);
 
-  const play = useCallback((base64Audio) => {
-    if (!base64Audio) return Promise.resolve();
-
-    // Store the audio for replay
-    lastAudioRef.current = base64Audio;
-
+  const playOne = useCallback((clip) => {
     return new Promise((resolve) => {
-      const audio = new Audio(`data:audio/mp3;base64,${base64Audio}`);
+      const audio = new Audio(isUrl(clip) ? clip : `data:audio/mp3;base64,${clip}`);
       audioRef.current = audio;
       setIsSpeaking(true);
 
       const finish = () => {
+        if (finishRef.current === finish) finishRef.current = null;
         setIsSpeaking(false);
         resolve();
       };
+      finishRef.current = finish;
 
       audio.onended = finish;
       audio.onerror = finish;
@@ -27,16 +31,34 @@ export function useAudioPlayer() {
     });
   }, []);
 
+  // Accepts one clip or an array of clips (streamed sentences) played in order
+  const play = useCallback(async (base64Audio) => {
+    const clips = (Array.isArray(base64Audio) ? base64Audio : [base64Audio]).filter(Boolean);
+    if (!clips.length) return;
+
+    // Store the audio for replay
+    lastAudioRef.current = base64Audio;
+
+    const stops = stopsRef.current;
+    for (const clip of clips) {
+      if (stopsRef.current !== stops) return;
+      await playOne(clip);
+    }
+  }, [playOne]);
+
   const replay = useCallback(() => {
     if (!lastAudioRef.current) return Promise.resolve();
     return play(lastAudioRef.current);
   }, [play]);
 
+  // Whoever awaits play() or replay() resumes once the audio is stopped
   const stop = useCallback(() => {
+    stopsRef.current += 1;
     if (audioRef.current) {
       audioRef.current.pause();
       audioRef.current = null;
     }
+    finishRef.current?.();
     setIsSpeaking(false);
   }, []);
 
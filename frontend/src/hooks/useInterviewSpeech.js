@@ -0,0 +1,177 @@
+import { useCallback, useEffect, useRef, useState } from "react";
+import { useSpeechRecognition } from "./useSpeechRecognition";
+
+// Converts microphone audio to 16-bit PCM near 16 kHz, averaging down from the
+// context's rate, and posts ~100 ms chunks to the main thread.
+const CAPTURE_WORKLET = `
+class PcmCapture extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    this.factor = options.processorOptions.factor;
+    this.chunk = options.processorOptions.chunk;
+    this.samples = [];
+    this.sum = 0;
+    this.count = 0;
+  }
+  process(inputs) {
+    const input = inputs[0] && inputs[0][0];
+    if (!input) return true;
+    for (let i = 0; i < input.length; i++) {
+      this.sum += input[i];
+      if (++this.count === this.factor) {
+        const sample = Math.max(-1, Math.min(1, this.sum / this.factor));
+        this.samples.push(sample * 0x7fff);
+        this.sum = 0;
+        this.count = 0;
+      }
+    }
+    if (this.samples.length >= this.chunk) {
+      const pcm = Int16Array.from(this.samples);
+      this.port.postMessage(pcm.buffer, [pcm.buffer]);
+      this.samples = [];
+    }
+    return true;
+  }
+}
+registerProcessor("pcm-capture", PcmCapture);
+`;
+
+async function openMicrophone(targetRate, onChunk) {
+  const stream = await navigator.mediaDevices.getUserMedia({
+    audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true },
+  });
+  const context = new AudioContext();
+  try {
+    const url = URL.createObjectURL(new Blob([CAPTURE_WORKLET], { type: "application/javascript" }));
+    await context.audioWorklet.addModule(url);
+    URL.revokeObjectURL(url);
+    const factor = Math.max(1, Math.floor(context.sampleRate / targetRate));
+    const sampleRate = context.sampleRate / factor;
+    const node = new AudioWorkletNode(context, "pcm-capture", {
+      processorOptions: { factor, chunk: Math.round(sampleRate / 10) },
+    });
+    node.port.onmessage = (event) => onChunk(event.data);
+    context.createMediaStreamSource(stream).connect(node);
+    return {
+      sampleRate,
+      close() {
+        node.port.onmessage = null;
+        stream.getTracks().forEach((track) => track.stop());
+        context.close();
+      },
+    };
+  } catch (e) {
+    stream.getTracks().forEach((track) => track.stop());
+    context.close();
+    throw e;
+  }
+}
+
+// Speech input for the interview. When the interview socket offers server-side
+// recognition, the microphone is streamed to it and the server ends the answer
+// when the student stops talking: onServerAnswer(text, follow) then fires with
+// the reply already under way. Otherwise (or if the server's recognizer fails)
+// the browser's SpeechRecognition is used. Same interface as
+// useSpeechRecognition, plus serverSide.
+export function useInterviewSpeech(interviewRef, onServerAnswer) {
+  const browser = useSpeechRecognition();
+  const { start: browserStart, stop: browserStop, reset: browserReset } = browser;
+  const [serverSide, setServerSide] = useState(false);
+  const [isListening, setIsListening] = useState(false);
+  const [transcript, setTranscript] = useState("");
+  const [error, setError] = useState("");
+
+  const captureRef = useRef(null);
+  const instanceIdRef = useRef(0);
+  const serverFailedRef = useRef(false);
+  const onServerAnswerRef = useRef(onServerAnswer);
+  onServerAnswerRef.current = onServerAnswer;
+
+  const closeCapture = useCallback(() => {
+    captureRef.current?.close();
+    captureRef.current = null;
+  }, []);
+
+  const start = useCallback(async () => {
+    const interview = interviewRef.current;
+    const instanceId = ++instanceIdRef.current;
+    if (!interview?.isOpen() || !interview.serverSpeech || serverFailedRef.current) {
+      setServerSide(false);
+      browserStart();
+      return;
+    }
+
+    closeCapture();
+    setServerSide(true);
+    setError("");
+    setTranscript("");
+    let capture;
+    try {
+      capture = await openMicrophone(interview.sampleRate, (chunk) => interview.sendAudio(chunk));
+    } catch (e) {
+      if (instanceId === instanceIdRef.current) setError("Microphone unavailable. Please allow microphone access.");
+      return;
+    }
+    if (instanceId !== instanceIdRef.current) {
+      // Stopped while the microphone was opening
+      capture.close();
+      return;
+    }
+    captureRef.current = capture;
+
+    const listening = interview.listen({
+      sampleRate: capture.sampleRate,
+      onTranscript: (text) => {
+        if (instanceId === instanceIdRef.current) setTranscript(text);
+      },
+      onAnswer: (text, follow) => {
+        if (instanceId !== instanceIdRef.current) return;
+        closeCapture();
+        setIsListening(false);
+        setTranscript(text);
+        onServerAnswerRef.current?.(text, follow);
+      },
+      onError: () => {
+        if (instanceId !== instanceIdRef.current) return;
+        // Fall back to the browser's recognizer for the rest of the interview
+        closeCapture();
+        serverFailedRef.current = true;
+        setIsListening(false);
+        setServerSide(false);
+        browserStart();
+      },
+    });
+    if (!listening) {
+      closeCapture();
+      setServerSide(false);
+      browserStart();
+      return;
+    }
+    setIsListening(true);
+  }, [interviewRef, browserStart, closeCapture]);
+
+  const stop = useCallback(() => {
+    instanceIdRef.current++;
+    browserStop();
+    interviewRef.current?.stopListening(false);
+    closeCapture();
+    setIsListening(false);
+  }, [interviewRef, browserStop, closeCapture]);
+
+  const reset = useCallback(() => {
+    if (!serverSide) {
+      browserReset();
+      return;
+    }
+    stop();
+    setTranscript("");
+    start();
+  }, [serverSide, browserReset, stop, start]);
+
+  useEffect(() => closeCapture, [closeCapture]);
+
+  if (!serverSide) {
+    return { isListening: browser.isListening, transcript: browser.transcript, error: browser.error, start, stop, reset, serverSide };
+  }
+  return { isListening, transcript, error, start, stop, reset, serverSide };
+}